@@ -0,0 +1,211 @@
+import argparse
+import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import *
+from logging import getLogger
+
+import atcoder_submit_status.utils as utils
+import atcoder_submit_status.profiler as profiler
+import atcoder_submit_status.service as service
+from atcoder_submit_status.crawler import SubmissionCrawler
+from atcoder_submit_status.store import SubmissionStore
+
+logger = getLogger(__name__)
+
+PROGRESS_INTERVAL = 10.0  # 進捗を表示する間隔の秒数
+
+
+def add_subparser(subparsers: argparse.Action) -> None:
+   subparsers_add_parser: Callable[..., argparse.ArgumentParser] = subparsers.add_parser  # type: ignore
+   subparser = subparsers_add_parser('archive', help='Save the submissions of many contests to the local store', formatter_class=argparse.RawTextHelpFormatter, epilog='''\
+The submissions of all users are saved to the same store as fetch and stats,
+so `acss stats <contest>` and `acss fetch <contest> -u ''` use them without requests.
+Contests that are over and already archived are skipped.
+
+Supported Services:
+  √ AtCoder
+''')
+   subparser.add_argument('contests', metavar='contest', nargs='+', help='Contest names, URLs or ranges of contest names.\n(e.g. abc250..abc320 arc150..160 agc060)')
+   subparser.add_argument('-j', '--jobs', metavar='<n>', default=4, type=int, help='Send up to <n> requests at the same time in total. (default: 4)')
+   subparser.add_argument('--rate-limit', metavar='<n>', default=utils.DEFAULT_REQUESTS_PER_SECOND, type=float, help=f'Send at most <n> requests per second in total. (default: {utils.DEFAULT_REQUESTS_PER_SECOND})')
+   subparser.add_argument('--refresh', action='store_true', help='Check for new submissions even if the contest is already archived.')
+
+
+def parse_contests(specs: List[str], srv: service.Service) -> List[str]:
+   """
+   コンテスト名・URL・範囲 ("abc250..abc320" や "abc250..320") の並びを、コンテスト名のリストにします。
+
+   範囲の番号の桁数は、始まりのコンテスト名の桁数に揃えます ("abc001..abc010" は "abc001", ..., "abc010")。
+   同じコンテストは 1 回だけ含めます。
+   """
+   contests: List[str] = []
+   for spec in specs:
+      if '..' not in spec:
+         contests.append(srv.get_round(spec))
+         continue
+      res = re.fullmatch(r'([A-Za-z_-]*?)(\d+)\.\.([A-Za-z_-]*?)(\d+)', spec)
+      if res is None or res.group(3) not in ['', res.group(1)]:
+         raise ValueError(f'invalid range of contests: {spec} (e.g. abc250..abc320)')
+      prefix, first, last = res.group(1), int(res.group(2)), int(res.group(4))
+      if first > last:
+         raise ValueError(f'empty range of contests: {spec}')
+      contests.extend(f'{prefix}{number:0{len(res.group(2))}}' for number in range(first, last + 1))
+   return list(dict.fromkeys(contests))
+
+
+def is_archived(store: SubmissionStore) -> bool:
+   """
+   コンテストの提出がすべて保存済みであるかを判定します。
+   """
+   return store.get_meta('archived') is not None
+
+
+class _Progress:
+   """
+   取得の進捗を数えて、残り時間を見積もります。
+
+   残り時間は、これまでに取得を終えたコンテストの数と経過時間から、終わっていないコンテストの数に比例するとして見積もります。
+   """
+   def __init__(self, total: int):
+      self.total = total
+      self.done = 0
+      self.failed = 0
+      self.submissions = 0
+      self.started = time.time()
+      self._lock = threading.Lock()
+
+
+   def add(self, submissions: Optional[int]) -> None:
+      with self._lock:
+         self.done += 1
+         if submissions is None:
+            self.failed += 1
+         else:
+            self.submissions += submissions
+
+
+   def describe(self) -> str:
+      with self._lock:
+         done, submissions = self.done, self.submissions
+      elapsed = time.time() - self.started
+      stats = profiler.get_profiler().get_stats()
+      res = f'{done}/{self.total} contests, {submissions} submissions saved, {stats["pages"]} pages and {stats["requests"]} requests in total, elapsed {_format_seconds(elapsed)}'
+      if 0 < done < self.total:
+         res += f', ETA {_format_seconds(elapsed / done * (self.total - done))}'
+      return res
+
+
+def _archive(srv: service.Service, contest: str, session, jobs: int, slots: threading.Semaphore, rate_limiter: utils.RateLimiter, refresh: bool, crawlers: Dict[str, SubmissionCrawler], stopped: threading.Event, lock: threading.Lock) -> Optional[int]:
+   # コンテスト 1 つ分の、すべてのユーザの提出を保存する
+   # 取得できなかったときは None を返す
+   if stopped.is_set():
+      return None
+   started = time.time()
+   with SubmissionStore(utils.get_store_path(srv, contest)) as store:
+      crawler = SubmissionCrawler(srv, contest, users=[''], session=session, store=store, refresh=refresh, jobs=jobs, rate_limiter=rate_limiter, slots=slots)
+      # 止めるときに crawlers を見るのと同じロックの中で確かめるので、止めた後に登録したクローラが動き続けることはない
+      with lock:
+         if stopped.is_set():
+            return None
+         crawlers[contest] = crawler
+      try:
+         submissions = crawler.update()
+         end = crawler.get_contest_window()[1]
+      except service.LoginRequiredError:
+         raise
+      except service.ServiceError as e:
+         logger.error(f'{contest}: {e}')
+         return None
+      except RuntimeError:
+         # 中断したとき
+         return None
+      finally:
+         with lock:
+            del crawlers[contest]
+
+      # 終わったコンテストの提出は変わらないので、ジャッジ中の提出がなければ次からは取得しない
+      if end is not None and end < started and not any(srv.is_judging(s) for s in submissions):
+         store.set_meta('archived', { 'archived_at': time.time(), 'submissions': len(submissions) })
+         logger.info(utils.SUCCESS + f'{contest}: {len(submissions)} submissions ({time.time() - started:.1f} s)')
+      else:
+         logger.info(f'{contest}: {len(submissions)} submissions ({time.time() - started:.1f} s, not archived yet: the contest is not over or some submissions are being judged)')
+   return len(submissions)
+
+
+def run(args: argparse.Namespace) -> bool:
+   srv = service.AtCoderService()
+   try:
+      contests = parse_contests(args.contests, srv)
+   except ValueError as e:
+      logger.error(e)
+      return False
+
+   # 保存済みのコンテストは、通信する前に除く
+   pending = []
+   for contest in contests:
+      with SubmissionStore(utils.get_store_path(srv, contest)) as store:
+         if args.refresh or not is_archived(store):
+            pending.append(contest)
+   if len(pending) < len(contests):
+      logger.info(f'skip {len(contests) - len(pending)} archived contests')
+   if not pending:
+      logger.info(utils.SUCCESS + f'all {len(contests)} contests are already archived.')
+      return True
+
+   with utils.new_session_with_our_user_agent(args.cookie, service=srv, pool_size=args.jobs) as session:
+      logger.debug('start session')
+      if not srv.is_logged_in(session, max_age=utils.LOGIN_STATUS_MAX_AGE):
+         logger.info(utils.FAILURE + 'You are not signed in.')
+         logger.info(utils.HINT + f'You can try to enter this command: `acss login {srv.get_name()}`')
+         return False
+
+      # すべてのコンテストで、同時に送るリクエストの数とリクエストの頻度を共有する
+      # コンテストも jobs 個まで並行して取得し、ページの取得の待ち時間の間にほかのコンテストのリクエストを送る
+      jobs = max(1, args.jobs)
+      slots = threading.Semaphore(jobs)
+      rate_limiter = utils.RateLimiter(args.rate_limit)
+      crawlers: Dict[str, SubmissionCrawler] = {}
+      stopped = threading.Event()
+      lock = threading.Lock()
+      progress = _Progress(len(pending))
+      logger.info(f'archive {len(pending)} contests: {pending[0]} ... {pending[-1]}' if len(pending) > 1 else f'archive {pending[0]}')
+
+      executor = ThreadPoolExecutor(max_workers=jobs)
+      futures: Dict[Future, str] = { executor.submit(_archive, srv, contest, session, jobs, slots, rate_limiter, args.refresh, crawlers, stopped, lock): contest for contest in pending }
+      try:
+         remaining = set(futures)
+         while remaining:
+            finished, remaining = wait(remaining, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in finished:
+               progress.add(future.result())
+            logger.info(f'progress: {progress.describe()}')
+      except BaseException as e:
+         # 取得中のコンテストは次のページの取得で止める (取得済みの提出は保存してある)
+         with lock:
+            stopped.set()
+            running = list(crawlers.values())
+         for future in futures:
+            future.cancel()
+         for crawler in running:
+            crawler.stop()
+         executor.shutdown(wait=True)
+         if isinstance(e, KeyboardInterrupt):
+            logger.info(f'interrupted: {progress.describe()}')
+            sys.exit(0)
+         raise
+      executor.shutdown(wait=True)
+
+   if progress.failed:
+      logger.info(utils.FAILURE + f'{progress.failed} of {len(pending)} contests could not be archived.')
+      logger.info(utils.HINT + 'Run the same command again to retry them. (The submissions fetched so far are saved.)')
+      return False
+   logger.info(utils.SUCCESS + f'archived {len(pending)} contests ({progress.submissions} submissions).')
+   return True
+
+
+def _format_seconds(seconds: float) -> str:
+   seconds = int(seconds)
+   return '{}:{:02}:{:02}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
@@ -0,0 +1,165 @@
+import asyncio
+import contextlib
+import functools
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import *
+from logging import getLogger
+
+import atcoder_submit_status.utils as utils
+from atcoder_submit_status.crawler import SubmissionCrawler
+from atcoder_submit_status.service import AtCoderService
+from atcoder_submit_status.store import SubmissionStore
+from atcoder_submit_status.submission import Submission
+
+if TYPE_CHECKING:
+   import requests
+
+logger = getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class AsyncAtCoderService:
+   """
+   AtCoderService のコルーチン版です。asyncio のイベントループの中から、ボットやサービスに組み込んで使います。
+
+   通信と解析は AtCoderService と SubmissionCrawler をそのまま使い、最大 max_workers 個のスレッドで実行するので、
+   イベントループを止めずに、多くのコンテストやユーザの取得を同時に進められます。
+   クローラの一覧の更新とページの取得にも共有のスレッドのプールを使うので、同時に呼び出す数が増えてもスレッドは増えません。
+   すべての呼び出しで 1 つの requests.Session を共有し、同時に送るリクエストは合わせて max_connections 個まで、
+   リクエストの頻度は合わせて rate_limit 回/秒までに制限します。
+   Cookie は utils.with_cookiejar で cookie_path (省略したときは acss login と同じファイル) から読み込み、close() で保存します。
+   失敗したときは ServiceError (ServiceUnavailableError, LoginRequiredError) などの例外を送出します。
+
+      async with AsyncAtCoderService() as srv:
+         if await srv.is_logged_in():
+            results = await asyncio.gather(*[srv.fetch_submissions(contest, users=['']) for contest in ['abc300', 'arc160']])
+
+   use_store が真のときは、取得した提出を fetch と同じ保存先に保存し、次の呼び出しでは差分だけを取得します。
+   ユーザを省略したときは、読み込んだ Cookie のユーザの提出を取得します。
+   Python 3.7 以降が必要です。
+   """
+   def __init__(self, cookie_path: Optional[pathlib.Path] = None, max_connections: int = 8, max_workers: int = 32, rate_limit: float = utils.DEFAULT_REQUESTS_PER_SECOND, use_store: bool = True, srv: Optional[AtCoderService] = None):
+      self.srv = srv or AtCoderService()
+      self.cookie_path = cookie_path
+      self.max_connections = max(1, max_connections)
+      self.use_store = use_store
+      self.rate_limiter = utils.RateLimiter(rate_limit)
+      self.session: Optional['requests.Session'] = None
+      self._slots = threading.Semaphore(self.max_connections)
+      self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+      self._listing_executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+      self._page_executor = ThreadPoolExecutor(max_workers=self.max_connections)
+      self._stack = contextlib.ExitStack()
+      self._stores: Dict[str, SubmissionStore] = {}
+      self._lock = threading.Lock()
+
+
+   async def __aenter__(self) -> 'AsyncAtCoderService':
+      await self.open()
+      return self
+
+
+   async def __aexit__(self, *exc) -> None:
+      await self.close()
+
+
+   async def open(self) -> None:
+      """
+      セッションを作り、Cookie を読み込みます。
+      """
+      # cookie_path を指定しないときは、サービスごとの Cookie (acss login で保存したもの) を使う
+      service = None if self.cookie_path is not None else self.srv
+      context = utils.new_session_with_our_user_agent(self.cookie_path or utils.DEFAULT_COOKIE_PATH, service=service, pool_size=self.max_connections)
+      self.session = await self._run(self._stack.enter_context, context)
+
+
+   async def close(self) -> None:
+      """
+      Cookie を保存し、セッションと提出の保存先を閉じます。
+      """
+      await self._run(self._close)
+      for executor in [self._executor, self._listing_executor, self._page_executor]:
+         executor.shutdown(wait=False)
+
+
+   async def login(self, username: str, password: str) -> None:
+      await self._run(self.srv.login, username, password, session=self._get_session())
+
+
+   async def is_logged_in(self, max_age: float = 0.0) -> bool:
+      """
+      ログインしているかを確認します。max_age の意味は AtCoderService.is_logged_in() と同じです。
+      """
+      return await self._run(self.srv.is_logged_in, session=self._get_session(), max_age=max_age)
+
+
+   async def fetch_submissions(self, url: str, tasks: List[str] = [], languages: List[str] = [], statuses: List[str] = [], users: List[str] = [], refresh: bool = False, jobs: int = 4, tail: Optional[int] = None) -> List[Submission]:
+      """
+      絞り込んだ提出を提出時刻順に返します。引数の意味は AtCoderService.fetch_submissions() と同じです。
+
+      users に [''] を渡すと、すべてのユーザの提出を返します。省略したときは、ログインしているユーザの提出を返します。
+      取り消されたときは、取得中のページの次で取得を止めます。
+      """
+      session = self._get_session()
+      crawlers: List[SubmissionCrawler] = []
+
+      def fetch() -> List[Submission]:
+         store = self._get_store(url) if self.use_store else None
+         crawler = SubmissionCrawler(self.srv, url, tasks=tasks, languages=languages, statuses=statuses, users=users, session=session, store=store, refresh=refresh, jobs=jobs, rate_limiter=self.rate_limiter, slots=self._slots, tail=tail, listing_executor=self._listing_executor, page_executor=self._page_executor)
+         crawlers.append(crawler)
+         return crawler.update()
+
+      try:
+         return await self._run(fetch)
+      except asyncio.CancelledError:
+         for crawler in crawlers:
+            crawler.stop()
+         raise
+
+
+   async def get_task_names(self, url: str) -> List[str]:
+      """
+      問題名 ("A - N-choice question" など) を返します。url はコンテストの URL かコンテスト名です。
+      """
+      return await self._run(self.srv.get_task_names, url, session=self._get_session())
+
+
+   async def get_contest_window(self, url: str) -> Tuple[Optional[float], Optional[float]]:
+      """
+      コンテストの開始時刻と終了時刻を UNIX 時間で返します。
+      """
+      return await self._run(lambda: self.srv.get_contest_metadata(url, session=self._get_session()).get_window())
+
+
+   async def _run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+      # 通信を伴う処理は、イベントループを止めないようにスレッドで実行する
+      loop = asyncio.get_running_loop()
+      return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+
+   def _get_session(self) -> 'requests.Session':
+      if self.session is None:
+         raise RuntimeError('the session is not open: use `async with AsyncAtCoderService() as srv:` or call open()')
+      return self.session
+
+
+   def _get_store(self, url: str) -> SubmissionStore:
+      contest_round = self.srv.get_round(url)
+      with self._lock:
+         store = self._stores.get(contest_round)
+         if store is None:
+            store = self._stores[contest_round] = SubmissionStore(utils.get_store_path(self.srv, contest_round))
+         return store
+
+
+   def _close(self) -> None:
+      try:
+         self._stack.close()
+      finally:
+         with self._lock:
+            for store in self._stores.values():
+               store.close()
+            self._stores.clear()
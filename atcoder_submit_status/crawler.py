@@ -0,0 +1,537 @@
+import contextlib
+import queue
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import *
+import requests
+from logging import getLogger
+
+import atcoder_submit_status.utils as utils
+import atcoder_submit_status.profiler as profiler
+from atcoder_submit_status.service import SubmissionsPage
+from atcoder_submit_status.store import SubmissionStore
+from atcoder_submit_status.submission import Submission
+from atcoder_submit_status.table import SubmissionTable
+
+logger = getLogger(__name__)
+
+
+class _Listing:
+   """
+   提出一覧 1 つ分 (ユーザで絞り込んだものなど) の状態です。
+
+   提出 ID をキーとして、取得済みの提出を保持します。
+   取得済みの提出は、一覧の先頭から low までの範囲で途切れずに揃っています。
+   """
+   def __init__(self, key: str, params: Dict[str, str]):
+      self.key = key
+      self.params = params
+      self.submissions: Dict[int, Submission] = {}
+      self.first_page: Optional[SubmissionsPage] = None  # 権限の確認や計画を立てるときに取得した 1 ページ目
+      self.low: Optional[int] = None  # 取得済みの範囲で最も古い提出 ID
+      self.complete = False  # 一覧の最後まで取得済みか
+      self.checked_at = 0.0  # 最後に新しい提出を確認した時刻
+
+
+class SubmissionCrawler:
+   """
+   提出一覧を差分で取得します。
+
+   問題・言語・ジャッジの状態による絞り込みは、できるだけ提出一覧のクエリパラメータで行い、
+   値が複数あるときは組み合わせごとに別の一覧として取得します。
+   ただしジャッジの状態は、store を渡さないときだけサーバ側で絞り込みます。
+   提出 ID ごとに提出を覚えておき、2 回目以降の update() では
+   新しい提出が載っているページと、ジャッジ中の提出が載っているページだけを取得します。
+   store を渡すと取得した提出を保存し、次回はその続きから取得します。
+
+   jobs を 2 以上にすると、最大 jobs 個のリクエストを並行して送ります。
+   slots を渡すと、同時に送るリクエストの数を、それを共有するほかのクローラと合わせて制限します。
+   リクエストの頻度は rate_limiter で制限します。
+   一覧の更新とページの取得には、update() ごとに jobs 個のスレッドのプールを 2 つ作ります。
+   多くのクローラを同時に動かすときは、共有するプールを listing_executor と page_executor に渡すと、スレッドの数を抑えられます。
+
+   複数のユーザを指定したときは、ユーザごとの一覧を取得するか、
+   絞り込まない一覧を 1 つ取得して手元でユーザを絞り込むかを、
+   それぞれの一覧の 1 ページ目からわかるページ数をもとに、少ないリクエストで済む方に決めます。
+
+   tail を渡すと、絞り込み済みの最新の tail 個の提出だけを返します。
+   それぞれの一覧は 1 ページ目から順に、絞り込みの条件を満たす提出が tail 個揃うところまでしか取得しないので、
+   リクエスト数はコンテストの提出の数ではなく tail で決まります。
+   """
+   def __init__(self, srv, url: str, tasks: List[str] = [], languages: List[str] = [], statuses: List[str] = [], users: List[str] = [], session: Optional[requests.Session] = None, store: Optional[SubmissionStore] = None, refresh: bool = True, jobs: int = 1, rate_limiter: Optional[utils.RateLimiter] = None, slots: Optional[threading.Semaphore] = None, tail: Optional[int] = None, listing_executor: Optional[ThreadPoolExecutor] = None, page_executor: Optional[ThreadPoolExecutor] = None):
+      self.srv = srv
+      self.url = url
+      self.tasks = list(tasks)
+      self.languages = list(languages)
+      self.statuses = list(statuses)
+      self.session = session or utils.get_default_session()
+      self.store = store
+      self.refresh = refresh
+      self.jobs = max(1, jobs)
+      self.rate_limiter = rate_limiter or utils.get_default_rate_limiter()
+      self.tail = None if tail is None else max(0, tail)
+      self._users = list(users)
+      self._submissions_url: Optional[str] = None
+      self._listings: List[_Listing] = []
+      self._slots = slots or threading.Semaphore(self.jobs)
+      self._stopped = threading.Event()  # stop() で止めた (その後の update() も止める)
+      self._aborted = threading.Event()  # 実行中の update() が失敗したので、残りのページの取得を止める
+      self._listing_executor = listing_executor
+      self._page_executor = page_executor
+      self._executor: Optional[ThreadPoolExecutor] = None
+      self._queue: Optional[queue.Queue] = None
+      self._first_pages: Dict[str, SubmissionsPage] = {}  # 権限の確認のときに取得した 1 ページ目
+      self._table: Optional[SubmissionTable] = None  # 取得済みのすべての提出の表 (update() のたびに差分だけを反映する)
+      self._changed: List[Submission] = []  # 表に反映していない、取得した提出
+      self._changed_lock = threading.Lock()
+      self.metadata = srv.get_contest_metadata(url, session=self.session)
+
+
+   def update(self) -> List[Submission]:
+      """
+      提出一覧を最新の状態に更新し、絞り込み済みの提出を提出時刻順に返します。
+      """
+      for _ in self.iter_update():
+         pass
+
+      table = self.get_table()
+      rows = self.select(table)
+      if self.tail is not None:
+         # それぞれの一覧の最新の tail 個を合わせたものから、全体の最新の tail 個を選ぶ
+         rows = rows[len(rows) - self.tail:] if len(rows) > self.tail else rows
+      return table.to_submissions(rows)
+
+
+   @profiler.profiled('select')
+   def get_table(self) -> SubmissionTable:
+      """
+      取得済みのすべての提出 (絞り込む前のもの) を、提出時刻順の表にして返します。
+
+      表はクローラごとに 1 つで、前回から取得した提出だけを追加・更新します。
+      返した表は、その後の update() でも更新されます。
+      """
+      with self._changed_lock:
+         changed, self._changed = self._changed, []
+      if self._table is None:
+         submissions = {}
+         for listing in self._listings:
+            submissions.update(listing.submissions)
+         self._table = SubmissionTable(submissions.values())
+      else:
+         self._table.upsert(changed)
+      return self._table
+
+
+   def select(self, table: SubmissionTable) -> Sequence[int]:
+      """
+      表の行のうち、絞り込みの条件を満たすものの番号を、提出時刻順に返します。
+      """
+      return table.select(tasks=self.tasks, languages=self.languages, statuses=self.statuses, users=self._users)
+
+
+   def iter_update(self) -> Iterator[List[Submission]]:
+      """
+      提出一覧を update() と同じように更新しながら、絞り込み済みの提出をページごとに返します。
+
+      保存済みの提出を最初に返し、その後は取得した順に返します (提出時刻順ではありません)。
+      それぞれの提出は 1 回だけ返します。
+      """
+      # 一覧ごとの更新と、一覧の中のページの取得を、それぞれ並行して行う
+      if self._stopped.is_set():
+         raise RuntimeError('the crawler has been stopped')
+      self._aborted.clear()
+      emitted = set()
+      with contextlib.ExitStack() as stack:
+         # 渡されたプールは、ほかのクローラと共有しているので閉じない
+         # (一覧の更新はページの取得を待つが、ページの取得は何も待たないので、共有しても詰まらない)
+         executor = self._listing_executor or stack.enter_context(ThreadPoolExecutor(max_workers=self.jobs))
+         self._executor = self._page_executor or stack.enter_context(ThreadPoolExecutor(max_workers=self.jobs))
+         # サーバ側で状態を絞り込んだ一覧 (保存しないもの) は差分では更新できないので、2 回目以降は取得し直す
+         if any('f.Status' in listing.params for listing in self._listings):
+            self._listings = []
+         if not self._listings:
+            # 一覧を読み込み直すので、表も作り直す
+            self._table = None
+            self._prepare(executor)
+
+         listings = []
+         for listing in self._listings:
+            if self._is_settled(listing):
+               logger.debug(f'skip the finished listing: {listing.key}')
+               continue
+            listings.append(listing)
+
+         # ジャッジ中の提出は取得し直すので、保存済みのものは返さない
+         stored = [s for listing in self._listings for s in listing.submissions.values() if not self.srv.is_judging(s)]
+         yield self._emit(stored, emitted)
+
+         # 取得したページの提出は、_save() からキューを通して受け取る
+         rows_queue = self._queue = queue.Queue()
+         futures = [executor.submit(self._update_listing, listing) for listing in listings]
+         for future in futures:
+            future.add_done_callback(lambda _: rows_queue.put(None))
+         try:
+            remaining = len(futures)
+            while remaining:
+               rows = rows_queue.get()
+               if rows is None:
+                  remaining -= 1
+                  continue
+               yield self._emit(rows, emitted)
+            for future in futures:
+               future.result()
+
+            # ページがずれて取得し直せなかったジャッジ中の提出などの残りを返す
+            yield self._emit([s for listing in self._listings for s in listing.submissions.values()], emitted)
+         except BaseException:
+            self._aborted.set()
+            for future in futures:
+               future.cancel()
+            raise
+         finally:
+            self._queue = None
+
+
+   def stop(self) -> None:
+      """
+      取得を中断します。実行中の update() は、次のページを取得しようとしたところで RuntimeError で終わります。
+      update() を始める前に呼び出したときも、その後の update() は同じように終わります。
+
+      取得済みの提出は保存してあるので、新しいクローラの update() でその続きから取得します。
+      """
+      self._stopped.set()
+
+
+   def get_contest_window(self) -> Tuple[Optional[float], Optional[float]]:
+      """
+      コンテストの開始時刻と終了時刻を UNIX 時間で返します。
+
+      コンテストのメタデータに保存してあれば、それを使います。
+      """
+      return self.metadata.get_window()
+
+
+   @profiler.profiled('select')
+   def _select(self, submissions: Iterable[Submission]) -> List[Submission]:
+      # ユーザで絞り込まない一覧を取得したときは、ここでユーザを絞り込む
+      users = [user.lower() for user in self._users]
+      res = []
+      for s in submissions:
+         if '' not in users and s.user.lower() not in users:
+            continue
+         if self.srv.match_submission(s, tasks=self.tasks, languages=self.languages, statuses=self.statuses):
+            res.append(s)
+      return res
+
+
+   def _emit(self, rows: List[Submission], emitted: Set[int]) -> List[Submission]:
+      res = [s for s in self._select(rows) if s.id not in emitted]
+      emitted.update(s.id for s in res)
+      return res
+
+
+   def _run_all(self, executor: ThreadPoolExecutor, fn: Callable[[_Listing], Any], listings: List[_Listing]) -> List[Any]:
+      futures = [executor.submit(fn, listing) for listing in listings]
+      try:
+         return [future.result() for future in futures]
+      except BaseException:
+         self._aborted.set()
+         for future in futures:
+            future.cancel()
+         raise
+
+
+   def _prepare(self, executor: ThreadPoolExecutor) -> None:
+      if not self._users:
+         self._users = self.srv.get_default_users(session=self.session)
+
+      with_filters = bool(self.tasks or self.languages or self.statuses)
+      self._submissions_url, filters = self._get_cached_submissions_url(with_filters)
+      if self._submissions_url is None:
+         # 権限の確認を兼ねて、最初に取得する一覧 (複数のユーザのときは、見積もりに使う絞り込まない一覧) の 1 ページ目を取得する
+         params = { 'f.User': self._users[0] if len(self._users) == 1 else '' }
+         self.rate_limiter.wait()
+         self._submissions_url, filters, first_page = self.srv.get_submissions_url(self.url, params=params, session=self.session)
+         self._first_pages[self._get_listing_key(params)] = first_page
+         if self.store is not None:
+            self.store.set_meta('submissions_url', [self._submissions_url, time.time(), filters])
+         # 絞り込みの選択肢から、問題と言語をメタデータに保存しておく
+         self.metadata.update_from_filters(filters)
+
+      # 途中で失敗したときは、次の update() で最初からやり直す
+      # ジャッジの状態で絞り込んだ一覧には、ジャッジが終わった提出が既知の提出より後ろに現れることがあり、
+      # 差分の取得では見つけられないので、保存する一覧ではサーバ側で状態を絞り込まない
+      listings = []
+      statuses = self.statuses if self.store is None else []
+      filter_params = self.srv.make_filter_params(filters or {}, tasks=self.tasks, languages=self.languages, statuses=statuses)
+      for params in filter_params:
+         user_listings = [self._new_listing(dict({ 'f.User': user }, **params)) for user in self._users]
+         if len(user_listings) == 1 or '' in self._users:
+            listings.extend(user_listings)
+         else:
+            listings.extend(self._plan(executor, user_listings, self._new_listing(dict({ 'f.User': '' }, **params))))
+      self._listings = listings
+
+
+   def _new_listing(self, params: Dict[str, str]) -> _Listing:
+      listing = _Listing(self._get_listing_key(params), params)
+      listing.first_page = self._first_pages.pop(listing.key, None)
+      if self.store is not None:
+         listing.submissions, listing.low, listing.complete, listing.checked_at = self.store.load_listing(listing.key)
+         logger.debug(f'load {len(listing.submissions)} submissions from the store: {listing.key}')
+      return listing
+
+
+   def _get_listing_key(self, params: Dict[str, str]) -> str:
+      suffix = '/me' if self._submissions_url.endswith('/me') else ''
+      return suffix + '?' + urllib.parse.urlencode(params)
+
+
+   def _plan(self, executor: ThreadPoolExecutor, user_listings: List[_Listing], all_listing: _Listing) -> List[_Listing]:
+      """
+      ユーザごとの一覧と、ユーザで絞り込まない一覧のどちらを取得するかを決めます。
+
+      取得済みの一覧はそのまま使い、そうでなければ 1 ページ目を取得してページ数から必要なリクエスト数を見積もります。
+      ここで取得した 1 ページ目は、そのまま一覧の更新に使います。
+      """
+      if self._is_settled(all_listing):
+         logger.info(f'plan: use the stored submissions of all users ({all_listing.key})')
+         return [all_listing]
+      if all(self._is_settled(listing) for listing in user_listings):
+         logger.info('plan: use the stored submissions of each user')
+         return user_listings
+
+      # ユーザごとの一覧は 1 つあたり少なくとも 1 リクエストかかるので、
+      # 絞り込まない一覧の方が少なく済むとわかれば、ユーザごとの一覧は見積もらない
+      all_cost = self._estimate(all_listing)
+      if all_cost <= len(user_listings):
+         user_cost = len(user_listings)
+      else:
+         user_cost = sum(self._run_all(executor, self._estimate, user_listings))
+
+      if all_cost < user_cost:
+         logger.info(f'plan: fetch the submissions of all users and select {len(user_listings)} users ({all_listing.key}): expect {all_cost} requests, saving at least {user_cost - all_cost} requests')
+         return [all_listing]
+      else:
+         logger.info(f'plan: fetch the submissions of each user ({len(user_listings)} users): expect {user_cost} requests, saving {all_cost - user_cost} requests')
+         return user_listings
+
+
+   def _estimate(self, listing: _Listing) -> int:
+      """
+      一覧を更新するのに必要なリクエスト数を見積もります。
+      """
+      per_page = self.srv.get_submissions_per_page()
+      if listing.first_page is None:
+         listing.first_page = self._fetch_page(listing, 1)
+      stored_pages = 0
+      if listing.low is not None:
+         stored_pages = sum(1 for submission_id in listing.submissions if submission_id >= listing.low) // per_page
+      pending_pages = len({rank // per_page + 1 for rank, submission_id in self._iter_ranks(listing) if self.srv.is_judging(listing.submissions[submission_id])})
+      pages = listing.first_page.last_page
+      if self.tail is not None:
+         # 1 ページ目で条件を満たす提出の割合が、その後のページでも同じとして見積もる
+         matched = len(self._select(listing.first_page.submissions))
+         if matched:
+            pages = min(pages, -(-self.tail // matched))
+      return max(1, pages - stored_pages) + pending_pages
+
+
+   def _update_listing(self, listing: _Listing) -> None:
+      per_page = self.srv.get_submissions_per_page()
+      fetched_pages = set()
+      known = set(listing.submissions)
+      checked_at = time.time()
+
+      # 新しい提出は先頭のページに載るので、既知の提出が現れるまでページを進める
+      # (取得中に新しい提出があるとページがずれるので、このページ送りで見た提出は既知に含めない)
+      # 初回は 1 ページ目からページ数がわかるので、2 ページ目以降は続きの取得としてまとめて取得する
+      new_rows = []
+      last_page = 1
+      page = 0
+      while True:
+         page += 1
+         if page == 1 and listing.first_page is not None:
+            result, listing.first_page = listing.first_page, None
+         else:
+            result = self._fetch_page(listing, page)
+         fetched_pages.add(page)
+         last_page = max(last_page, result.last_page)
+         rows = result.submissions
+         if not rows:
+            if not known:
+               listing.complete = True
+            break
+         is_known = any(s.id in known for s in rows)
+         if known:
+            listing.submissions.update((s.id, s) for s in rows)
+            new_rows.extend(rows)
+         else:
+            self._extend(listing, rows)
+         if is_known or len(rows) < per_page or not known:
+            break
+      listing.checked_at = checked_at
+      self._save(listing, new_rows)
+
+      # 前回中断した取得の続きを取得する
+      # 提出 ID は提出順に増えるので、ID の降順に並べたときの位置からページがわかる
+      # (その後に新しい提出があっても、ページが後ろにずれて重複するだけで取りこぼしはない)
+      if not listing.complete and listing.low is not None and self.tail is not None:
+         # 最新の tail 個だけが必要なときは、1 ページずつ取得して、条件を満たす提出が揃ったところで止める
+         page = sum(1 for submission_id in listing.submissions if submission_id >= listing.low) // per_page + 1
+         while not listing.complete and not self._has_tail(listing):
+            result = self._fetch_page(listing, page)
+            fetched_pages.add(page)
+            self._extend(listing, result.submissions)
+            page += 1
+      elif not listing.complete and listing.low is not None:
+         start = sum(1 for submission_id in listing.submissions if submission_id >= listing.low) // per_page + 1
+         if known:
+            logger.info(f'resume fetching submissions from page {start}')
+         top = max(listing.submissions)
+         self._walk(listing, start, last_page, fetched_pages, parallel=True)
+
+         # 並行して取得している間に新しい提出があると、ページのずれで提出を取りこぼすことがあるので、
+         # そのときは 1 ページずつ取得し直す
+         if self.jobs > 1 and last_page > start:
+            result = self._fetch_page(listing, 1)
+            if any(s.id > top for s in result.submissions):
+               logger.debug(f'new submissions arrived while fetching pages in parallel: {listing.key}')
+               listing.complete = False
+               self._walk(listing, start, start, fetched_pages, parallel=False)
+
+      # ジャッジ中の提出が載っているページを再取得する
+      pending_pages = set()
+      for rank, submission_id in self._iter_ranks(listing):
+         if self.srv.is_judging(listing.submissions[submission_id]):
+            pending_pages.add(rank // per_page + 1)
+
+      for page, result in self._fetch_pages(listing, sorted(pending_pages - fetched_pages)):
+         listing.submissions.update((s.id, s) for s in result.submissions)
+         self._save(listing, result.submissions)
+
+
+   def _iter_ranks(self, listing: _Listing) -> Iterator[Tuple[int, int]]:
+      """
+      一覧の提出 ID を、新しい順に (一覧の先頭からの位置, 提出 ID) として返します。
+
+      tail を渡したときは、条件を満たす提出が tail 個揃ったところまでを返します。
+      """
+      selected = set() if self.tail is None else { s.id for s in self._select(listing.submissions.values()) }
+      matched = 0
+      for rank, submission_id in enumerate(sorted(listing.submissions, reverse=True)):
+         if self.tail is not None and matched >= self.tail:
+            return
+         yield rank, submission_id
+         if submission_id in selected:
+            matched += 1
+
+
+   def _has_tail(self, listing: _Listing) -> bool:
+      """
+      一覧の先頭から途切れずに取得済みの範囲に、条件を満たす提出が tail 個あるかを判定します。
+      """
+      if self.tail is None or listing.low is None:
+         return False
+      rows = [s for submission_id, s in listing.submissions.items() if submission_id >= listing.low]
+      return len(self._select(rows)) >= self.tail
+
+
+   def _walk(self, listing: _Listing, start: int, last_page: int, fetched_pages: Set[int], parallel: bool) -> None:
+      """
+      start ページから一覧の最後までを取得します。
+
+      parallel が真のときは last_page までを並行して取得し、それ以降は 1 ページずつ取得します。
+      """
+      page = start - 1
+      if parallel:
+         for page, result in self._fetch_pages(listing, list(range(start, max(start, last_page) + 1))):
+            fetched_pages.add(page)
+            self._extend(listing, result.submissions)
+            if listing.complete:
+               return
+      while not listing.complete:
+         page += 1
+         result = self._fetch_page(listing, page)
+         fetched_pages.add(page)
+         self._extend(listing, result.submissions)
+
+
+   def _extend(self, listing: _Listing, rows: List[Submission]) -> None:
+      """
+      一覧の末尾に続くページの提出を追加して保存します。
+      """
+      if rows:
+         listing.submissions.update((s.id, s) for s in rows)
+         oldest = min(s.id for s in rows)
+         listing.low = oldest if listing.low is None else min(listing.low, oldest)
+      if len(rows) < self.srv.get_submissions_per_page():
+         listing.complete = True
+      self._save(listing, rows)
+
+
+   def _fetch_pages(self, listing: _Listing, pages: List[int]) -> Iterator[Tuple[int, SubmissionsPage]]:
+      """
+      複数のページを並行して取得し、ページ番号の順に返します。
+      """
+      futures = [self._executor.submit(self._fetch_page, listing, page) for page in pages]
+      try:
+         for page, future in zip(pages, futures):
+            yield page, future.result()
+      finally:
+         for future in futures:
+            future.cancel()
+
+
+   def _fetch_page(self, listing: _Listing, page: int) -> SubmissionsPage:
+      if self._stopped.is_set() or self._aborted.is_set():
+         raise RuntimeError('the crawler has been stopped')
+      with self._slots:
+         logger.debug(utils.NETWORK + f'GET: {self._submissions_url} (page={page}, {listing.params})')
+         return self.srv.fetch_submissions_page(self._submissions_url, page, params=listing.params, session=self.session, rate_limiter=self.rate_limiter)
+
+
+   def _save(self, listing: _Listing, rows: List[Submission]) -> None:
+      with self._changed_lock:
+         self._changed.extend(rows)
+      if self.store is not None:
+         with profiler.get_profiler().phase('store'):
+            self.store.save_listing(listing.key, rows, listing.low, listing.complete, listing.checked_at)
+      if self._queue is not None and rows:
+         self._queue.put(rows)
+
+
+   def _is_settled(self, listing: _Listing) -> bool:
+      """
+      コンテストが終わった後に最後まで取得済みで、ジャッジ中の提出もない一覧であるかを判定します。
+
+      このような一覧は、refresh が指定されない限り取得し直しません。
+      """
+      if self.refresh or self.store is None or not listing.complete:
+         return False
+      if any(self.srv.is_judging(s) for s in listing.submissions.values()):
+         return False
+      end = self._get_contest_end()
+      return end is not None and end < listing.checked_at
+
+
+   def _get_cached_submissions_url(self, with_filters: bool) -> Tuple[Optional[str], Optional[Dict[str, Dict[str, str]]]]:
+      # 全体の提出を見る権限は、コンテストが終わった後に確認したものであれば変わらない
+      if self.refresh or self.store is None:
+         return None, None
+      cached = self.store.get_meta('submissions_url')
+      if cached is None or len(cached) < 3:
+         return None, None
+      submissions_url, resolved_at, filters = cached
+      if with_filters and filters is None:
+         return None, None
+      end = self._get_contest_end()
+      if end is not None and end < resolved_at:
+         return submissions_url, filters
+      return None, None
+
+
+   def _get_contest_end(self) -> Optional[float]:
+      return self.get_contest_window()[1]
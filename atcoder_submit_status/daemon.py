@@ -0,0 +1,420 @@
+import argparse
+import contextlib
+import json
+import os
+import pathlib
+import socket
+import socketserver
+import sys
+import threading
+import time
+from typing import *
+from logging import getLogger
+
+import atcoder_submit_status.utils as utils
+import atcoder_submit_status.profiler as profiler
+import atcoder_submit_status.service as service
+from atcoder_submit_status.crawler import SubmissionCrawler
+from atcoder_submit_status.scheduler import PollScheduler
+from atcoder_submit_status.store import SubmissionStore
+from atcoder_submit_status.submission import Status, Submission
+
+logger = getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = utils.USER_DATA_PATH / 'daemon.sock'
+IDLE_TIMEOUT = 600.0  # 最後に問い合わせがあってから、この秒数が過ぎた提出一覧は更新をやめる
+MAX_WAIT = 60.0  # 変化を待つ問い合わせで、待つ最大の秒数
+
+
+def add_subparser(subparsers: argparse.Action) -> None:
+   subparsers_add_parser: Callable[..., argparse.ArgumentParser] = subparsers.add_parser  # type: ignore
+   subparser = subparsers_add_parser('daemon', help='Keep polling the contest submissions in the background for fetch and watch', formatter_class=argparse.RawTextHelpFormatter, epilog='''\
+`acss fetch --daemon` and `acss watch --daemon` get the submissions from the daemon
+through the socket instead of fetching them themselves.
+
+Supported Services:
+  √ AtCoder
+''')
+   subparser.add_argument('--socket', metavar='<path>', type=pathlib.Path, default=DEFAULT_SOCKET_PATH, help=f'Listen on the Unix domain socket <path>. (default: {DEFAULT_SOCKET_PATH})')
+   subparser.add_argument('-j', '--jobs', metavar='<n>', default=4, type=int, help='Send up to <n> requests at the same time. (default: 4)')
+   subparser.add_argument('--rate-limit', metavar='<n>', default=utils.DEFAULT_REQUESTS_PER_SECOND, type=float, help=f'Send at most <n> requests per second. (default: {utils.DEFAULT_REQUESTS_PER_SECOND})')
+   subparser.add_argument('--min-interval', metavar='<sec>', default=1.0, type=float, help='Update every <sec> seconds while submissions are being judged. (default: 1)')
+   subparser.add_argument('--max-interval', metavar='<sec>', default=60.0, type=float, help='Update at least every <sec> seconds when nothing changes. (default: 60)')
+   subparser.add_argument('--status', action='store_true', help='Print the submission lists the running daemon is polling, and exit.')
+   subparser.add_argument('--stop', action='store_true', help='Stop the running daemon.')
+
+
+def add_client_argument(subparser: argparse.ArgumentParser) -> None:
+   """
+   fetch, watch に、デーモンから提出を受け取るためのオプションを加えます。
+   """
+   subparser.add_argument('--daemon', metavar='<socket>', nargs='?', type=pathlib.Path, const=DEFAULT_SOCKET_PATH, help=f'Get the submissions from `acss daemon` listening on <socket>.\n(default: {DEFAULT_SOCKET_PATH})')
+
+
+class DaemonError(Exception):
+   """
+   デーモンに接続できなかったか、デーモンとのやりとりに失敗したことを表します。
+   """
+
+
+class _Feed:
+   """
+   デーモンが更新し続けている提出一覧 1 つ分 (コンテストと絞り込みの条件の組) です。
+   """
+   def __init__(self, key: Tuple[Any, ...], crawler: SubmissionCrawler, scheduler: PollScheduler):
+      self.key = key
+      self.crawler = crawler
+      self.scheduler = scheduler
+      self.lock = threading.Lock()  # crawler の更新を 1 つずつ行う
+      # submissions, version, error は Daemon._lock を持って書き換える
+      self.submissions: Optional[List[Submission]] = None  # まだ取得していないときは None
+      self.version = 0  # submissions が変化するごとに増やす
+      self.error: Optional[service.ServiceError] = None  # 最後の更新で起きたエラー
+      self.used_at = time.time()
+
+
+class Daemon:
+   """
+   1 つのセッションで、問い合わせのあったコンテストの提出一覧を更新し続けます。
+
+   提出一覧は、コンテストと絞り込みの条件の組ごとに SubmissionCrawler で差分を取得し、
+   watch と同じように PollScheduler で決めた間隔で更新します。
+   問い合わせには、メモリに持っている最新の提出を返します。
+   IDLE_TIMEOUT 秒の間問い合わせのなかった提出一覧は、更新をやめて捨てます (使われなくなったコンテストの保存先も閉じます)。
+   複数のスレッドから問い合わせることができます。
+   """
+   def __init__(self, srv: service.Service, session, jobs: int = 4, rate_limiter: Optional[utils.RateLimiter] = None, min_interval: float = 1.0, max_interval: float = 60.0):
+      self.srv = srv
+      self.session = session
+      self.jobs = jobs
+      self.rate_limiter = rate_limiter or utils.get_default_rate_limiter()
+      self.min_interval = min_interval
+      self.max_interval = max_interval
+      self._feeds: Dict[Tuple[Any, ...], _Feed] = {}
+      self._stores: Dict[str, SubmissionStore] = {}
+      self._lock = threading.Lock()
+      self._changed = threading.Condition(self._lock)  # いずれかの提出一覧が変化したときに通知する
+      self._wakeup = threading.Event()  # 新しい提出一覧が加わったときに、更新のループを起こす
+      self._stopped = threading.Event()
+
+
+   def get_submissions(self, url: str, tasks: List[str] = [], languages: List[str] = [], statuses: List[str] = [], users: List[str] = [], refresh: bool = False, version: Optional[int] = None, timeout: float = 0.0) -> Dict[str, Any]:
+      """
+      絞り込んだ提出を提出時刻順に返します。初めての条件のときは、その場で取得します。
+
+      version に前回受け取った版を渡すと、変化するまで最大 timeout 秒待ち、変化がなければ提出を省いて返します。
+      refresh を指定すると、終了したコンテストでもその場で新しい提出を確認します。
+      """
+      feed = self._get_feed(url, tasks, languages, statuses, users)
+      if refresh:
+         self._update(feed, refresh=True)
+      elif feed.submissions is None:
+         # 同時に来た問い合わせや更新のループが先に取得したときは、それを使う
+         self._update(feed, only_if_new=True)
+
+      with self._lock:
+         if feed.submissions is None:
+            # 最初の取得に失敗した (更新は submissions か error のどちらかを必ず設定する)
+            raise feed.error or service.ServiceError('failed to fetch the submissions')
+         feed.used_at = time.time()
+         if version is not None and timeout > 0:
+            self._changed.wait_for(lambda: feed.version != version or self._stopped.is_set(), timeout=min(timeout, MAX_WAIT))
+         res: Dict[str, Any] = { 'version': feed.version, 'caption': feed.scheduler.describe() }
+         if feed.error is not None:
+            res['warning'] = str(feed.error)
+         if feed.version != version:
+            res['submissions'] = [_encode_submission(s) for s in feed.submissions]
+      return res
+
+
+   def get_status(self) -> Dict[str, Any]:
+      with self._lock:
+         feeds = list(self._feeds.values())
+      return {
+         'pid': os.getpid(),
+         'feeds': [{
+            'url': feed.crawler.url,
+            'tasks': feed.crawler.tasks,
+            'languages': feed.crawler.languages,
+            'statuses': feed.crawler.statuses,
+            'users': list(feed.key[-1]),
+            'submissions': len(feed.submissions or []),
+            'version': feed.version,
+            'caption': feed.scheduler.describe(),
+         } for feed in feeds],
+      }
+
+
+   def poll_forever(self) -> None:
+      """
+      stop() が呼ばれるまで、更新の時刻になった提出一覧を更新し続けます。
+      """
+      while not self._stopped.is_set():
+         self._wakeup.clear()
+         self._drop_idle_feeds()
+         with self._lock:
+            feeds = list(self._feeds.values())
+         for feed in feeds:
+            if feed.scheduler.is_due() and not self._stopped.is_set():
+               self._update(feed, only_if_due=True)
+         next_polls = [feed.scheduler.next_poll for feed in feeds if feed.scheduler.next_poll is not None]
+         delay = min(next_polls) - time.time() if next_polls else IDLE_TIMEOUT
+         self._wakeup.wait(timeout=max(0.0, min(delay, IDLE_TIMEOUT)))
+
+
+   def stop(self) -> None:
+      self._stopped.set()
+      self._wakeup.set()
+      with self._lock:
+         self._changed.notify_all()
+
+
+   def close(self) -> None:
+      for store in self._stores.values():
+         store.close()
+
+
+   def _get_feed(self, url: str, tasks: List[str], languages: List[str], statuses: List[str], users: List[str]) -> _Feed:
+      contest_round = self.srv.get_round(url)
+      key = (contest_round, tuple(sorted(task.lower() for task in tasks)), tuple(sorted(languages)), tuple(sorted(statuses)), tuple(sorted(user.lower() for user in users)))
+      while True:
+         with self._lock:
+            feed = self._feeds.get(key)
+            if feed is not None:
+               # 返した提出一覧を、使う前に捨てないようにする
+               feed.used_at = time.time()
+               return feed
+            store = self._stores.get(contest_round)
+            if store is None:
+               store = self._stores[contest_round] = SubmissionStore(utils.get_store_path(self.srv, contest_round))
+         crawler = SubmissionCrawler(self.srv, url, tasks=tasks, languages=languages, statuses=statuses, users=users, session=self.session, store=store, refresh=False, jobs=self.jobs, rate_limiter=self.rate_limiter)
+         scheduler = PollScheduler(self.min_interval, self.max_interval, *crawler.get_contest_window())
+         with self._lock:
+            # 開催期間を取得している間に、保存先が閉じられたときは作り直す
+            if self._stores.get(contest_round) is not store:
+               continue
+            # 同時に同じ条件の問い合わせがあったときは、先に登録したものを使う
+            feed = self._feeds.setdefault(key, _Feed(key, crawler, scheduler))
+         break
+      logger.info(f'start polling: {contest_round} {dict(zip(["tasks", "languages", "statuses", "users"], key[1:]))}')
+      self._wakeup.set()
+      return feed
+
+
+   def _update(self, feed: _Feed, refresh: bool = False, only_if_due: bool = False, only_if_new: bool = False) -> None:
+      with feed.lock:
+         # 待っている間に問い合わせを受けて更新したときは、更新し直さない
+         if only_if_due and not feed.scheduler.is_due():
+            return
+         if only_if_new and feed.submissions is not None:
+            return
+         feed.crawler.refresh = refresh
+         try:
+            with profiler.get_profiler().phase('fetch'):
+               res = feed.crawler.update()
+         except service.ServiceUnavailableError as e:
+            logger.warning(e)
+            with self._lock:
+               feed.error = e
+            feed.scheduler.on_error(e.retry_after)
+            return
+         except service.ServiceError as e:
+            logger.error(e)
+            with self._lock:
+               feed.error = e
+            feed.scheduler.on_error()
+            return
+         finally:
+            feed.crawler.refresh = False
+         changed = res != feed.submissions
+         feed.scheduler.on_update(changed=changed, judging=any(self.srv.is_judging(s) for s in res))
+         with self._lock:
+            feed.error = None
+            if changed:
+               feed.submissions = res
+               feed.version += 1
+            self._changed.notify_all()
+
+
+   def _drop_idle_feeds(self) -> None:
+      now = time.time()
+      dropped = []
+      with self._lock:
+         for key, feed in list(self._feeds.items()):
+            if now - feed.used_at > IDLE_TIMEOUT:
+               logger.info(f'stop polling: {key[0]} (no requests for {IDLE_TIMEOUT:.0f} seconds)')
+               del self._feeds[key]
+               dropped.append(feed)
+         # ほかの提出一覧が使っていないコンテストの保存先は、外してから閉じる
+         used = { key[0] for key in self._feeds }
+         stores = { contest_round: self._stores.pop(contest_round) for contest_round in list(self._stores) if contest_round not in used }
+      for feed in dropped:
+         # 実行中の更新が終わるのを待つ
+         with feed.lock:
+            pass
+      for contest_round, store in stores.items():
+         logger.debug(f'close the store: {contest_round}')
+         store.close()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+   """
+   1 行に 1 つの JSON オブジェクトで問い合わせを受け取り、1 行の JSON オブジェクトで答えます。
+   """
+   server: '_Server'
+
+   def handle(self) -> None:
+      for line in self.rfile:
+         try:
+            response = self._dispatch(json.loads(line))
+         except service.LoginRequiredError as e:
+            response = { 'error': str(e), 'type': 'login' }
+         except service.ServiceUnavailableError as e:
+            response = { 'error': str(e), 'type': 'unavailable', 'status_code': e.status_code, 'retry_after': e.retry_after }
+         except service.ServiceError as e:
+            response = { 'error': str(e), 'type': 'service', 'status_code': e.status_code }
+         except Exception as e:
+            logger.exception(e)
+            response = { 'error': f'{type(e).__name__}: {e}', 'type': 'internal' }
+         try:
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode() + b'\n')
+            self.wfile.flush()
+         except BrokenPipeError:
+            return
+
+
+   def _dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+      daemon = self.server.daemon
+      method = request.get('method')
+      if method == 'submissions':
+         return daemon.get_submissions(request['url'], tasks=request.get('tasks', []), languages=request.get('languages', []), statuses=request.get('statuses', []), users=request.get('users', []), refresh=request.get('refresh', False), version=request.get('version'), timeout=request.get('timeout', 0.0))
+      if method == 'status':
+         return daemon.get_status()
+      if method == 'stop':
+         logger.info('stop the daemon')
+         daemon.stop()
+         return {}
+      return { 'error': f'unknown method: {method}', 'type': 'internal' }
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+   daemon_threads = True
+
+   def __init__(self, path: pathlib.Path, daemon: Daemon):
+      super().__init__(str(path), _Handler)
+      self.daemon = daemon
+
+
+class DaemonClient:
+   """
+   acss daemon に問い合わせます。
+   """
+   def __init__(self, path: pathlib.Path = DEFAULT_SOCKET_PATH):
+      self.path = path
+
+
+   def request(self, request: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+      """
+      問い合わせを 1 つ送り、答えを返します。デーモンで起きたサービスのエラーは、同じ種類の例外として送出します。
+      """
+      try:
+         with contextlib.closing(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(self.path))
+            sock.sendall(json.dumps(request).encode() + b'\n')
+            with sock.makefile('rb') as f:
+               line = f.readline()
+      except (FileNotFoundError, ConnectionRefusedError) as e:
+         raise DaemonError(f'the daemon is not running: {self.path}') from e
+      except OSError as e:
+         raise DaemonError(f'failed to talk to the daemon: {e}') from e
+      if not line:
+         raise DaemonError('the daemon closed the connection')
+
+      response = json.loads(line)
+      error = response.get('error')
+      if error is not None:
+         kind = response.get('type')
+         if kind == 'login':
+            raise service.LoginRequiredError(error)
+         if kind == 'unavailable':
+            e = service.ServiceUnavailableError(response.get('status_code'), reason=error)
+            e.retry_after = response.get('retry_after')
+            raise e
+         if kind == 'service':
+            raise service.ServiceError(error, response.get('status_code'))
+         raise DaemonError(error)
+      return response
+
+
+   def get_submissions(self, url: str, tasks: List[str] = [], languages: List[str] = [], statuses: List[str] = [], users: List[str] = [], refresh: bool = False, version: Optional[int] = None, timeout: float = 0.0) -> Tuple[int, Optional[List[Submission]], str]:
+      """
+      (版, 提出時刻順の提出, 次の更新時刻の説明) を返します。version から変化がないときは、提出の代わりに None を返します。
+      """
+      response = self.request({ 'method': 'submissions', 'url': url, 'tasks': tasks, 'languages': languages, 'statuses': statuses, 'users': users, 'refresh': refresh, 'version': version, 'timeout': timeout })
+      if 'warning' in response:
+         logger.debug(f"daemon: {response['warning']}")
+      submissions = response.get('submissions')
+      return response['version'], None if submissions is None else [_decode_submission(row) for row in submissions], response['caption']
+
+
+def run(args: argparse.Namespace) -> bool:
+   client = DaemonClient(args.socket)
+   if args.stop or args.status:
+      try:
+         response = client.request({ 'method': 'stop' if args.stop else 'status' })
+      except DaemonError as e:
+         logger.error(e)
+         return False
+      if args.status:
+         json.dump(response, sys.stdout, ensure_ascii=False, indent=2)
+         print()
+      return True
+
+   # 同じソケットで動いているデーモンがあれば、起動しない
+   with contextlib.suppress(DaemonError):
+      client.request({ 'method': 'status' }, timeout=5.0)
+      logger.error(f'the daemon is already running: {args.socket}')
+      return False
+
+   srv = service.AtCoderService()
+   with utils.new_session_with_our_user_agent(args.cookie, service=srv, pool_size=args.jobs) as session:
+      logger.debug('start session')
+      if not srv.is_logged_in(session, max_age=utils.LOGIN_STATUS_MAX_AGE):
+         logger.info(utils.FAILURE + 'You are not signed in.')
+         logger.info(utils.HINT + f'You can try to enter this command: `acss login {srv.get_name()}`')
+         return False
+
+      daemon = Daemon(srv, session, jobs=args.jobs, rate_limiter=utils.RateLimiter(args.rate_limit), min_interval=args.min_interval, max_interval=args.max_interval)
+      args.socket.parent.mkdir(parents=True, exist_ok=True)
+      with contextlib.suppress(FileNotFoundError):
+         args.socket.unlink()
+      # ソケットからはログインしたセッションを使えるので、自分だけが接続できるようにする
+      old_umask = os.umask(0o177)
+      try:
+         server = _Server(args.socket, daemon)
+      finally:
+         os.umask(old_umask)
+      thread = threading.Thread(target=server.serve_forever, daemon=True)
+      thread.start()
+      logger.info(utils.SUCCESS + f'listen on: {args.socket}')
+      try:
+         daemon.poll_forever()
+      except KeyboardInterrupt:
+         pass
+      finally:
+         server.shutdown()
+         server.server_close()
+         with contextlib.suppress(FileNotFoundError):
+            args.socket.unlink()
+         daemon.close()
+   return True
+
+
+def _encode_submission(submission: Submission) -> List[Any]:
+   return [value.value if isinstance(value, Status) else value for value in submission]
+
+
+def _decode_submission(row: List[Any]) -> Submission:
+   submission = Submission(*row)
+   return submission._replace(status=Status(submission.status))
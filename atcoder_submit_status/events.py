@@ -0,0 +1,185 @@
+import datetime
+import json
+import pathlib
+import socket
+import sys
+from typing import *
+from logging import getLogger
+
+from atcoder_submit_status.submission import Submission
+
+if TYPE_CHECKING:
+   import atcoder_submit_status.service as service
+
+logger = getLogger(__name__)
+
+EVENT_TYPES = ['submission_added', 'status_changed', 'judging_finished']
+WEBHOOK_TIMEOUT = 10.0  # Webhook への送信のタイムアウトの秒数
+
+Event = Dict[str, Any]
+
+
+class EventDetector:
+   """
+   watch で取得した提出の変化を、提出 ID ごとのイベントにします。
+
+   イベントは次の 3 種類です。
+   - submission_added: 新しい提出が現れた
+   - status_changed: ジャッジの状態が変わった (WJ -> 3/12 -> AC など)
+   - judging_finished: ジャッジが終わった (status_changed の後に続けて出す)
+   最初に現れたときにジャッジが終わっている提出 (ポーリングの間にジャッジされたものなど) は、
+   submission_added の後に続けて judging_finished を出すので、judging_finished だけを見ればすべての結果がわかります。
+   最初に detect() に渡した提出は、include_existing が真のときだけイベントにします。
+   """
+   def __init__(self, srv: 'service.Service', contest: str, include_existing: bool = False):
+      self.srv = srv
+      self.contest = contest
+      self.include_existing = include_existing
+      self._columns = srv.get_typed_columns('DETAILS')
+      self._known: Optional[Dict[int, Submission]] = None  # まだ提出を受け取っていないときは None
+
+
+   def detect(self, submissions: List[Submission]) -> List[Event]:
+      """
+      前回から変化した提出のイベントを、提出時刻順に返します。
+      """
+      known = self._known
+      self._known = { s.id: s for s in submissions }
+      if known is None:
+         if not self.include_existing:
+            return []
+         known = {}
+
+      events = []
+      for s in submissions:
+         previous = known.get(s.id)
+         if previous is None:
+            events.append(self._make('submission_added', s))
+            if not self.srv.is_judging(s):
+               events.append(self._make('judging_finished', s))
+         elif previous.status != s.status or previous.progress != s.progress:
+            events.append(self._make('status_changed', s, previous))
+            if self.srv.is_judging(previous) and not self.srv.is_judging(s):
+               events.append(self._make('judging_finished', s, previous))
+      return events
+
+
+   def _make(self, event_type: str, submission: Submission, previous: Optional[Submission] = None) -> Event:
+      event: Event = {
+         'type': event_type,
+         'contest': self.contest,
+         'id': submission.id,
+         'status': self._columns['status'](submission),
+      }
+      if previous is not None:
+         event['previous_status'] = self._columns['status'](previous)
+      event['submission'] = { key: _to_json(column(submission)) for key, column in self._columns.items() }
+      event['emitted_at'] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+      return event
+
+
+class StreamSink:
+   """
+   イベントを 1 行に 1 つの JSON オブジェクトとして、標準出力かファイルに書き込みます。
+
+   ファイルには追記し、イベントを書き込むごとに flush します。
+   """
+   def __init__(self, path: Optional[pathlib.Path] = None):
+      self.path = path
+      self.file = sys.stdout if path is None else open(str(path), 'a', encoding='utf-8')
+
+
+   def write(self, events: List[Event]) -> None:
+      if events:
+         self.file.write(''.join(encode_event(event) + '\n' for event in events))
+         self.file.flush()
+
+
+   def close(self) -> None:
+      if self.path is not None:
+         self.file.close()
+
+
+class WebhookSink:
+   """
+   イベントを 1 つずつ、JSON の本文で url に POST します。
+
+   送信に失敗したイベントは、警告を出して捨てます (監視は続けます)。
+   AtCoder のセッションとは別のセッションを使うので、Cookie は送りません。
+   """
+   def __init__(self, url: str):
+      import requests
+      self.url = url
+      self.session = requests.Session()
+      self.session.headers['Content-Type'] = 'application/json'
+
+
+   def write(self, events: List[Event]) -> None:
+      import requests
+      for event in events:
+         try:
+            response = self.session.post(self.url, data=encode_event(event).encode(), timeout=WEBHOOK_TIMEOUT)
+            response.raise_for_status()
+         except requests.RequestException as e:
+            logger.warning(f'failed to send an event to the webhook: {event["type"]} {event["id"]}: {e}')
+
+
+   def close(self) -> None:
+      self.session.close()
+
+
+class UnixSocketSink:
+   """
+   イベントを 1 行に 1 つの JSON オブジェクトとして、Unix ドメインソケットに書き込みます。
+
+   接続は最初に書き込むときに作り、切れたときは次に書き込むときに作り直します。
+   接続できない間のイベントは、警告を出して捨てます。
+   """
+   def __init__(self, path: pathlib.Path):
+      self.path = path
+      self._socket: Optional[socket.socket] = None
+
+
+   def write(self, events: List[Event]) -> None:
+      if not events:
+         return
+      data = ''.join(encode_event(event) + '\n' for event in events).encode()
+      try:
+         if self._socket is None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(str(self.path))
+         self._socket.sendall(data)
+      except OSError as e:
+         logger.warning(f'failed to send {len(events)} events to {self.path}: {e}')
+         self.close()
+
+
+   def close(self) -> None:
+      if self._socket is not None:
+         self._socket.close()
+         self._socket = None
+
+
+def open_sink(dest: str):
+   """
+   イベントの出力先を開きます。
+
+   dest は "-" (標準出力)、"http://..." か "https://..." (Webhook)、"unix:<path>" (Unix ドメインソケット)、またはファイルのパスです。
+   """
+   if dest == '-':
+      return StreamSink()
+   if dest.startswith('http://') or dest.startswith('https://'):
+      return WebhookSink(dest)
+   if dest.startswith('unix:'):
+      return UnixSocketSink(pathlib.Path(dest[len('unix:'):]))
+   return StreamSink(pathlib.Path(dest))
+
+
+def encode_event(event: Event) -> str:
+   return json.dumps(event, ensure_ascii=False)
+
+
+def _to_json(value: Any) -> Any:
+   if isinstance(value, datetime.datetime):
+      return value.isoformat()
+   return value
@@ -0,0 +1,240 @@
+"""
+AtCoder の代わりに、合成したページを返すローカルの HTTP サーバです。
+
+テストやベンチマークのために、通信せずに acss を動かすときに使います。
+
+   $ python -m atcoder_submit_status.fake_server --port 8000 --submissions 1000
+   $ acss --server http://127.0.0.1:8000 login atcoder -u alice -p pass
+   $ acss --server http://127.0.0.1:8000 fetch abc300
+
+ログイン、コンテストのページ、問題一覧、提出一覧 (ページ送りと絞り込みに対応) を返します。
+どのコンテスト名に対しても、同じ提出を返します。
+"""
+import argparse
+import html
+import http.server
+import random
+import re
+import socketserver
+import threading
+import time
+import urllib.parse
+from typing import *
+
+PER_PAGE = 20
+TASKS = [('A', 'a', 'Apple'), ('B', 'b', 'Banana'), ('C', 'c', 'Cherry'), ('D', 'd', 'Durian'), ('E', 'e', 'Elderberry'), ('F', 'f', 'Fig'), ('G', 'g', 'Grape'), ('Ex', 'h', 'Huckleberry')]
+LANGUAGES = ['C++ (GCC 9.2.1)', 'Python (3.8.2)', 'PyPy3 (7.3.0)', 'Rust (1.42.0)', 'Java (OpenJDK 11.0.6)']
+STATUSES = ['AC', 'WA', 'TLE', 'MLE', 'RE', 'CE', 'OLE', 'IE', 'QLE', 'WJ', 'WR']
+FINAL_STATUSES = ['AC', 'AC', 'AC', 'WA', 'WA', 'TLE', 'RE', 'CE', 'MLE']
+JST = 9 * 3600
+
+
+class FakeAtCoder:
+   """
+   合成した提出を持ち、時間とともに新しい提出を追加します。
+
+   new_every 秒ごとに提出が 1 件増え、それぞれの提出は judge_seconds 秒の間ジャッジ中 (WJ, "3/12" など) になります。
+   """
+   def __init__(self, submissions: int = 200, users: int = 10, new_every: float = 0.0, judge_seconds: float = 6.0, private: bool = False, finished: bool = False, seed: int = 0):
+      self.users = [f'user{i}' for i in range(users)]
+      self.new_every = new_every
+      self.judge_seconds = judge_seconds
+      self.private = private
+      self.started_at = time.time()
+      self.contest_start = int(self.started_at) - 3600
+      self.contest_end = self.contest_start + (1800 if finished else 2 * 86400)
+      self._random = random.Random(seed)
+      self._lock = threading.Lock()
+      self._submissions = [self._make(i, self.contest_start + i * 1800 // max(1, submissions), born=0.0) for i in range(submissions)]
+      self._added = 0
+
+
+   def get_submissions(self) -> List[Dict[str, Any]]:
+      """
+      現在の提出を新しい順に返します。
+      """
+      now = time.time()
+      with self._lock:
+         while self.new_every > 0 and self.started_at + (self._added + 1) * self.new_every <= now:
+            self._added += 1
+            born = self.started_at + self._added * self.new_every
+            self._submissions.append(self._make(len(self._submissions), int(born), born=born))
+         submissions = list(self._submissions)
+
+      res = []
+      for s in reversed(submissions):
+         age = now - s['born']
+         if s['born'] > 0 and age < self.judge_seconds:
+            s = dict(s, status='WJ' if age < self.judge_seconds / 2 else f'{int(age)}/{int(self.judge_seconds)}')
+         res.append(s)
+      return res
+
+
+   def _make(self, i: int, submitted_at: int, born: float) -> Dict[str, Any]:
+      r = self._random
+      status = r.choice(FINAL_STATUSES)
+      return {
+         'id': 40000000 + i,
+         'time': submitted_at,
+         'task': r.choice(TASKS),
+         'user': r.choice(self.users),
+         'language': r.choice(LANGUAGES),
+         'score': 100 * r.randint(1, 6) if status == 'AC' else 0,
+         'code_size': r.randint(100, 5000),
+         'status': status,
+         'exec_time': r.randint(1, 2000),
+         'memory': r.randint(3000, 300000),
+         'born': born,
+      }
+
+
+def _render_row(contest: str, s: Dict[str, Any]) -> str:
+   timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(s['time'] + JST)) + '+0900'
+   label, task_id, title = s['task']
+   status = s['status']
+   if status in ['CE', 'WJ', 'WR'] or '/' in status:
+      status_cells = f"<td class='text-center' colspan='3'><span class='label label-default'>{status}</span></td>"
+   else:
+      status_cells = f"<td class='text-center'><span class='label label-success'>{status}</span></td><td class='text-right'>{s['exec_time']} ms</td><td class='text-right'>{s['memory']} KiB</td>"
+   return (
+      '<tr>'
+      f"<td class='no-break'><time class='fixtime fixtime-second'>{timestamp}</time></td>"
+      f"<td><a href='/contests/{contest}/tasks/{contest}_{task_id}'>{label} - {html.escape(title)}</a></td>"
+      f"<td><a href='/users/{s['user']}'>{s['user']}</a></td>"
+      f"<td><a href='/contests/{contest}/submissions?f.Language=1'>{html.escape(s['language'])}</a></td>"
+      f"<td class='text-right submission-score'>{s['score']}</td>"
+      f"<td class='text-right'>{s['code_size']} Byte</td>"
+      f'{status_cells}'
+      f"<td class='text-center'><a href='/contests/{contest}/submissions/{s['id']}'>Detail</a></td>"
+      '</tr>'
+   )
+
+
+def _render_submissions(contest: str, submissions: List[Dict[str, Any]], page: int) -> str:
+   last_page = max(1, (len(submissions) + PER_PAGE - 1) // PER_PAGE)
+   rows = ''.join(_render_row(contest, s) for s in submissions[(page - 1) * PER_PAGE:page * PER_PAGE])
+   pagination = ''.join(f"<li><a href='/contests/{contest}/submissions?page={p}'>{p}</a></li>" for p in sorted({1, page, last_page}))
+   selects = '<select name="f.Task"><option></option>' + ''.join(f'<option value="{contest}_{t[1]}">{t[0]} - {html.escape(t[2])}</option>' for t in TASKS) + '</select>'
+   selects += '<select name="f.LanguageName"><option></option>' + ''.join(f'<option value="{lang.split()[0]}">{lang.split()[0]}</option>' for lang in LANGUAGES) + '</select>'
+   selects += '<select name="f.Status"><option></option>' + ''.join(f'<option value="{status}">{status}</option>' for status in STATUSES) + '</select>'
+   table = ''
+   if rows:
+      table = "<div class='table-responsive'><table class='table table-bordered table-striped small th-center'><thead><tr><th>Submission Time</th><th>Task</th><th>User</th><th>Language</th><th>Score</th><th>Code Size</th><th>Status</th><th>Exec Time</th><th>Memory</th><th></th></tr></thead><tbody>" + rows + '</tbody></table></div>'
+   return f"<html><body><form>{selects}</form><ul class='pagination pagination-sm'>{pagination}</ul>{table}<ul class='pagination pagination-sm'>{pagination}</ul></body></html>"
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+   server: '_Server'
+
+   def log_message(self, format, *args):
+      pass
+
+
+   def do_GET(self):
+      url = urllib.parse.urlparse(self.path)
+      query = dict(urllib.parse.parse_qsl(url.query))
+      fake = self.server.fake
+
+      if url.path == '/login':
+         return self._send(200, '<form method="POST"><input type="hidden" name="csrf_token" value="fake-csrf-token"/></form>')
+      if url.path == '/home':
+         return self._send(200, '<html><body>home</body></html>')
+      if re.fullmatch(r'/contests/dummydummydummy/submit', url.path):
+         if self._get_user() is None:
+            return self._send(302, '', [('Location', '/login')])
+         return self._send(404, 'not found')
+
+      res = re.fullmatch(r'/contests/([\w-]+)(/.*)?', url.path)
+      if res is None:
+         return self._send(404, 'not found')
+      contest, rest = res.group(1), res.group(2) or ''
+
+      if rest in ['', '/']:
+         times = [time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(t + JST)) + '+0900' for t in [fake.contest_start, fake.contest_end]]
+         return self._send(200, f"<small class='contest-duration'>Contest Duration: <a><time class='fixtime-full'>{times[0]}</time></a> - <a><time class='fixtime-full'>{times[1]}</time></a></small>")
+      if rest == '/tasks':
+         rows = ''.join(f"<tr><td class='text-center no-break'><a href='/contests/{contest}/tasks/{contest}_{t[1]}'>{t[0]}</a></td><td><a href='/contests/{contest}/tasks/{contest}_{t[1]}'>{html.escape(t[2])}</a></td><td>2 sec</td><td>1024 MB</td></tr>" for t in TASKS)
+         return self._send(200, f"<table class='table table-bordered'><thead><tr><th></th><th>Task Name</th><th>Time Limit</th><th>Memory Limit</th></tr></thead><tbody>{rows}</tbody></table>")
+      if rest in ['/submissions', '/submissions/me']:
+         user = self._get_user()
+         if rest == '/submissions' and fake.private:
+            return self._send(404, 'not found')
+         if rest == '/submissions/me' and user is None:
+            return self._send(302, '', [('Location', '/login?continue=' + urllib.parse.quote(self.path))])
+
+         submissions = fake.get_submissions()
+         if rest == '/submissions/me':
+            submissions = [s for s in submissions if s['user'] == user]
+         elif query.get('f.User'):
+            submissions = [s for s in submissions if s['user'].lower() == query['f.User'].lower()]
+         if query.get('f.Task'):
+            submissions = [s for s in submissions if f'{contest}_{s["task"][1]}' == query['f.Task']]
+         if query.get('f.LanguageName'):
+            submissions = [s for s in submissions if s['language'].split()[0] == query['f.LanguageName']]
+         if query.get('f.Status'):
+            submissions = [s for s in submissions if s['status'] == query['f.Status']]
+         return self._send(200, _render_submissions(contest, submissions, max(1, int(query.get('page', 1)))))
+      return self._send(404, 'not found')
+
+
+   def do_POST(self):
+      length = int(self.headers.get('Content-Length', 0))
+      data = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode()))
+      if urllib.parse.urlparse(self.path).path != '/login' or data.get('csrf_token') != 'fake-csrf-token':
+         return self._send(403, 'forbidden')
+      expires = int(time.time()) + 180 * 86400
+      cookie = f'REVEL_SESSION=fake-___TS%3A{expires}%00%00UserName%3A{urllib.parse.quote(data.get("username", ""))}%00; Path=/; Max-Age={180 * 86400}; HttpOnly'
+      return self._send(302, '', [('Location', '/home'), ('Set-Cookie', cookie)])
+
+
+   def _get_user(self) -> Optional[str]:
+      res = re.search(r'REVEL_SESSION=[^;]*UserName%3A(.*?)%00', self.headers.get('Cookie') or '')
+      return urllib.parse.unquote(res.group(1)) if res else None
+
+
+   def _send(self, status: int, body: str, headers: List[Tuple[str, str]] = []):
+      content = body.encode()
+      self.send_response(status)
+      self.send_header('Content-Type', 'text/html; charset=utf-8')
+      self.send_header('Content-Length', str(len(content)))
+      for key, value in headers:
+         self.send_header(key, value)
+      self.end_headers()
+      self.wfile.write(content)
+
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+   daemon_threads = True
+
+   def __init__(self, address: Tuple[str, int], fake: FakeAtCoder):
+      super().__init__(address, _Handler)
+      self.fake = fake
+
+
+def serve(host: str = '127.0.0.1', port: int = 8000, fake: Optional[FakeAtCoder] = None) -> None:
+   server = _Server((host, port), fake or FakeAtCoder())
+   print(f'serving a fake AtCoder on http://{host}:{server.server_address[1]}', flush=True)
+   try:
+      server.serve_forever()
+   except KeyboardInterrupt:
+      pass
+
+
+def main(args: Optional[List[str]] = None) -> None:
+   parser = argparse.ArgumentParser(description='Serve a fake AtCoder for offline runs of acss')
+   parser.add_argument('--host', default='127.0.0.1')
+   parser.add_argument('--port', default=8000, type=int)
+   parser.add_argument('--submissions', metavar='<n>', default=200, type=int, help='Number of submissions at start. (default: 200)')
+   parser.add_argument('--users', metavar='<n>', default=10, type=int, help='Number of users (user0, user1, ...). (default: 10)')
+   parser.add_argument('--new-every', metavar='<sec>', default=0.0, type=float, help='Add a new submission every <sec> seconds. (default: never)')
+   parser.add_argument('--judge-seconds', metavar='<sec>', default=6.0, type=float, help='Keep new submissions judging for <sec> seconds. (default: 6)')
+   parser.add_argument('--private', action='store_true', help='Hide the submissions of other users (404), as during a contest.')
+   parser.add_argument('--finished', action='store_true', help='Serve a contest that is already over.')
+   parser.add_argument('--seed', default=0, type=int)
+   parsed = parser.parse_args(args)
+   fake = FakeAtCoder(submissions=parsed.submissions, users=parsed.users, new_every=parsed.new_every, judge_seconds=parsed.judge_seconds, private=parsed.private, finished=parsed.finished, seed=parsed.seed)
+   serve(parsed.host, parsed.port, fake)
+
+
+if __name__ == '__main__':
+   main()
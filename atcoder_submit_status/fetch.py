@@ -1,15 +1,19 @@
 import argparse
 import sys
 import codecs
+import os
 import pathlib
 import time
-from typing import Optional
+from typing import Callable, Optional
 import requests
 from logging import getLogger
 from colorama import Fore, Back, Style
 
 import atcoder_submit_status.utils as utils
 import atcoder_submit_status.service as service
+import atcoder_submit_status.daemon as daemon
+from atcoder_submit_status.store import SubmissionStore
+import atcoder_submit_status.writer as writers
 
 logger = getLogger(__name__)
 
@@ -22,22 +26,86 @@ Supported Services:
    subparser.add_argument('url', help='Contest URL (or AtCoder contest name)')
    subparser.add_argument('-o', '--output-path',  metavar='<file>', type=pathlib.Path, help='Place the output into <file>.')
    subparser.add_argument('-S', '--separator', metavar='<sep>', type=str, default=',', help='Use <sep> instead of `,` for field separator.')
+   subparser.add_argument('-f', '--format', default='csv', choices=writers.FORMATS, help='Select output format. (default: csv)\njsonl and parquet keep the types of the values\n(numbers as integers, submission times as timestamps).\nparquet requires pyarrow.')
+   subparser.add_argument('-z', '--compress', choices=writers.COMPRESSIONS, help='Compress the output. (default: guessed from the suffix of <file>, .gz or .zst)\nzstd requires zstandard.')
    subparser.add_argument('-e', '--encoding', metavar='<enc>', type=str, default='utf-8', help='Select charactor encoding.')
    subparser.add_argument('--tasks', metavar='<task-name>', default=[], nargs='*', help='Select tasks.\n(e.g. a b d ex)')
    subparser.add_argument('--languages', metavar='<lang>', default=[], nargs='*', help='Select languages.\n(e.g. C++ C#)')
-   subparser.add_argument('--statuses', default=[], nargs='*', choices=['AC', 'CE', 'MLE', 'TLE', 'RE', 'OLE', 'IE', 'WA', 'WJ', 'WR'], help='Select statuses.\n(e.g. WA TLE)')
+   subparser.add_argument('--statuses', default=[], nargs='*', choices=['AC', 'CE', 'MLE', 'TLE', 'RE', 'OLE', 'IE', 'WA', 'QLE', 'WJ', 'WR'], help='Select statuses.\n(e.g. WA TLE)')
    subparser.add_argument('-u', '--users', metavar='<user-name>', default=[], nargs='*', help='Select users.')
    subparser.add_argument('--info-level', default='NORMAL', choices=['MINIMAL', 'NORMAL', 'DETAILS'], help='Select output information level.')
    subparser.add_argument('-r', '--reverse', action='store_true', help='Reverse submissions')
-   subparser.add_argument('-t', '--tail', metavar='<n-lines>', default=sys.maxsize, type=int, help='Print the last <n-lines> submissions.')
+   subparser.add_argument('-t', '--tail', metavar='<n-lines>', default=sys.maxsize, type=int, help='Print the last <n-lines> submissions.\n(Only the newest pages needed for them are fetched.)')
+   subparser.add_argument('-j', '--jobs', metavar='<n>', default=4, type=int, help='Send up to <n> requests at the same time. (default: 4)')
+   subparser.add_argument('--rate-limit', metavar='<n>', default=utils.DEFAULT_REQUESTS_PER_SECOND, type=float, help=f'Send at most <n> requests per second. (default: {utils.DEFAULT_REQUESTS_PER_SECOND})')
+   subparser.add_argument('--refresh', action='store_true', help='Check for new submissions even if the contest is over.')
+   subparser.add_argument('--stream', action='store_true', help='Write submissions as soon as each page arrives.\n(The submissions are not sorted.)')
+   daemon.add_client_argument(subparser)
 
 
-def _fetch(args: argparse.Namespace, srv: service.Service, session: Optional[requests.Session] = None):
+def _fetch(args: argparse.Namespace, srv: service.Service, session: Optional[requests.Session] = None, store: Optional[SubmissionStore] = None):
    session = session or utils.get_default_session()
-   submissions = srv.fetch_submissions(args.url, tasks=args.tasks, languages=args.languages, statuses=args.statuses, users=args.users, session=session)
-   if args.info_level != 'DETAILS':
-      submissions = srv.minimize_submissions_info(submissions, args.info_level)
-   return submissions
+   submissions = srv.fetch_submissions(args.url, tasks=args.tasks, languages=args.languages, statuses=args.statuses, users=args.users, session=session, store=store, refresh=args.refresh, jobs=args.jobs, rate_limiter=utils.RateLimiter(args.rate_limit), tail=_get_tail(args))
+   return srv.minimize_submissions_info(submissions, args.info_level, typed=args.format != 'csv')
+
+
+def _stream(args: argparse.Namespace, srv: service.Service, writer: writers.SubmissionWriter, session: Optional[requests.Session] = None, store: Optional[SubmissionStore] = None) -> None:
+   session = session or utils.get_default_session()
+   for submissions in srv.iter_submissions(args.url, tasks=args.tasks, languages=args.languages, statuses=args.statuses, users=args.users, session=session, store=store, refresh=args.refresh, jobs=args.jobs, rate_limiter=utils.RateLimiter(args.rate_limit)):
+      writer.write_rows(srv.minimize_submissions_info(submissions, args.info_level, typed=args.format != 'csv'))
+      writer.flush()
+
+
+def _fetch_from_daemon(args: argparse.Namespace, srv: service.Service):
+   client = daemon.DaemonClient(args.daemon)
+   _, submissions, _ = client.get_submissions(args.url, tasks=args.tasks, languages=args.languages, statuses=args.statuses, users=args.users, refresh=args.refresh)
+   tail = _get_tail(args)
+   if tail is not None:
+      submissions = submissions[len(submissions) - tail:] if len(submissions) > tail else submissions
+   return srv.minimize_submissions_info(submissions, args.info_level, typed=args.format != 'csv')
+
+
+def _get_tail(args: argparse.Namespace) -> Optional[int]:
+   """
+   --tail で指定した提出の数を返します。指定していないときは None を返します。
+   """
+   return None if args.tail == sys.maxsize else max(0, args.tail)
+
+
+def _write(args: argparse.Namespace, srv: service.Service, write: Callable[[writers.SubmissionWriter], None]) -> bool:
+   sep = codecs.decode(args.separator, 'unicode-escape')
+
+   # parquet はファイルの中で圧縮する
+   compression = writers.get_compression(args.output_path, args.compress)
+   binary = args.format == 'parquet'
+   try:
+      with writers.open_output(args.output_path, binary=binary, compression=None if binary else compression, encoding=args.encoding) as file:
+         writer = writers.new_writer(args.format, file, separator=sep, compression=compression, columns=list(srv.get_typed_columns(args.info_level)), time_zone=srv.get_time_zone())
+         write(writer)
+         writer.close()
+         writer.flush()
+
+      if args.output_path:
+         logger.info(utils.SUCCESS + f'Write submissions to `{str(args.output_path)}`.')
+      return True
+
+   except service.ServiceUnavailableError as e:
+      logger.error(e)
+      logger.info(utils.HINT + 'The server is busy. Please try again later. (The submissions fetched so far are saved.)')
+      return False
+   except daemon.DaemonError as e:
+      logger.error(e)
+      logger.info(utils.HINT + 'You can start the daemon with this command: `acss daemon`')
+      return False
+   except writers.WriterError as e:
+      logger.error(e)
+      return False
+   except BrokenPipeError:
+      # `acss fetch abc300 | head` などで出力先が閉じられたときは、残りを捨てて終了する
+      os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+      return True
+   except KeyboardInterrupt:
+      sys.exit(0)
 
 
 def run(args: argparse.Namespace) -> bool:
@@ -48,28 +116,30 @@ def run(args: argparse.Namespace) -> bool:
       logger.info('we predict that the service you use is AtCoder.')
       srv = service.AtCoderService()
 
-   with utils.new_session_with_our_user_agent(args.cookie, service=srv) as session:
+   # デーモンを使うときは、ログインの確認も取得もデーモンが行う
+   if args.daemon is not None:
+      return _write(args, srv, lambda writer: writer.write_rows(_fetch_from_daemon(args, srv)))
+
+   with utils.new_session_with_our_user_agent(args.cookie, service=srv, pool_size=args.jobs) as session:
       logger.debug('start session')
-      if not srv.is_logged_in(session):
+      if not srv.is_logged_in(session, max_age=utils.LOGIN_STATUS_MAX_AGE):
          logger.info(utils.FAILURE + 'You are not signed in.')
          logger.info(utils.HINT + f'You can try to enter this command: `acss login {srv.get_name()}`')
          return False
-      
-      sep = codecs.decode(args.separator, 'unicode-escape')
 
+      # 問題と言語の指定は、コンテストのメタデータ (初回だけ取得する) と照らし合わせる
       try:
-         submissions = _fetch(args, srv=srv, session=session)
-         file = sys.stdout if args.output_path is None else codecs.open(str(args.output_path), mode='w', encoding=args.encoding)
-         for s in submissions:
-            for i, v in enumerate(s.values()):
-               if i != 0:
-                  print(end=sep, file=file)
-               print(v, end='', file=file)
-            print(file=file)
-
-         if args.output_path:
-            logger.info(utils.SUCCESS + f'Write submissions to `{str(args.output_path)}`.')
-         
-
-      except KeyboardInterrupt:
-         sys.exit(0)
+         srv.get_contest_metadata(args.url, session=session).check_filters(tasks=args.tasks, languages=args.languages)
+      except ValueError as e:
+         logger.error(e)
+         return False
+
+      with SubmissionStore(utils.get_store_path(srv, srv.get_round(args.url))) as store:
+         # 最新の提出を選ぶには揃うまで待つ必要があるので、--tail のときはページごとには書き出さない
+         stream = args.stream and _get_tail(args) is None
+         if args.stream and not stream:
+            logger.warning('--stream is ignored with --tail')
+         if stream:
+            return _write(args, srv, lambda writer: _stream(args, srv=srv, writer=writer, session=session, store=store))
+         else:
+            return _write(args, srv, lambda writer: writer.write_rows(_fetch(args, srv=srv, session=session, store=store)))
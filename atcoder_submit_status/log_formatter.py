@@ -1,4 +1,4 @@
-import http.client
+import http
 import logging
 from typing import *
 
@@ -23,7 +23,7 @@ log_colors_semantics = {
     'INPUT': '[' + colorama.Fore.YELLOW + 'INPUT' + colorama.Style.RESET_ALL + '] ',
 }
 
-status_code_messages: Set[str] = {str(int(key)) + ' ' + str(value) for key, value in http.client.responses.items()}
+status_code_messages: Set[str] = {str(int(status)) + ' ' + status.phrase for status in http.HTTPStatus}  # http.client は読み込みに時間がかかるので使わない
 
 
 class LogFormatter(logging.Formatter):
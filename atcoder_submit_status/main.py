@@ -1,23 +1,33 @@
 import argparse
-from ast import arg, parse
-from distutils.log import ERROR
-from email.errors import HeaderParseError
+import importlib
 import sys
 from typing import *
-from logging import CRITICAL, WARN, DEBUG, INFO, StreamHandler, basicConfig, getLogger
+from logging import CRITICAL, ERROR, WARN, DEBUG, INFO, StreamHandler, basicConfig, getLogger
 import pathlib
 import atcoder_submit_status.__about__ as version
 import atcoder_submit_status.utils as utils
-import atcoder_submit_status.login as subcommands_login
-import atcoder_submit_status.logout as subcommands_logout
-import atcoder_submit_status.watch as subcommands_watch
-import atcoder_submit_status.fetch as subcommands_fetch
+import atcoder_submit_status.profiler as profiler
 import atcoder_submit_status.log_formatter as log_formatter
 
 logger = getLogger(__name__)
 
-def get_parser() -> argparse.ArgumentParser:
+# サブコマンドの名前 (と別名) と、それを実装するモジュール
+# モジュールは requests や rich などを読み込むので、使うサブコマンドのものだけを読み込む
+SUBCOMMANDS = [
+   (['login', 'l'], 'atcoder_submit_status.login'),
+   (['logout'], 'atcoder_submit_status.logout'),
+   (['watch', 'w'], 'atcoder_submit_status.watch'),
+   (['fetch', 'f'], 'atcoder_submit_status.fetch'),
+   (['stats'], 'atcoder_submit_status.stats'),
+   (['archive'], 'atcoder_submit_status.archive'),
+   (['daemon'], 'atcoder_submit_status.daemon'),
+]
+
+def get_parser(args: Optional[List[str]] = None) -> argparse.ArgumentParser:
    """パーサを生成します。
+
+   args を渡すと、そこで指定されたサブコマンドのモジュールだけを読み込みます。
+   サブコマンドが指定されていないか、わからないときは、ヘルプを表示できるようにすべて読み込みます。
    """
 
    parser = argparse.ArgumentParser(
@@ -29,19 +39,48 @@ Tips:
 '''
    )
 
-   parser.add_argument('-v', '--verbose', action='store_true')
-   parser.add_argument('-c', '--cookie', type=pathlib.Path, default=utils.DEFAULT_COOKIE_PATH, help=f'path to cookie. (default: {utils.DEFAULT_COOKIE_PATH})')
-   parser.add_argument('-q', '--quiet', action='count', default=0, help='Give less output. Option is additive, and can be used up to 3 times.')
-   parser.add_argument('--version', action='store_true', help='print the atcoder-submit-status version number.')
+   _add_global_arguments(parser)
 
+   subcommand = _find_subcommand(args) if args is not None else None
+   if subcommand is None and args is not None and '--version' in args:
+      return parser
    subparsers = parser.add_subparsers(dest='subcommand', help=f'for details, see "{sys.argv[0]} COMMAND --help"')
-   subcommands_login.add_subparser(subparsers)
-   subcommands_logout.add_subparser(subparsers)
-   subcommands_watch.add_subparser(subparsers)
-   subcommands_fetch.add_subparser(subparsers)
+   for names, module in SUBCOMMANDS:
+      if subcommand is None or subcommand in names:
+         importlib.import_module(module).add_subparser(subparsers)
 
    return parser
 
+def _add_global_arguments(parser: argparse.ArgumentParser) -> None:
+   parser.add_argument('-v', '--verbose', action='store_true')
+   parser.add_argument('-c', '--cookie', type=pathlib.Path, default=utils.DEFAULT_COOKIE_PATH, help=f'path to cookie. (default: {utils.DEFAULT_COOKIE_PATH})')
+   parser.add_argument('-q', '--quiet', action='count', default=0, help='Give less output. Option is additive, and can be used up to 3 times.')
+   parser.add_argument('--version', action='store_true', help='print the atcoder-submit-status version number.')
+   parser.add_argument('--profile', action='store_true', help='print the time spent in each phase and the number of requests at exit (and on each update of watch).')
+   parser.add_argument('--stats-json', metavar='<file>', type=pathlib.Path, help='write the time spent in each phase and the number of requests to <file> as JSON at exit.')
+   parser.add_argument('--server', metavar='<url>', help='send requests for AtCoder to <url> (e.g. a local atcoder_submit_status.fake_server).')
+   parser.add_argument('--record', metavar='<dir>', type=pathlib.Path, help='record HTTP responses to <dir>.')
+   parser.add_argument('--replay', metavar='<dir>', type=pathlib.Path, help='replay HTTP responses recorded with --record, without network access.')
+
+class _SubcommandFinder(argparse.ArgumentParser):
+   # 引数の誤りは、あとで本来のパーサが報告する
+   def error(self, message: str) -> 'NoReturn':
+      raise ValueError(message)
+
+def _find_subcommand(args: List[str]) -> Optional[str]:
+   # サブコマンドより前のオプションを読み飛ばして、最初の位置引数をサブコマンドとする
+   finder = _SubcommandFinder(add_help=False)
+   _add_global_arguments(finder)
+   finder.add_argument('subcommand', nargs='?')
+   finder.add_argument('rest', nargs=argparse.REMAINDER)
+   try:
+      known, _ = finder.parse_known_args(args)
+   except ValueError:
+      return None
+   if any(known.subcommand in names for names, _ in SUBCOMMANDS):
+      return known.subcommand
+   return None
+
 def run_program(args: argparse.Namespace, parser: argparse.ArgumentParser) -> int:
    if args.version:
       print('atcoder-submit-status {}'.format(version.__version__))
@@ -50,25 +89,18 @@ def run_program(args: argparse.Namespace, parser: argparse.ArgumentParser) -> in
 
    logger.info('atcoder-submit-status %s', version.__version__)
 
-   if args.subcommand in ['login', 'l']:
-      if not subcommands_login.run(args):
-         return 1
-   elif args.subcommand in ['logout']:
-      if not subcommands_logout.run(args):
-         return 1
-   elif args.subcommand in ['watch', 'w']:
-      if not subcommands_watch.run(args):
-         return 1
-   elif args.subcommand in ['fetch', 'f']:
-      if not subcommands_fetch.run(args):
-         return 1
-   else:
-      parser.print_help(file=sys.stderr)
-      return 1
-   return 0
+   for names, module in SUBCOMMANDS:
+      if args.subcommand in names:
+         if not importlib.import_module(module).run(args):
+            return 1
+         return 0
+   parser.print_help(file=sys.stderr)
+   return 1
 
 def main(args: Optional[List[str]] = None) -> 'NoReturn':
-   parser = get_parser()
+   if args is None:
+      args = sys.argv[1:]
+   parser = get_parser(args)
    parsed = parser.parse_args(args=args)
 
    level = INFO
@@ -81,10 +113,15 @@ def main(args: Optional[List[str]] = None) -> 'NoReturn':
    elif parsed.quiet == 3:
       level = CRITICAL
 
-   handler = StreamHandler(sys.stdout)
+   # watch --events - の出力は JSON Lines なので、ログと混ざらないように、ログを標準エラー出力に書く
+   handler = StreamHandler(sys.stderr if getattr(parsed, 'events', None) == '-' else sys.stdout)
    handler.setFormatter(log_formatter.LogFormatter())
    basicConfig(level=level, handlers=[handler])
 
+   if parsed.record is not None or parsed.replay is not None or parsed.server is not None:
+      import atcoder_submit_status.transport as transport
+      transport.configure(record=parsed.record, replay=parsed.replay, server=parsed.server)
+
    # is_updated = update_checking.run()
 
    try:
@@ -93,8 +130,33 @@ def main(args: Optional[List[str]] = None) -> 'NoReturn':
       logger.error('NotImplementedError')
       sys.exit(1)
    except Exception as e:
-      logger.exception(str(e))
+      _report_error(e)
       sys.exit(1)
+   finally:
+      _report_stats(parsed)
+
+
+def _report_error(e: Exception) -> None:
+   # サービスとの通信の失敗は、スタックトレースを出さずに報告する
+   import atcoder_submit_status.service as service
+   if isinstance(e, service.LoginRequiredError):
+      logger.error(e)
+      logger.info(utils.HINT + 'You can try to enter this command: `acss login atcoder`')
+   elif isinstance(e, service.ServiceError):
+      logger.error(e)
+   else:
+      logger.exception(str(e))
+
+
+def _report_stats(args: argparse.Namespace) -> None:
+   # 出力と混ざらないように、計測結果は標準エラー出力に書く
+   if not args.profile and args.stats_json is None:
+      return
+   stats = profiler.get_profiler().get_stats()
+   if args.profile:
+      print(profiler.format_stats(stats), file=sys.stderr)
+   if args.stats_json is not None:
+      profiler.write_stats(args.stats_json, stats)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,161 @@
+import difflib
+import json
+import os
+import threading
+import time
+from typing import *
+from logging import getLogger
+
+import atcoder_submit_status.utils as utils
+from atcoder_submit_status.submission import Task
+
+if TYPE_CHECKING:
+   import requests
+   import atcoder_submit_status.service as service
+
+logger = getLogger(__name__)
+
+UNKNOWN_WINDOW_TTL = 60.0  # 開催期間を読み取れなかったときに、取得し直すまでの秒数
+
+# メタデータのファイル -> 開催期間を読み取れなかった時刻
+# ContestMetadata はクローラごとに作るので、プロセスで共有する
+_unknown_windows: Dict[str, float] = {}
+_unknown_windows_lock = threading.Lock()
+
+
+class ContestMetadata:
+   """
+   コンテストの問題・言語・開催期間を、コンテストごとの JSON ファイル (utils.get_metadata_path()) に保存しておきます。
+
+   それぞれの値は、最初に使うときに取得して保存し、次からは保存したものを使います。
+   問題と言語は、提出一覧を取得したときの絞り込みの選択肢 (update_from_filters()) からも保存するので、
+   fetch や watch の後は、問題一覧のページを取得せずに使えます。
+   コンテストの開始前は問題が公開されていないので、空の問題一覧は保存しません。
+   複数のスレッドから使うことができます。
+   """
+   def __init__(self, srv: 'service.Service', url: str, session: Optional['requests.Session'] = None):
+      self.srv = srv
+      self.url = url
+      self.session = session
+      self.contest = srv.get_round(url)
+      self.path = utils.get_metadata_path(srv, self.contest)
+      self._lock = threading.RLock()
+      self._data: Dict[str, Any] = self._load()
+
+
+   def get_tasks(self) -> List[Task]:
+      """
+      問題を、問題一覧の順に返します。
+      """
+      with self._lock:
+         if not self._data.get('tasks'):
+            tasks = self.srv.get_tasks(self.srv.get_url() + '/contests/' + self.contest + '/tasks', session=self.session)
+            if not tasks:
+               return []
+            self._set('tasks', [list(task) for task in tasks])
+         return [Task(*task) for task in self._data['tasks']]
+
+
+   def get_languages(self) -> List[str]:
+      """
+      提出一覧で絞り込める言語の名前 ("C++", "Python" など、--languages で指定するもの) を返します。
+      """
+      with self._lock:
+         if not self._data.get('languages'):
+            _, filters, _ = self.srv.get_submissions_url(self.url, params={ 'f.User': '' }, session=self.session)
+            self.update_from_filters(filters)
+         return list(self._data.get('languages', []))
+
+
+   def get_window(self) -> Tuple[Optional[float], Optional[float]]:
+      """
+      コンテストの開始時刻と終了時刻を UNIX 時間で返します。
+
+      コンテストのページから読み取れなかったとき (公開前のページや、取得に失敗したときなど) は (None, None) を返します。
+      このときはファイルに保存せず、UNKNOWN_WINDOW_TTL 秒の間はプロセスの中で覚えておき、その後に使うときに取得し直します。
+      """
+      import atcoder_submit_status.service as service
+      with self._lock:
+         if self._data.get('window', [None, None]) == [None, None]:
+            key = str(self.path)
+            with _unknown_windows_lock:
+               checked_at = _unknown_windows.get(key)
+            if checked_at is not None and time.time() - checked_at < UNKNOWN_WINDOW_TTL:
+               return None, None
+            try:
+               start, end = self.srv.get_contest_window(self.url, session=self.session)
+            except service.ServiceError as e:
+               logger.debug(f'cannot get the window of {self.contest}: {e}')
+               start, end = None, None
+            if start is None and end is None:
+               with _unknown_windows_lock:
+                  _unknown_windows[key] = time.time()
+               return None, None
+            with _unknown_windows_lock:
+               _unknown_windows.pop(key, None)
+            self._set('window', [start.timestamp() if start else None, end.timestamp() if end else None])
+         start, end = self._data['window']
+         return start, end
+
+
+   def update_from_filters(self, filters: Dict[str, Dict[str, str]]) -> None:
+      """
+      提出一覧の絞り込みの選択肢 ({パラメータ名: {値: 表示名}}) から、問題と言語を保存します。
+      """
+      tasks = [[value, utils.get_task_id(label), label] for value, label in filters.get('f.Task', {}).items()]
+      languages = list(filters.get('f.LanguageName', {}))
+      with self._lock:
+         if tasks and not self._data.get('tasks'):
+            self._set('tasks', tasks)
+         if languages and not self._data.get('languages'):
+            self._set('languages', languages)
+
+
+   def check_filters(self, tasks: List[str] = [], languages: List[str] = []) -> None:
+      """
+      --tasks と --languages に、このコンテストにない問題や言語が含まれていれば ValueError を送出します。
+
+      問題や言語を取得できないとき (コンテストの開始前など) は、確かめません。
+      """
+      import atcoder_submit_status.service as service
+      if tasks:
+         try:
+            labels = [task.label for task in self.get_tasks()]
+         except service.ServiceError as e:
+            logger.debug(f'cannot check the tasks of {self.contest}: {e}')
+            labels = []
+         unknown = [task for task in tasks if labels and task.lower() not in [label.lower() for label in labels]]
+         if unknown:
+            raise ValueError(f'unknown tasks in {self.contest}: {" ".join(unknown)} (choose from {" ".join(labels)})')
+      if languages:
+         try:
+            names = self.get_languages()
+         except service.ServiceError as e:
+            logger.debug(f'cannot check the languages of {self.contest}: {e}')
+            names = []
+         for language in languages:
+            if names and language not in names:
+               candidates = [name for name in names if name.lower() == language.lower()] or difflib.get_close_matches(language, names, n=3)
+               raise ValueError(f'unknown language in {self.contest}: {language}' + (f' (did you mean {" or ".join(candidates)}?)' if candidates else ''))
+
+
+   def _load(self) -> Dict[str, Any]:
+      if not self.path.exists():
+         return {}
+      try:
+         data = json.loads(self.path.read_text())
+      except ValueError:
+         logger.debug(f'ignore the broken metadata: {self.path}')
+         return {}
+      logger.debug(f'load the metadata of {self.contest}: {", ".join(key for key in data if key != "updated_at")}')
+      return data
+
+
+   def _set(self, key: str, value: Any) -> None:
+      # 書きかけのファイルを読まないように、別のファイルに書いてから置き換える
+      self._data[key] = value
+      self._data['updated_at'] = time.time()
+      self.path.parent.mkdir(parents=True, exist_ok=True)
+      temporary = self.path.with_name(f'{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+      temporary.write_text(json.dumps(self._data, ensure_ascii=False))
+      os.replace(str(temporary), str(self.path))
@@ -0,0 +1,245 @@
+from abc import abstractmethod
+import re
+from typing import *
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+_SUBMISSION_LINK = re.compile(r'/submissions/\d+$')
+
+
+class Parser:
+   """
+   AtCoder のページの HTML から必要な情報を取り出します。
+
+   どのメソッドも、レスポンスのバイト列とその文字コードを受け取ります。
+   """
+   @abstractmethod
+   def parse_submissions_page(self, content: bytes, encoding: str, keys: List[str]) -> Tuple[List[Tuple[int, Dict[str, str]]], int]:
+      """
+      提出一覧のページから、(提出 ID, 提出) の組のリストと、ページ送りの最後のページ番号を取り出します。
+
+      提出は keys の順に、表のセルの文字列を並べた辞書です。
+      """
+      pass
+
+
+   @abstractmethod
+   def parse_filter_options(self, content: bytes, encoding: str) -> Dict[str, Dict[str, str]]:
+      pass
+
+
+   @abstractmethod
+   def parse_tasks(self, content: bytes, encoding: str) -> List[Tuple[str, str, str]]:
+      """
+      問題一覧のページから、(問題 ID, 記号, 問題名) の組のリストを取り出します。
+      """
+      pass
+
+
+   @abstractmethod
+   def parse_contest_window(self, content: bytes, encoding: str) -> Optional[Tuple[str, str]]:
+      pass
+
+
+   @abstractmethod
+   def parse_csrf_token(self, content: bytes, encoding: str) -> Optional[str]:
+      pass
+
+
+class BeautifulSoupParser(Parser):
+   """
+   BeautifulSoup でページ全体を解析するパーサです。
+
+   遅いですが、LxmlParser の結果を確かめるための基準として残しています。
+   """
+   def parse_submissions_page(self, content: bytes, encoding: str, keys: List[str]) -> Tuple[List[Tuple[int, Dict[str, str]]], int]:
+      soup = self._soup(content, encoding)
+
+      last_page = 1
+      pagination = soup.find('ul', { 'class': 'pagination' })
+      if pagination is not None:
+         pages = [int(a.get_text()) for a in pagination.findAll('a') if a.get_text().strip().isdigit()]
+         last_page = max(pages, default=1)
+
+      tables = soup.findAll('table', { 'class': 'table' })
+      if not tables:
+         return [], last_page
+      rows = tables[0].findAll('tr')
+
+      submissions = []
+      for i in range(len(rows)):
+         if i == 0:
+            continue
+
+         # HTMLの内容をパース
+         r = rows[i].findAll('td')
+         submission = {}
+         for j in range(len(keys)):
+            if j < len(r) - 1:  # "Detail" の分、1個引く
+               submission[keys[j]] = r[j].get_text().strip()
+            else:
+               submission[keys[j]] = ''
+
+         # 提出 ID は "Detail" のリンクから取得する
+         link = r[-1].find('a', href=_SUBMISSION_LINK) if r else None
+         if link is None:
+            continue
+         submissions.append((int(link.get('href').rsplit('/', 1)[1]), submission))
+
+      return submissions, last_page
+
+
+   def parse_filter_options(self, content: bytes, encoding: str) -> Dict[str, Dict[str, str]]:
+      soup = self._soup(content, encoding)
+
+      filters = {}
+      for select in soup.findAll('select', attrs={ 'name': True }):
+         options = {}
+         for option in select.findAll('option'):
+            value = option.get('value')
+            if value:
+               options[value] = option.get_text().strip()
+         filters[select.get('name')] = options
+      return filters
+
+
+   def parse_tasks(self, content: bytes, encoding: str) -> List[Tuple[str, str, str]]:
+      soup = self._soup(content, encoding)
+      tables = soup.findAll('table', {'class': 'table' })
+      rows = tables[0].findAll('tr') if tables else []
+
+      tasks = []
+      for i in range(len(rows)):
+         if i == 0:
+            continue
+         r = rows[i].findAll('td')
+         link = r[0].find('a', href=True) if r else None
+         if link is None:
+            continue
+         tasks.append((link.get('href').rstrip('/').rsplit('/', 1)[1], r[0].get_text().strip(), r[1].get_text().strip()))
+      return tasks
+
+
+   def parse_contest_window(self, content: bytes, encoding: str) -> Optional[Tuple[str, str]]:
+      soup = self._soup(content, encoding)
+      duration = soup.find(class_='contest-duration')
+      times = duration.findAll('time') if duration else []
+      if len(times) < 2:
+         return None
+      return times[0].get_text().strip(), times[1].get_text().strip()
+
+
+   def parse_csrf_token(self, content: bytes, encoding: str) -> Optional[str]:
+      soup = self._soup(content, encoding)
+      tag = soup.find(attrs={'name': 'csrf_token'})
+      return None if tag is None else tag.get('value')
+
+
+   def _soup(self, content: bytes, encoding: str):
+      from bs4 import BeautifulSoup
+      return BeautifulSoup(content.decode(encoding, errors='replace'), 'lxml')
+
+
+class LxmlParser(Parser):
+   """
+   lxml を使う速いパーサです。
+
+   提出一覧のページでは、バイト列から提出の表とページ送りの部分だけを切り出して解析します。
+   """
+   _TABLE = re.compile(rb'<table\b[^>]*\bclass\s*=\s*["\'](?:[^"\']*\s)?table(?:\s[^"\']*)?["\']', re.IGNORECASE)
+   _TABLE_END = re.compile(rb'</table\s*>', re.IGNORECASE)
+   _PAGINATION = re.compile(rb'<ul\b[^>]*\bclass\s*=\s*["\'](?:[^"\']*\s)?pagination(?:\s[^"\']*)?["\'][^>]*>(.*?)</ul\s*>', re.IGNORECASE | re.DOTALL)
+   _PAGE_LINK = re.compile(rb'<a\b[^>]*>\s*(\d+)\s*</a\s*>', re.IGNORECASE)
+   _TABLE_XPATH = "//table[contains(concat(' ', normalize-space(@class), ' '), ' table ')]"
+
+   def parse_submissions_page(self, content: bytes, encoding: str, keys: List[str]) -> Tuple[List[Tuple[int, Dict[str, str]]], int]:
+      last_page = 1
+      pagination = self._PAGINATION.search(content)
+      if pagination is not None:
+         last_page = max((int(page) for page in self._PAGE_LINK.findall(pagination.group(1))), default=1)
+
+      start = self._TABLE.search(content)
+      if start is None:
+         return [], last_page
+      end = self._TABLE_END.search(content, start.end())
+      table = self._parse(content[start.start():end.end() if end else len(content)], encoding)
+      if table.tag != 'table':
+         table = table.find('.//table')
+
+      submissions = []
+      for i, row in enumerate(table.iter('tr')):
+         if i == 0:
+            continue
+
+         r = list(row.iter('td'))
+         submission = {}
+         for j in range(len(keys)):
+            if j < len(r) - 1:  # "Detail" の分、1個引く
+               submission[keys[j]] = r[j].text_content().strip()
+            else:
+               submission[keys[j]] = ''
+
+         # 提出 ID は "Detail" のリンクから取得する
+         hrefs = [a.get('href') for a in r[-1].iter('a') if _SUBMISSION_LINK.search(a.get('href') or '')] if r else []
+         if not hrefs:
+            continue
+         submissions.append((int(hrefs[0].rsplit('/', 1)[1]), submission))
+
+      return submissions, last_page
+
+
+   def parse_filter_options(self, content: bytes, encoding: str) -> Dict[str, Dict[str, str]]:
+      filters = {}
+      for select in self._parse(content, encoding).iter('select'):
+         if select.get('name') is None:
+            continue
+         options = {}
+         for option in select.iter('option'):
+            value = option.get('value')
+            if value:
+               options[value] = option.text_content().strip()
+         filters[select.get('name')] = options
+      return filters
+
+
+   def parse_tasks(self, content: bytes, encoding: str) -> List[Tuple[str, str, str]]:
+      tables = self._parse(content, encoding).xpath(self._TABLE_XPATH)
+
+      tasks = []
+      for i, row in enumerate(tables[0].iter('tr') if tables else []):
+         if i == 0:
+            continue
+         r = list(row.iter('td'))
+         hrefs = [a.get('href') for a in r[0].iter('a') if a.get('href')] if r else []
+         if not hrefs:
+            continue
+         tasks.append((hrefs[0].rstrip('/').rsplit('/', 1)[1], r[0].text_content().strip(), r[1].text_content().strip()))
+      return tasks
+
+
+   def parse_contest_window(self, content: bytes, encoding: str) -> Optional[Tuple[str, str]]:
+      durations = self._parse(content, encoding).find_class('contest-duration')
+      times = list(durations[0].iter('time')) if durations else []
+      if len(times) < 2:
+         return None
+      return times[0].text_content().strip(), times[1].text_content().strip()
+
+
+   def parse_csrf_token(self, content: bytes, encoding: str) -> Optional[str]:
+      values = self._parse(content, encoding).xpath('//*[@name="csrf_token"]/@value')
+      return values[0] if values else None
+
+
+   def _parse(self, content: bytes, encoding: str):
+      import lxml.html
+      return lxml.html.fromstring(content, parser=lxml.html.HTMLParser(encoding=encoding))
+
+
+PARSERS = {
+   'lxml': LxmlParser,
+   'bs4': BeautifulSoupParser,
+}
+
+def get_parser(name: str = 'lxml') -> Parser:
+   return PARSERS[name]()
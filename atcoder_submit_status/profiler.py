@@ -0,0 +1,125 @@
+import contextlib
+import functools
+import json
+import pathlib
+import threading
+import time
+from typing import *
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+if TYPE_CHECKING:
+   import requests
+
+COUNTERS = ['requests', 'bytes', 'pages', 'rows']
+
+
+class Profiler:
+   """
+   処理の段階 (phase) ごとの経過時間と、リクエスト数・受信したバイト数・解析したページ数・行数を数えます。
+
+   段階は複数のスレッドで同時に進むことがあるので、段階ごとの時間の合計は全体の経過時間を超えることがあります。
+   複数のスレッドで共有することができます。
+   """
+   def __init__(self):
+      self._lock = threading.Lock()
+      self.started = time.perf_counter()
+      self.phases: Dict[str, List[float]] = {}  # 段階の名前 -> [秒, 回数]
+      self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+
+
+   @contextlib.contextmanager
+   def phase(self, name: str) -> Iterator[None]:
+      start = time.perf_counter()
+      try:
+         yield
+      finally:
+         self.add_time(name, time.perf_counter() - start)
+
+
+   def add_time(self, name: str, seconds: float, calls: int = 1) -> None:
+      with self._lock:
+         phase = self.phases.setdefault(name, [0.0, 0])
+         phase[0] += seconds
+         phase[1] += calls
+
+
+   def count(self, **counts: int) -> None:
+      with self._lock:
+         for key, value in counts.items():
+            self.counters[key] += value
+
+
+   def on_response(self, response: 'requests.Response', *args, **kwargs) -> 'requests.Response':
+      """
+      requests のフックです。リクエスト数と受信したバイト数、通信にかかった時間を数えます。
+      """
+      start = time.perf_counter()
+      content = response.content  # 本文をここで読み込んで、読み込みの時間も通信の時間に含める
+      seconds = response.elapsed.total_seconds() + time.perf_counter() - start
+      # 圧縮されているときは、展開する前のバイト数を数える
+      size = getattr(response.raw, 'tell', lambda: 0)() or len(content or b'')
+      self.add_time('network', seconds)
+      self.count(requests=1, bytes=size)
+      return response
+
+
+   def get_stats(self, since: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+      """
+      これまでの計測結果を返します。since に以前の結果を渡すと、それ以降の差分を返します。
+      """
+      with self._lock:
+         elapsed = time.perf_counter() - self.started
+         phases = { name: { 'seconds': seconds, 'calls': calls } for name, (seconds, calls) in self.phases.items() }
+         counters = dict(self.counters)
+      if since is not None:
+         elapsed -= since['elapsed']
+         for name, phase in since['phases'].items():
+            if name in phases:
+               phases[name] = { 'seconds': phases[name]['seconds'] - phase['seconds'], 'calls': phases[name]['calls'] - phase['calls'] }
+         for key in COUNTERS:
+            counters[key] -= since[key]
+         phases = { name: phase for name, phase in phases.items() if phase['calls'] }
+      stats = { 'elapsed': elapsed, 'phases': phases }
+      stats.update(counters)
+      stats['rows_per_second'] = counters['rows'] / elapsed if elapsed > 0 else 0.0
+      return stats
+
+
+def profiled(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+   """
+   関数の呼び出しを、段階 name として計測するデコレータです。
+   """
+   def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+      @functools.wraps(fn)
+      def wrapper(*args, **kwargs):
+         with get_profiler().phase(name):
+            return fn(*args, **kwargs)
+      return wrapper
+   return decorator
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+   """
+   計測結果を表示用の文字列にします。
+   """
+   lines = [f"elapsed {stats['elapsed']:.3f} s, {stats['requests']} requests, {stats['bytes'] / 1024:.1f} KiB, {stats['pages']} pages, {stats['rows']} rows ({stats['rows_per_second']:.0f} rows/s)"]
+   for name, phase in sorted(stats['phases'].items(), key=lambda item: -item[1]['seconds']):
+      lines.append(f"  {name:<10} {phase['seconds']:9.3f} s {phase['calls']:7d} calls")
+   return '\n'.join(lines)
+
+
+def write_stats(path: pathlib.Path, stats: Dict[str, Any]) -> None:
+   path.parent.mkdir(parents=True, exist_ok=True)
+   with open(str(path), 'w') as f:
+      json.dump(stats, f, indent=2)
+      f.write('\n')
+
+
+_DEFAULT_PROFILER = None
+def get_profiler() -> Profiler:
+   global _DEFAULT_PROFILER
+   if _DEFAULT_PROFILER is None:
+      _DEFAULT_PROFILER = Profiler()
+   return _DEFAULT_PROFILER
@@ -0,0 +1,78 @@
+import time
+from typing import *
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+class PollScheduler:
+   """
+   watch で次に提出一覧を取得する時刻を決めます。
+
+   ジャッジ中の提出があるときや、提出に変化があった直後は min_interval 秒ごとに取得し、
+   変化がなければ間隔を 2 倍ずつ max_interval 秒まで延ばします。
+   サーバが混雑しているときも、同じように間隔を延ばします。
+   コンテストの開始前は開始時刻まで待ち、終了後にジャッジ中の提出がなくなったら取得をやめます。
+   時刻はすべて UNIX 時間です。
+   """
+   def __init__(self, min_interval: float = 1.0, max_interval: float = 60.0, start: Optional[float] = None, end: Optional[float] = None):
+      self.min_interval = max(0.0, min_interval)
+      self.max_interval = max(self.min_interval, max_interval)
+      self.start = start
+      self.end = end
+      self.interval = self.min_interval
+      self.next_poll: Optional[float] = time.time()  # None のときは取得をやめている
+
+
+   def on_update(self, changed: bool, judging: bool) -> None:
+      """
+      提出一覧を取得できたときに呼び出します。
+      """
+      now = time.time()
+      if changed or judging:
+         self.interval = self.min_interval
+      else:
+         self.interval = min(self.max_interval, max(1.0, self.interval * 2))
+
+      if self.end is not None and self.end < now and not judging:
+         logger.debug('stop polling: the contest is over')
+         self.next_poll = None
+      elif self.start is not None and now + self.interval < self.start:
+         self.next_poll = self.start
+      else:
+         self.next_poll = now + self.interval
+
+
+   def on_error(self, retry_after: Optional[float] = None) -> None:
+      """
+      サーバが混雑していて取得できなかったときに呼び出します。
+      """
+      self.interval = min(self.max_interval, max(1.0, self.interval * 2))
+      self.next_poll = time.time() + max(self.interval, retry_after or 0.0)
+
+
+   def is_due(self) -> bool:
+      return self.next_poll is not None and self.next_poll <= time.time()
+
+
+   def describe(self) -> str:
+      """
+      次に取得する時刻を表示用の文字列で返します。
+      """
+      if self.next_poll is None:
+         return 'the contest is over (stopped polling)'
+      if self.start is not None and self.next_poll == self.start:
+         return 'next update: ' + time.strftime('%H:%M:%S', time.localtime(self.next_poll)) + ' (the contest starts)'
+      return 'next update: ' + time.strftime('%H:%M:%S', time.localtime(self.next_poll))
+
+
+def wait_for_next_poll(schedulers: List[PollScheduler]) -> None:
+   """
+   いずれかのスケジューラが次に取得する時刻まで待ちます。すべて取得をやめているときは、戻りません。
+   """
+   next_polls = [scheduler.next_poll for scheduler in schedulers if scheduler.next_poll is not None]
+   while not next_polls:
+      time.sleep(3600)
+   delay = min(next_polls) - time.time()
+   if delay > 0:
+      time.sleep(delay)
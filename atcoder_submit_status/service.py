@@ -1,19 +1,64 @@
 from abc import abstractmethod
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import email.utils
+import hashlib
+import json
 import sys
 import time
-from copy import deepcopy
 import re
+import urllib.parse
 from typing import *
-import requests
-from bs4 import BeautifulSoup
 from colorama import Fore, Back, Style
 import atcoder_submit_status.__about__ as version
 import atcoder_submit_status.utils as utils
-from rich.table import Table
+import atcoder_submit_status.profiler as profiler
+from atcoder_submit_status.store import SubmissionStore
+from atcoder_submit_status.parsers import Parser, get_parser
+from atcoder_submit_status.submission import Columns, Status, Submission, SubmissionView, Task
 from logging import getLogger
 logger = getLogger(__name__)
 
+_unknown_statuses: Set[str] = set()  # 警告した知らない判定 (同じ判定は 1 回だけ警告する)
+
+if TYPE_CHECKING:
+   import requests
+   from atcoder_submit_status.metadata import ContestMetadata
+
+
+class ServiceError(Exception):
+   """
+   サービスとの通信に失敗したことを表します。status_code は HTTP のステータスコード (応答がなかったときは None) です。
+   """
+   def __init__(self, message: str, status_code: Optional[int] = None):
+      super().__init__(message)
+      self.status_code = status_code
+
+
+class ServiceUnavailableError(ServiceError):
+   """
+   サーバが混雑している (429) か、エラーを返した (5xx) か、接続できなかったために、ページを取得できなかったことを表します。
+
+   時間をおけば取得できる見込みがあります。retry_after はサーバが指定した待ち時間 (秒) です。
+   """
+   def __init__(self, status_code: Optional[int], retry_after: Optional[float] = None, reason: Optional[str] = None):
+      message = reason or f'{status_code} Server Error'
+      super().__init__(message + (f' (retry after {retry_after:.0f} seconds)' if retry_after is not None else ''), status_code)
+      self.retry_after = retry_after
+
+
+class LoginRequiredError(ServiceError):
+   """
+   ログインしていないために、ページを取得できなかったことを表します。
+   """
+
+
+class SubmissionsPage(NamedTuple):
+   """
+   提出一覧の 1 ページ分です。
+   """
+   submissions: List[Submission]
+   last_page: int  # ページ送りに表示されている最後のページ番号
+
 
 class Service:
    @abstractmethod
@@ -27,27 +72,52 @@ class Service:
 
 
    @abstractmethod
-   def is_logged_in(self) -> bool:
+   def is_logged_in(self, session, max_age) -> bool:
       pass
 
 
    @abstractmethod
-   def fetch_submissions(self, url, tasks, languages, statuses, users, session):
+   def fetch_submissions(self, url, tasks, languages, statuses, users, session, store, refresh, jobs, rate_limiter, tail):
       pass
 
 
    @abstractmethod
-   def minimize_submissions_info(self, submissions, mode):
+   def iter_submissions(self, url, tasks, languages, statuses, users, session, store, refresh, jobs, rate_limiter):
       pass
 
 
    @abstractmethod
-   def make_drawable_submissions(self, submissions, no_color):
+   def get_submissions_url(self, url, params, session):
       pass
 
 
    @abstractmethod
-   def get_tasks(self, tasks_url, session: Optional[requests.Session] = None):
+   def make_filter_params(self, filters, tasks, languages, statuses):
+      pass
+
+
+   @abstractmethod
+   def fetch_submissions_page(self, submissions_url, page, params, session, rate_limiter):
+      pass
+
+
+   @abstractmethod
+   def is_judging(self, submission) -> bool:
+      pass
+
+
+   @abstractmethod
+   def minimize_submissions_info(self, submissions, mode, typed):
+      pass
+
+
+   @abstractmethod
+   def make_drawable_submissions(self, submissions, no_color, cache):
+      pass
+
+
+   @abstractmethod
+   def get_tasks(self, tasks_url, session: Optional['requests.Session'] = None):
       pass
 
 
@@ -56,162 +126,304 @@ class Service:
       pass
 
 
+   @abstractmethod
+   def get_time_zone(self):
+      pass
+
+
    @abstractmethod
    def get_name(self) -> str:
       pass
 
 
 class AtCoderService(Service):
+   def __init__(self, parser: Optional[Parser] = None):
+      """
+      parser を省略したときは、速い lxml のパーサを使います。
+      """
+      self.parser = parser or get_parser()
+
+
    def get_login_page_url(self) -> str:
       return 'https://atcoder.jp/login'
 
 
-   def login(self, username: str, password: str, session: Optional[requests.Session] = None):
+   def login(self, username: str, password: str, session: Optional['requests.Session'] = None):
       session = session or utils.get_default_session()
       if self.is_logged_in(session=session):
          return
       url = self.get_login_page_url()
       logger.info(utils.NETWORK + f'GET: {url}')
-      response = session.get(url)
-      soup = BeautifulSoup(response.text, 'lxml')
-      csrf_token = soup.find(attrs={'name': 'csrf_token'}).get('value')
+      response = self._send(session, 'GET', url)
+      self._raise_for_status(response)
+      csrf_token = self.parser.parse_csrf_token(response.content, self._get_encoding(response))
       login_info = { 'csrf_token': csrf_token, 'username': username, 'password': password }
-      try:
-         response = session.post(url, data=login_info)
-         response.raise_for_status()
-      except requests.exceptions.HTTPError as e:
-         logger.error(e)
-         sys.exit(0)
+      response = self._send(session, 'POST', url, data=login_info)
+      self._raise_for_status(response)
+
 
 
+   def is_logged_in(self, session: Optional['requests.Session'] = None, max_age: float = 0.0) -> bool:
+      """
+      ログインしているかを確認します。
 
-   def is_logged_in(self, session: Optional[requests.Session] = None) -> bool:
+      セッションの Cookie がないか、期限が切れているときは、通信せずに偽を返します。
+      max_age を指定すると、同じ Cookie について max_age 秒以内に確認した結果があれば、通信せずにそれを返します。
+      """
       session = session or utils.get_default_session()
+      revel_session = self._get_revel_session(session)
+      if revel_session is None:
+         logger.debug('session cookie not found')
+         return False
+
+      key = hashlib.sha256(revel_session.encode()).hexdigest()
+      cache_path = utils.get_login_cache_path(self)
+      if max_age > 0:
+         try:
+            cached = json.loads(cache_path.read_text())
+         except (OSError, ValueError):
+            cached = {}
+         if cached.get('session') == key and 0 <= time.time() - cached.get('checked_at', 0) < max_age:
+            logger.debug(f'use the login status checked at {time.ctime(cached["checked_at"])}')
+            return bool(cached.get('logged_in'))
+
       url = 'https://atcoder.jp/contests/dummydummydummy/submit'
       logger.debug(utils.NETWORK + f'GET: {url}')
-      response = session.get(url)
-      if response.status_code == 404:
-         return True
-      else:
-         return False
+      response = self._send(session, 'GET', url)
+      logged_in = response.status_code == 404
+
+      cache_path.parent.mkdir(parents=True, exist_ok=True)
+      cache_path.write_text(json.dumps({ 'session': key, 'checked_at': time.time(), 'logged_in': logged_in }))
+      return logged_in
 
 
-   def fetch_submissions(self, url: str, tasks: List[str] = [], languages: List[str] = [], statuses: List[str] = [], users: List[str] = [], session: Optional[requests.Session] = None):
+   @profiler.profiled('fetch')
+   def fetch_submissions(self, url: str, tasks: List[str] = [], languages: List[str] = [], statuses: List[str] = [], users: List[str] = [], session: Optional['requests.Session'] = None, store: Optional[SubmissionStore] = None, refresh: bool = True, jobs: int = 1, rate_limiter: Optional['utils.RateLimiter'] = None, tail: Optional[int] = None):
+      """
+      絞り込んだ提出を提出時刻順に返します。tail を渡すと、最新の tail 個だけを取得して返します。
+      """
+      from atcoder_submit_status.crawler import SubmissionCrawler
+      session = session or utils.get_default_session()
+      crawler = SubmissionCrawler(self, url, tasks=tasks, languages=languages, statuses=statuses, users=users, session=session, store=store, refresh=refresh, jobs=jobs, rate_limiter=rate_limiter, tail=tail)
+      return crawler.update()
+
+
+   def iter_submissions(self, url: str, tasks: List[str] = [], languages: List[str] = [], statuses: List[str] = [], users: List[str] = [], session: Optional['requests.Session'] = None, store: Optional[SubmissionStore] = None, refresh: bool = True, jobs: int = 1, rate_limiter: Optional['utils.RateLimiter'] = None) -> Iterator[List[Submission]]:
+      """
+      fetch_submissions と同じ提出を、ページを取得するごとに返します。提出時刻順には並べません。
+      """
+      from atcoder_submit_status.crawler import SubmissionCrawler
+      session = session or utils.get_default_session()
+      crawler = SubmissionCrawler(self, url, tasks=tasks, languages=languages, statuses=statuses, users=users, session=session, store=store, refresh=refresh, jobs=jobs, rate_limiter=rate_limiter)
+      yield from crawler.iter_update()
+
+
+   def get_submissions_url(self, url: str, params: Dict[str, str] = {}, session: Optional['requests.Session'] = None) -> Tuple[str, Dict[str, Dict[str, str]], SubmissionsPage]:
+      """
+      提出一覧の URL と、提出一覧で使える絞り込みの選択肢と、params で絞り込んだ提出一覧の 1 ページ目を取得します。
+
+      全体の提出を見る権限がないとき (コンテスト中など) は、自分の提出一覧の URL を返します。
+      権限の確認には 1 ページ目の取得の結果を使うので、確認のためだけの通信はしません。
+      絞り込みの選択肢は {パラメータ名: {値: 表示名}} の形で返します。
+      """
       session = session or utils.get_default_session()
 
       contest_round = self.get_round(url)
       submissions_url = self.get_url() + '/contests/' + contest_round + '/submissions'
 
-      # 全体の提出を見る権限があるかを確認
-      response = session.get(submissions_url)
+      # 全体の提出を見る権限がなければ 404 になる
+      logger.debug(utils.NETWORK + f'GET: {submissions_url} (page=1, {params})')
+      response = self._send(session, 'GET', submissions_url, params=self._make_payload(1, params))
       logger.debug(f'status_code = {response.status_code}')
-      logger.debug(f'type(status_code) = {type(response.status_code)}')
       if response.status_code == 404:
          submissions_url += '/me'
+         logger.debug(utils.NETWORK + f'GET: {submissions_url} (page=1, {params})')
+         response = self._send(session, 'GET', submissions_url, params=self._make_payload(1, params))
 
-      # フィルタ用データの調整
-      if not users:
-         name = self._get_user_name()
-         if name:
-            users.append(name)
-         else:
-            logger.info(utils.FAILURE + 'users not found.')
-            sys.exit(0)
-
-      submissions = []
-      keys = self._get_all_headers()
-      for user in users:
-         page = 0
-         while True:  # page がなくなるまで
-            page += 1
-            time.sleep(0.25)
-
-            payload = { 'page': page }
-            if user:
-               payload['f.User'] = user
-
-            try:
-               response = session.get(submissions_url, params=payload)
-               response.raise_for_status()
-            except requests.exceptions.HTTPError as e:
-               logger.error(e)
-               sys.exit(0)
-
-            soup = BeautifulSoup(response.text, 'lxml')
-            
-            tables = soup.findAll('table', { 'class': 'table' }) 
-            if not tables:
-               break
-            rows = tables[0].findAll('tr')
-
-            for i in range(len(rows)):
-               if i == 0:
-                  continue
-
-               # HTMLの内容をパース
-               r = rows[i].findAll('td')
-               submission = {}
-               for i in range(len(keys)):
-                  if i < len(r) - 1:  # "Detail" の分、1個引く
-                     submission[keys[i]] = r[i].get_text().strip()
-                  else:
-                     submission[keys[i]] = ''
-
-               # データを整形する
-               submission['submission_time'] = utils.convert_timestamp_with_time_zone_to_date(submission['submission_time'])
-
-               # フィルター
-               if not tasks or utils.get_task_id(submission['task']).lower() in [t.lower() for t in tasks]:
-                  if not statuses or submission['status'] in statuses or sum(int(submission['status'] not in self._get_statuses() and s == 'WJ') for s in statuses) != 0:
-                     if not languages or utils.convert_language_with_version_to_language(submission['language']) in languages:
-                        submissions.append(submission)
-
-      submissions = sorted(submissions, key=lambda x: datetime.strptime(x['submission_time'], '%Y-%m-%d %H:%M:%S'))
-
-      return submissions
-
-   def minimize_submissions_info(self, submissions, mode):
-      res = deepcopy(submissions)
-      for i in range(len(res)):
-         if 'submission_time' in res[i]:
-            if mode == 'MINIMAL':
-               res[i].pop('submission_time')
-         if 'task' in res[i]:
-            res[i]['task'] = utils.get_task_id(res[i]['task'])
-         if 'language' in res[i]:
-            if mode == 'MINIMAL':
-               res[i].pop('language')
-            elif mode == 'NORMAL':
-               res[i]['language'] = utils.convert_language_with_version_to_language(res[i]['language'])
-         if 'code_size' in res[i]:
-            res[i].pop('code_size')
-         if 'exec_time' in res[i]:
-            res[i].pop('exec_time')
-         if 'memory' in res[i]:
-            res[i].pop('memory')
-
-      return res
-
-
-   def make_drawable_submissions(self, submissions, no_color: bool):
-      submits = deepcopy(submissions)
-
-      # Statusには色をつけておく
+      self._raise_for_status(response)
+      self._check_login_redirect(response)
+
+      return submissions_url, self.parser.parse_filter_options(response.content, self._get_encoding(response)), self._parse_submissions_page(response)
+
+
+   def make_filter_params(self, filters: Dict[str, Dict[str, str]], tasks: List[str] = [], languages: List[str] = [], statuses: List[str] = []) -> List[Dict[str, str]]:
+      """
+      絞り込みの条件を、提出一覧のクエリパラメータの組み合わせのリストに変換します。
+
+      サーバ側で表せない条件はパラメータにせず、取得後に match_submission で絞り込みます。
+      """
+      choices = []
+
+      # 問題は "A", "Ex" などの記号から "abc300_a" などの問題 ID に変換する
+      task_ids = filters.get('f.Task', {})
+      values = [value for value, label in task_ids.items() if utils.get_task_id(label).lower() in [t.lower() for t in tasks]]
+      choices.append(('f.Task', values if tasks and values else ['']))
+
+      language_names = filters.get('f.LanguageName', {})
+      values = [lang for lang in languages if lang in language_names]
+      choices.append(('f.LanguageName', values if languages and len(values) == len(languages) else ['']))
+
+      # "WJ" は "3/12" などのジャッジ中の提出も含むので、サーバ側では絞り込まない
+      status_names = filters.get('f.Status', {})
+      values = [status for status in statuses if status in status_names]
+      choices.append(('f.Status', values if statuses and 'WJ' not in statuses and len(values) == len(statuses) else ['']))
+
+      for key, values in choices:
+         if values != ['']:
+            logger.debug(f'filter on the server: {key} = {values}')
+
+      params = [{}]
+      for key, values in choices:
+         params = [dict(p, **({ key: value } if value else {})) for p in params for value in values]
+      return params
+
+
+   def get_contest_window(self, url: str, session: Optional['requests.Session'] = None) -> Tuple[Optional[datetime], Optional[datetime]]:
+      """
+      コンテストの開始時刻と終了時刻を取得します。
+      """
+      session = session or utils.get_default_session()
+
+      contest_url = self.get_url() + '/contests/' + self.get_round(url)
+      logger.debug(utils.NETWORK + f'GET: {contest_url}')
+      response = self._send(session, 'GET', contest_url)
+      self._raise_for_status(response)
+
+      window = self.parser.parse_contest_window(response.content, self._get_encoding(response))
+      if window is None:
+         return None, None
+      return tuple(datetime.strptime(t, '%Y-%m-%d %H:%M:%S%z') for t in window)
+
+
+   def get_default_users(self, session: Optional['requests.Session'] = None) -> List[str]:
+      """
+      ログインしているユーザを返します。session を渡すと、その Cookie からユーザ名を取り出します。
+      """
+      name = self._get_user_name(session)
+      if name:
+         return [name]
+      else:
+         raise LoginRequiredError('users not found.')
+
+
+   def fetch_submissions_page(self, submissions_url: str, page: int, params: Dict[str, str] = {}, session: Optional['requests.Session'] = None, rate_limiter: Optional['utils.RateLimiter'] = None) -> SubmissionsPage:
+      """
+      提出一覧の 1 ページ分を取得します。
+
+      params には 'f.User' などの絞り込みのクエリパラメータを渡します。
+      ページが存在しないときは、提出が空のページを返します。
+      複数のスレッドから同じ session と rate_limiter を使って呼び出すことができます。
+      サーバが混雑しているときは ServiceUnavailableError を送出します。
+      """
+      session = session or utils.get_default_session()
+      rate_limiter = rate_limiter or utils.get_default_rate_limiter()
+      rate_limiter.wait()
+
+      response = self._send(session, 'GET', submissions_url, params=self._make_payload(page, params))
+      self._raise_for_status(response)
+      self._check_login_redirect(response)
+
+      return self._parse_submissions_page(response)
+
+
+   def get_submissions_per_page(self) -> int:
+      return 20
+
+
+   def is_judging(self, submission: Submission) -> bool:
+      """
+      ジャッジ中 (WJ, WR, "3/12" など) の提出であるかを判定します。
+      """
+      return bool(submission.progress) or submission.status.value in self._get_judging_statuses()
+
+
+   def match_submission(self, submission: Submission, tasks: List[str] = [], languages: List[str] = [], statuses: List[str] = []) -> bool:
+      if not tasks or utils.get_task_id(submission.task).lower() in [t.lower() for t in tasks]:
+         # "WJ" は "3/12" などのジャッジ中の提出も含む
+         if not statuses or (not submission.progress and submission.status.value in statuses) or (submission.progress and 'WJ' in statuses):
+            if not languages or utils.convert_language_with_version_to_language(submission.language) in languages:
+               return True
+      return False
+
+
+   @profiler.profiled('sort')
+   def sort_submissions(self, submissions: List[Submission]) -> List[Submission]:
+      return sorted(submissions, key=lambda x: (x.time, x.id))
+
+
+   def get_columns(self, mode: str) -> Columns:
+      """
+      情報量 (MINIMAL, NORMAL, DETAILS) ごとに、表示する列と、提出から表示用の文字列を作る関数を返します。
+      """
+      tz = self.get_time_zone()
+      columns = {
+         'submission_time': lambda s: datetime.fromtimestamp(s.time, tz).strftime('%Y-%m-%d %H:%M:%S'),
+         'task': lambda s: s.task if mode == 'DETAILS' else utils.get_task_id(s.task),
+         'user': lambda s: s.user,
+         'language': lambda s: s.language if mode == 'DETAILS' else utils.convert_language_with_version_to_language(s.language),
+         'score': lambda s: self._format_number(s.score),
+         'code_size': lambda s: self._format_number(s.code_size, 'Byte'),
+         'status': self._format_status,
+         'exec_time': lambda s: self._format_number(s.exec_time, 'ms'),
+         'memory': lambda s: self._format_number(s.memory, 'KiB'),
+      }
+      if mode == 'MINIMAL':
+         keys = ['task', 'user', 'score', 'status']
+      elif mode == 'NORMAL':
+         keys = ['submission_time', 'task', 'user', 'language', 'score', 'status']
+      else:
+         keys = self._get_all_headers()
+      return { key: columns[key] for key in keys }
+
+
+   def get_typed_columns(self, mode: str) -> Columns:
+      """
+      get_columns() と同じ列について、提出から型の付いた値を作る関数を返します。
+
+      提出時刻はタイムゾーン付きの datetime、得点・コードサイズ (Byte)・実行時間 (ms)・メモリ (KiB) は int (ないときは None) です。
+      """
+      tz = self.get_time_zone()
+      typed = {
+         'submission_time': lambda s: datetime.fromtimestamp(s.time, tz),
+         'score': lambda s: s.score,
+         'code_size': lambda s: s.code_size,
+         'exec_time': lambda s: s.exec_time,
+         'memory': lambda s: s.memory,
+      }
+      return { key: typed.get(key, column) for key, column in self.get_columns(mode).items() }
+
+
+   @profiler.profiled('minimize')
+   def minimize_submissions_info(self, submissions: List[Submission], mode: str, typed: bool = False) -> List[SubmissionView]:
+      """
+      提出を、情報量に応じた列だけを見せるビューに変換します。提出はコピーしません。
+
+      typed が True のときは、値を文字列ではなく型の付いた値にします (get_typed_columns() を参照)。
+      """
+      columns = self.get_typed_columns(mode) if typed else self.get_columns(mode)
+      return [SubmissionView(submission, columns) for submission in submissions]
+
+
+   @profiler.profiled('render')
+   def make_drawable_submissions(self, submissions: List[SubmissionView], no_color: bool, cache: Optional[Dict[int, Tuple[Submission, List[Any]]]] = None):
+      """
+      提出の表を作ります。
+
+      cache に辞書を渡すと、提出 ID ごとに表の行を覚えておき、次に呼び出したときは追加された提出と変化した提出の行だけを作ります。
+      同じ cache は、同じ情報量と no_color で作る表にだけ使います。
+      """
       from rich.padding import Padding
-      for i in range(len(submits)):
-         status = submits[i]['status'][-3:].strip()
-         if not no_color:
-            color = self._get_status_color(status)
-            submits[i]['status'] = Padding(submits[i]['status'], (0, 1), style=color)
+      from rich.table import Table
 
       # Tableを構築する
       table = Table()
 
-      if len(submits) == 0:
+      if len(submissions) == 0:
          return table
 
       ## カラムの定義
-      for key in submits[0].keys():
+      keys = list(submissions[0].keys())
+      for key in keys:
          if key in ['score', 'code_size', 'exec_time', 'memory']:
             table.add_column(key, justify='right')
          elif key in ['status']:
@@ -220,35 +432,53 @@ class AtCoderService(Service):
             table.add_column(key, justify='left')
 
       ## ラインの定義
-      for submit in submits:
-         row = [val for val in submit.values()]
+      rows = {}
+      for submit in submissions:
+         cached = cache.get(submit.submission.id) if cache is not None else None
+         if cached is not None and cached[0] == submit.submission:
+            row = cached[1]
+         else:
+            row = [submit[key] for key in keys]
+            # Statusには色をつけておく
+            if not no_color and 'status' in submit:
+               i = keys.index('status')
+               row[i] = Padding(row[i], (0, 1), style=self._get_status_color(row[i][-3:].strip()))
+         rows[submit.submission.id] = (submit.submission, row)
          table.add_row(*row)
 
+      # 表示しなくなった提出の行は忘れる
+      if cache is not None:
+         cache.clear()
+         cache.update(rows)
       return table
 
 
-   def get_task_names(self, tasks_url, session: Optional[requests.Session] = None) -> List[str]:
+   def get_tasks(self, tasks_url: str, session: Optional['requests.Session'] = None) -> List[Task]:
+      """
+      問題一覧のページから、問題を取得します。保存せずに毎回取得するので、ふつうは get_contest_metadata() を使います。
+      """
       session = session or utils.get_default_session()
 
-      try:
-         response = session.get(tasks_url)
-         response.raise_for_status()
-      except requests.exceptions.HTTPError as e:
-         logger.error(e)
-         sys.exit(0)
+      logger.debug(utils.NETWORK + f'GET: {tasks_url}')
+      response = self._send(session, 'GET', tasks_url)
+      self._raise_for_status(response)
+
+      return [Task(task_id, label, f'{label} - {title}') for task_id, label, title in self.parser.parse_tasks(response.content, self._get_encoding(response))]
+
+
+   def get_task_names(self, tasks_url, session: Optional['requests.Session'] = None) -> List[str]:
+      """
+      問題名 ("A - N-choice question" など) を返します。コンテストのメタデータに保存したものがあれば、それを使います。
+      """
+      return [task.name for task in self.get_contest_metadata(tasks_url, session=session).get_tasks()]
 
-      soup = BeautifulSoup(response.text, 'lxml')
-      rows = soup.findAll('table', {'class': 'table' })[0].findAll('tr')
-      
-      task_names = []
-      for i in range(len(rows)):
-         if i == 0:
-            continue
-         r = rows[i].findAll('td')
-         task_name = f'{r[0].get_text()} - {r[1].get_text()}'
-         task_names.append(task_name)
 
-      return task_names
+   def get_contest_metadata(self, url: str, session: Optional['requests.Session'] = None) -> 'ContestMetadata':
+      """
+      コンテストの問題・言語・開催期間を、保存したものがあればそれを使って返すオブジェクトを作ります。
+      """
+      from atcoder_submit_status.metadata import ContestMetadata
+      return ContestMetadata(self, url, session=session or utils.get_default_session())
 
 
    def get_url(self):
@@ -276,14 +506,23 @@ class AtCoderService(Service):
 
 
 # private
-   def _get_user_name(self) -> str:
-      with open(utils.get_cookie_path(self)) as f:
-         res = re.search(r'UserName%3A(.*?)%00', f.read())
-         if res:
-            s = res.group(1)
-            return s
-         else:
+   def _get_user_name(self, session: Optional['requests.Session'] = None) -> Optional[str]:
+      # Cookie のファイルから読み込んだセッションでは、そのセッションの Cookie を使う
+      # (acss login の Cookie のファイルを読むと、別のアカウントのユーザ名になることがある)
+      if session is not None and getattr(session.cookies, 'filename', None):
+         texts = [cookie.value or '' for cookie in session.cookies]
+      else:
+         # Cookie のファイルがない (ログインしていない) ときは None を返す
+         try:
+            with open(utils.get_cookie_path(self)) as f:
+               texts = [f.read()]
+         except OSError:
             return None
+      for text in texts:
+         res = re.search(r'UserName%3A(.*?)%00', text)
+         if res:
+            return res.group(1)
+      return None
 
 
    def _get_all_headers(self) -> List[str]:
@@ -291,12 +530,147 @@ class AtCoderService(Service):
 
 
    def _get_statuses(self) -> List[str]:
-      return ['AC', 'CE', 'MLE', 'TLE', 'RE', 'OLE', 'IE', 'WA', 'WJ', 'WR']
+      return self._get_final_statuses() + self._get_judging_statuses()
+
+
+   def _get_final_statuses(self) -> List[str]:
+      return ['AC', 'CE', 'MLE', 'TLE', 'RE', 'OLE', 'IE', 'WA', 'QLE']
+
+
+   def _get_judging_statuses(self) -> List[str]:
+      return ['WJ', 'WR']
+
+
+   def _get_revel_session(self, session: 'requests.Session') -> Optional[str]:
+      for cookie in session.cookies:
+         if cookie.name == 'REVEL_SESSION' and not cookie.is_expired():
+            return cookie.value
+      return None
+
+
+   def _send(self, session: 'requests.Session', method: str, url: str, **kwargs) -> 'requests.Response':
+      # 429 と 5xx の再送はセッションのアダプタ (transport.TunedHTTPAdapter) が行う
+      # それでも接続できなかったときは、時間をおけば取得できる見込みがあるものとして扱う
+      import requests
+      try:
+         return session.request(method, url, **kwargs)
+      except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+         raise ServiceUnavailableError(None, reason=f'{type(e).__name__}: {url}') from e
+
+
+   def _raise_for_status(self, response: 'requests.Response') -> None:
+      if response.status_code == 429 or 500 <= response.status_code < 600:
+         raise ServiceUnavailableError(response.status_code, self._get_retry_after(response))
+      import requests
+      try:
+         response.raise_for_status()
+      except requests.exceptions.HTTPError as e:
+         raise ServiceError(str(e), response.status_code) from e
+
+
+   def _get_retry_after(self, response: 'requests.Response') -> Optional[float]:
+      # Retry-After は秒数か HTTP の日付で指定される
+      value = response.headers.get('Retry-After')
+      if value is None:
+         return None
+      if value.strip().isdigit():
+         return float(value)
+      try:
+         return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+      except (TypeError, ValueError):
+         return None
+
+
+   def _check_login_redirect(self, response: 'requests.Response') -> None:
+      # ログインの確認の結果を使い回している間にセッションが切れると、ログインページに転送される
+      if response.history and urllib.parse.urlparse(response.url).path == urllib.parse.urlparse(self.get_login_page_url()).path:
+         try:
+            utils.get_login_cache_path(self).unlink()
+         except FileNotFoundError:
+            pass
+         raise LoginRequiredError('You are not signed in.')
+
+
+   def _make_payload(self, page: int, params: Dict[str, str]) -> Dict[str, Any]:
+      payload = { 'page': page }
+      for key, value in params.items():
+         if value:
+            payload[key] = value
+      return payload
+
+
+   @profiler.profiled('parse')
+   def _parse_submissions_page(self, response: 'requests.Response') -> SubmissionsPage:
+      rows, last_page = self.parser.parse_submissions_page(response.content, self._get_encoding(response), self._get_all_headers())
+      profiler.get_profiler().count(pages=1, rows=len(rows))
+      return SubmissionsPage([self._make_submission(submission_id, row) for submission_id, row in rows], last_page)
+
+
+   def _make_submission(self, submission_id: int, row: Dict[str, str]) -> Submission:
+      # ジャッジ中の提出は "3/12" や "3/12 WA" のように進捗が前に付く
+      status_text = row['status']
+      progress, _, status = status_text.rpartition(' ')
+      if re.fullmatch(r'\d+/\d+', status_text):
+         progress, status = status_text, 'WJ'
+      elif status == 'WJ' and progress:
+         progress = status_text
+      elif status_text == 'Judging':
+         progress, status = '', 'WJ'
+      elif status not in self._get_statuses() or (progress and not re.fullmatch(r'\d+/\d+', progress)):
+         # ジャッジ中として扱うと、いつまでも取得し直すことになるので、終わったものとして扱う
+         if status_text not in _unknown_statuses:
+            _unknown_statuses.add(status_text)
+            logger.warning(f'unknown status: {status_text} (submission {submission_id})')
+         progress, status = '', Status.UNKNOWN.value
+      return Submission(
+         id=submission_id,
+         time=int(datetime.strptime(row['submission_time'], '%Y-%m-%d %H:%M:%S%z').timestamp()),
+         task=sys.intern(row['task']),
+         user=sys.intern(row['user']),
+         language=sys.intern(row['language']),
+         score=self._parse_number(row['score']),
+         code_size=self._parse_number(row['code_size']),
+         status=Status(status),
+         progress=progress,
+         exec_time=self._parse_number(row['exec_time']),
+         memory=self._parse_number(row['memory']),
+      )
+
+
+   def _parse_number(self, text: str) -> Optional[int]:
+      # "100", "203 Byte", "12 ms", "3604 KiB" など
+      res = re.match(r'-?\d+', text)
+      return int(res.group(0)) if res else None
+
+
+   def _format_number(self, value: Optional[int], unit: str = '') -> str:
+      if value is None:
+         return ''
+      return f'{value} {unit}' if unit else str(value)
+
+
+   def _format_status(self, submission: Submission) -> str:
+      if not submission.progress:
+         return submission.status.value
+      if submission.status == Status.WJ:
+         return submission.progress
+      return f'{submission.progress} {submission.status.value}'
+
+
+   def get_time_zone(self) -> timezone:
+      """
+      提出時刻のタイムゾーン (日本標準時) を返します。
+      """
+      return timezone(timedelta(hours=9))
+
+
+   def _get_encoding(self, response: 'requests.Response') -> str:
+      return response.encoding or 'utf-8'
 
 
    def _get_status_color(self, status: str):
       green = ['AC']
-      yellow = ['CE', 'MLE', 'TLE', 'RE', 'OLE', 'IE', 'WA']
+      yellow = ['CE', 'MLE', 'TLE', 'RE', 'OLE', 'IE', 'WA', 'QLE']
       gray_status = ['WJ', 'WR']
       if status in green:
          return 'rgb(255,255,255) on rgb(92,184,92)'
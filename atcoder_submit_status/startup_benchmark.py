@@ -0,0 +1,104 @@
+"""
+acss の起動時の import にかかる時間を、python -X importtime で計測します。
+
+サブコマンドごとに、パーサを作るまで (そのサブコマンドのモジュールを読み込むまで) の import の時間を測り、
+予算を超えたものがあれば終了コードを 1 にします。シェルのループや cron から呼ぶときの起動の遅れを防ぐために使います。
+
+   $ python -m atcoder_submit_status.startup_benchmark
+   $ python -m atcoder_submit_status.startup_benchmark --budget-scale 2 fetch
+
+計測は別のプロセスで行い、ばらつきを抑えるために repeat 回のうち最も短いものを使います。
+"""
+import argparse
+import subprocess
+import sys
+from typing import *
+
+# サブコマンド -> (acss に渡す引数, import の時間の予算 (ミリ秒))
+# 予算は、requests や rich を使わないものは小さく、使うものはそれを読み込む分だけ大きくしてある
+COMMANDS = {
+   'version': (['--version'], 50.0),
+   'logout': (['logout', 'atcoder'], 50.0),
+   'login': (['login', 'atcoder'], 50.0),
+   'fetch': (['fetch', 'abc300'], 230.0),
+   'watch': (['watch', 'abc300'], 300.0),
+   'stats': (['stats', 'abc300'], 300.0),
+   'archive': (['archive', 'abc300'], 230.0),
+   'daemon': (['daemon'], 230.0),
+}
+
+_SCRIPT = 'import sys; from atcoder_submit_status.main import get_parser; get_parser(sys.argv[1:])'
+
+
+class ImportTime(NamedTuple):
+   total: float  # ミリ秒
+   modules: List[Tuple[str, float]]  # 自身の import にかかった時間の長い順の (モジュール名, ミリ秒)
+
+
+def measure(args: List[str], python: str = sys.executable, baseline: Container[str] = ()) -> ImportTime:
+   """
+   acss に args を渡したときの、パーサを作るまでの import の時間を計測します。
+
+   baseline に含まれるモジュール (インタプリタの起動時に読み込まれるもの) は数えません。
+   """
+   total = 0.0
+   modules = []
+   for name, self_ms, cumulative_ms, top_level in _run(python, ['-c', _SCRIPT] + args):
+      if name in baseline:
+         continue
+      modules.append((name, self_ms))
+      if top_level:
+         total += cumulative_ms
+   modules.sort(key=lambda item: -item[1])
+   return ImportTime(total, modules)
+
+
+def get_baseline(python: str = sys.executable) -> Set[str]:
+   """
+   何も import しないときに、インタプリタの起動時 (site など) に読み込まれるモジュールを返します。
+   """
+   return { name for name, _, _, _ in _run(python, ['-c', 'pass']) }
+
+
+def _run(python: str, args: List[str]) -> Iterator[Tuple[str, float, float, bool]]:
+   # (モジュール名, 自身の時間, 累計の時間 (ミリ秒), 入れ子でないか) を返す
+   result = subprocess.run([python, '-X', 'importtime'] + args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+   for line in result.stderr.splitlines():
+      # "import time: self [us] | cumulative | imported package" の形式で、入れ子は名前の前の空白で表す
+      if not line.startswith('import time:') or 'imported package' in line:
+         continue
+      self_us, cumulative_us, name = line[len('import time:'):].split('|')
+      yield name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000, not name[1:].startswith(' ')
+
+
+def main(args: Optional[List[str]] = None) -> None:
+   parser = argparse.ArgumentParser(description='Measure the import time of acss for each subcommand')
+   parser.add_argument('commands', metavar='command', nargs='*', help=f'Subcommands to measure. (default: all of {", ".join(COMMANDS)})')
+   parser.add_argument('--repeat', metavar='<n>', default=5, type=int, help='Measure <n> times and take the fastest. (default: 5)')
+   parser.add_argument('--budget-scale', metavar='<x>', default=1.0, type=float, help='Multiply the budgets by <x> for slow machines. (default: 1)')
+   parser.add_argument('--top', metavar='<n>', default=5, type=int, help='Show the <n> slowest modules of each subcommand. (default: 5)')
+   parsed = parser.parse_args(args)
+   for command in parsed.commands:
+      if command not in COMMANDS:
+         parser.error(f'unknown command: {command} (choose from {", ".join(COMMANDS)})')
+
+   baseline = get_baseline()
+   over = []
+   for command in parsed.commands or list(COMMANDS):
+      argv, budget = COMMANDS[command]
+      budget *= parsed.budget_scale
+      best = min((measure(argv, baseline=baseline) for _ in range(max(1, parsed.repeat))), key=lambda result: result.total)
+      ok = best.total <= budget
+      print(f'{command:<8} {best.total:8.1f} ms  (budget {budget:.0f} ms){"" if ok else "  OVER BUDGET"}')
+      for name, ms in best.modules[:parsed.top]:
+         print(f'           {ms:8.1f} ms  {name}')
+      if not ok:
+         over.append(command)
+
+   if over:
+      print(f'over budget: {", ".join(over)}', file=sys.stderr)
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+   main()
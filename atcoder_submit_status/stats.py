@@ -0,0 +1,168 @@
+import argparse
+import json
+import sys
+from typing import *
+from logging import getLogger
+from rich.console import Console
+from rich.table import Table
+
+import atcoder_submit_status.utils as utils
+import atcoder_submit_status.service as service
+from atcoder_submit_status.crawler import SubmissionCrawler
+from atcoder_submit_status.store import SubmissionStore
+from atcoder_submit_status.table import SubmissionTable
+
+logger = getLogger(__name__)
+
+PERCENTILES = [50, 90, 99, 100]
+
+def add_subparser(subparsers: argparse.Action) -> None:
+   subparsers_add_parser: Callable[..., argparse.ArgumentParser] = subparsers.add_parser  # type: ignore
+   subparser = subparsers_add_parser('stats', help='Aggregate the contest submissions', formatter_class=argparse.RawTextHelpFormatter, epilog='''\
+Supported Services:
+  √ AtCoder
+''')
+   subparser.add_argument('url', help='Contest URL (or AtCoder contest name)')
+   subparser.add_argument('--tasks', metavar='<task-name>', default=[], nargs='*', help='Select tasks.\n(e.g. a b d ex)')
+   subparser.add_argument('--languages', metavar='<lang>', default=[], nargs='*', help='Select languages.\n(e.g. C++ C#)')
+   subparser.add_argument('--statuses', default=[], nargs='*', choices=['AC', 'CE', 'MLE', 'TLE', 'RE', 'OLE', 'IE', 'WA', 'QLE', 'WJ', 'WR'], help='Select statuses.\n(e.g. WA TLE)')
+   subparser.add_argument('-u', '--users', metavar='<user-name>', default=[], nargs='*', help='Select users. (default: all users)')
+   subparser.add_argument('--format', default='table', choices=['table', 'json'], help='Select output format.')
+   subparser.add_argument('--top', metavar='<n>', default=20, type=int, help='Show the verdicts of the top <n> users in the table. (default: 20)')
+   subparser.add_argument('-j', '--jobs', metavar='<n>', default=4, type=int, help='Send up to <n> requests at the same time. (default: 4)')
+   subparser.add_argument('--rate-limit', metavar='<n>', default=utils.DEFAULT_REQUESTS_PER_SECOND, type=float, help=f'Send at most <n> requests per second. (default: {utils.DEFAULT_REQUESTS_PER_SECOND})')
+   subparser.add_argument('--refresh', action='store_true', help='Check for new submissions even if the contest is over.')
+
+
+def aggregate(srv: service.Service, table: SubmissionTable, rows: Sequence[int], start: Optional[float] = None) -> Dict[str, Any]:
+   """
+   表の rows の行を集計します。
+
+   問題ごと・ユーザごとの結果の数、問題ごとの最初の AC、言語ごとの提出数、問題ごとの実行時間とメモリの百分位数を返します。
+   start にコンテストの開始時刻を渡すと、最初の AC に開始からの経過秒数を付けます。
+   """
+   columns = srv.get_columns('NORMAL')
+   verdicts_by_task: Dict[str, Dict[str, int]] = {}
+   for (task, status), count in table.count_by(['task', 'status'], rows).items():
+      verdicts_by_task.setdefault(task, {})[status] = count
+   verdicts_by_user: Dict[str, Dict[str, int]] = {}
+   for (user, status), count in table.count_by(['user', 'status'], rows).items():
+      verdicts_by_user.setdefault(user, {})[status] = count
+
+   first_ac = {}
+   for task, s in table.first_by('task', table.select(statuses=['AC'], rows=rows)).items():
+      first_ac[task] = {
+         'id': s.id,
+         'user': s.user,
+         'language': s.language,
+         'submission_time': columns['submission_time'](s),
+         'elapsed': int(s.time - start) if start is not None else None,
+      }
+
+   languages = { language: count for (language,), count in table.count_by(['language'], rows).items() }
+   return {
+      'submissions': len(rows),
+      'verdicts_by_task': { task: verdicts_by_task[task] for task in _sort_tasks(verdicts_by_task) },
+      'verdicts_by_user': verdicts_by_user,
+      'first_ac': { task: first_ac[task] for task in _sort_tasks(first_ac) },
+      'languages': dict(sorted(languages.items(), key=lambda item: -item[1])),
+      'exec_time': _percentiles(table.percentiles_by('exec_time', 'task', PERCENTILES, rows)),
+      'memory': _percentiles(table.percentiles_by('memory', 'task', PERCENTILES, rows)),
+   }
+
+
+def print_stats(stats: Dict[str, Any], top: int, console: Console) -> None:
+   statuses = [status for status in ['AC', 'WA', 'TLE', 'MLE', 'RE', 'OLE', 'CE', 'IE', 'QLE', 'WJ', 'WR', '?'] if any(status in v for v in stats['verdicts_by_task'].values())]
+
+   table = Table(title=f"Verdicts by task ({stats['submissions']} submissions)")
+   _add_columns(table, ['task'] + statuses + ['total'])
+   for task, verdicts in stats['verdicts_by_task'].items():
+      table.add_row(utils.get_task_id(task), *[str(verdicts.get(status, 0)) for status in statuses], str(sum(verdicts.values())))
+   console.print(table)
+
+   users = sorted(stats['verdicts_by_user'].items(), key=lambda item: (-item[1].get('AC', 0), -sum(item[1].values()), item[0]))
+   table = Table(title=f'Verdicts by user (top {min(top, len(users))} of {len(users)})')
+   _add_columns(table, ['user'] + statuses + ['total'])
+   for user, verdicts in users[:top]:
+      table.add_row(user, *[str(verdicts.get(status, 0)) for status in statuses], str(sum(verdicts.values())))
+   console.print(table)
+
+   table = Table(title='First AC')
+   _add_columns(table, ['task', 'submission_time', 'elapsed', 'user', 'language'])
+   for task, s in stats['first_ac'].items():
+      elapsed = '' if s['elapsed'] is None else '{}:{:02}:{:02}'.format(s['elapsed'] // 3600, s['elapsed'] // 60 % 60, s['elapsed'] % 60)
+      table.add_row(utils.get_task_id(task), s['submission_time'], elapsed, s['user'], s['language'])
+   console.print(table)
+
+   table = Table(title='Languages')
+   _add_columns(table, ['language', 'submissions', 'share'])
+   for language, count in stats['languages'].items():
+      table.add_row(language, str(count), f"{100 * count / max(1, stats['submissions']):.1f}%")
+   console.print(table)
+
+   for key, unit in [('exec_time', 'ms'), ('memory', 'KiB')]:
+      table = Table(title=f'{key} ({unit})')
+      _add_columns(table, ['task'] + [_get_percentile_name(p) for p in PERCENTILES])
+      for task, values in stats[key].items():
+         table.add_row(utils.get_task_id(task), *[str(value) for value in values.values()])
+      console.print(table)
+
+
+def run(args: argparse.Namespace) -> bool:
+   srv = utils.service_from_url(args.url)
+
+   if srv is None:
+      logger.info('we predict that the service you use is AtCoder.')
+      srv = service.AtCoderService()
+
+   with utils.new_session_with_our_user_agent(args.cookie, service=srv, pool_size=args.jobs) as session:
+      logger.debug('start session')
+      if not srv.is_logged_in(session, max_age=utils.LOGIN_STATUS_MAX_AGE):
+         logger.info(utils.FAILURE + 'You are not signed in.')
+         logger.info(utils.HINT + f'You can try to enter this command: `acss login {srv.get_name()}`')
+         return False
+
+      try:
+         srv.get_contest_metadata(args.url, session=session).check_filters(tasks=args.tasks, languages=args.languages)
+      except ValueError as e:
+         logger.error(e)
+         return False
+
+      try:
+         with SubmissionStore(utils.get_store_path(srv, srv.get_round(args.url))) as store:
+            # ユーザを指定しないときは、コンテストのすべての提出を集計する
+            crawler = SubmissionCrawler(srv, args.url, tasks=args.tasks, languages=args.languages, statuses=args.statuses, users=args.users or [''], session=session, store=store, refresh=args.refresh, jobs=args.jobs, rate_limiter=utils.RateLimiter(args.rate_limit))
+            crawler.update()
+            table = crawler.get_table()
+            stats = aggregate(srv, table, crawler.select(table), start=crawler.get_contest_window()[0])
+      except service.ServiceUnavailableError as e:
+         logger.error(e)
+         logger.info(utils.HINT + 'The server is busy. Please try again later. (The submissions fetched so far are saved.)')
+         return False
+      except KeyboardInterrupt:
+         sys.exit(0)
+
+   if args.format == 'json':
+      json.dump(stats, sys.stdout, ensure_ascii=False)
+      print()
+   else:
+      print_stats(stats, args.top, Console())
+   return True
+
+
+def _add_columns(table: Table, keys: List[str]) -> None:
+   for key in keys:
+      table.add_column(key, justify='left' if key in ['task', 'user', 'language', 'submission_time'] else 'right')
+
+
+def _sort_tasks(tasks: Iterable[str]) -> List[str]:
+   # "A" ... "G", "Ex" の順に並べる
+   return sorted(tasks, key=lambda task: (len(utils.get_task_id(task)), utils.get_task_id(task), task))
+
+
+def _percentiles(values: Dict[str, List[int]]) -> Dict[str, Dict[str, int]]:
+   return { task: dict(zip(map(_get_percentile_name, PERCENTILES), values[task])) for task in _sort_tasks(values) }
+
+
+def _get_percentile_name(percentile: int) -> str:
+   return 'max' if percentile == 100 else f'p{percentile}'
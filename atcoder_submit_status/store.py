@@ -0,0 +1,108 @@
+import json
+import pathlib
+import sqlite3
+import threading
+from typing import *
+from logging import getLogger
+
+from atcoder_submit_status.submission import Status, Submission
+
+logger = getLogger(__name__)
+
+
+class SubmissionStore:
+   """
+   取得した提出を保存しておくデータベース (SQLite) です。
+
+   サービスとコンテストごとに 1 つのファイルを使います。
+   提出は提出一覧 (listing) ごとに提出 ID をキーとして保存します。
+   複数のスレッドから使うことができます。
+   """
+   _VERSION = 2
+
+   def __init__(self, path: pathlib.Path):
+      self.path = path
+      path.parent.mkdir(parents=True, exist_ok=True)
+      logger.debug('open store: %s', path)
+      self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+      self._lock = threading.RLock()
+      if self._conn.execute('PRAGMA user_version').fetchone()[0] != self._VERSION:
+         self._create_tables()
+
+
+   def __enter__(self) -> 'SubmissionStore':
+      return self
+
+
+   def __exit__(self, *exc) -> None:
+      self.close()
+
+
+   def close(self) -> None:
+      self._conn.close()
+
+
+   def load_listing(self, key: str) -> Tuple[Dict[int, Submission], Optional[int], bool, float]:
+      """
+      提出一覧を読み込み、(提出, 最も古い提出 ID, 最後まで取得済みか, 最後に確認した時刻) を返します。
+      """
+      with self._lock:
+         submissions = {}
+         for submission_id, data in self._conn.execute('SELECT id, data FROM submissions WHERE listing = ?', (key,)):
+            submissions[submission_id] = self._decode(submission_id, data)
+         row = self._conn.execute('SELECT low, complete, checked_at FROM listings WHERE listing = ?', (key,)).fetchone()
+         if row is None:
+            return submissions, None, False, 0.0
+         low, complete, checked_at = row
+         return submissions, low, bool(complete), checked_at
+
+
+   def save_listing(self, key: str, submissions: Iterable[Submission], low: Optional[int], complete: bool, checked_at: float) -> None:
+      """
+      提出と提出一覧の状態を 1 つのトランザクションで書き込みます。
+      """
+      with self._lock:
+         with self._conn:
+            self._conn.executemany(
+               'INSERT OR REPLACE INTO submissions (listing, id, data) VALUES (?, ?, ?)',
+               [(key, submission.id, self._encode(submission)) for submission in submissions])
+            self._conn.execute(
+               'INSERT OR REPLACE INTO listings (listing, low, complete, checked_at) VALUES (?, ?, ?, ?)',
+               (key, low, int(complete), checked_at))
+
+
+   def get_meta(self, key: str) -> Any:
+      with self._lock:
+         row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+         return None if row is None else json.loads(row[0])
+
+
+   def set_meta(self, key: str, value: Any) -> None:
+      with self._lock:
+         with self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+
+# private
+   def _encode(self, submission: Submission) -> str:
+      # 提出 ID は列として持つので、それ以外の値を JSON の配列として保存する
+      return json.dumps([value.value if isinstance(value, Status) else value for value in submission[1:]], ensure_ascii=False)
+
+
+   def _decode(self, submission_id: int, data: str) -> Submission:
+      submission = Submission(submission_id, *json.loads(data))
+      return submission._replace(status=Status(submission.status))
+
+
+   def _create_tables(self) -> None:
+      # 形式が変わったときは、保存済みのデータを捨てて作り直す
+      with self._conn:
+         self._conn.executescript(f'''
+            DROP TABLE IF EXISTS submissions;
+            DROP TABLE IF EXISTS listings;
+            DROP TABLE IF EXISTS meta;
+            CREATE TABLE submissions (listing TEXT NOT NULL, id INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (listing, id));
+            CREATE TABLE listings (listing TEXT PRIMARY KEY, low INTEGER, complete INTEGER NOT NULL, checked_at REAL NOT NULL);
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            PRAGMA user_version = {self._VERSION};
+         ''')
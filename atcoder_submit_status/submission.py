@@ -0,0 +1,79 @@
+import enum
+from typing import *
+
+
+class Status(enum.Enum):
+   """
+   ジャッジの状態です。
+
+   UNKNOWN は、知らない判定 (AtCoder に新しく増えたものなど) です。ジャッジが終わったものとして扱います。
+   """
+   AC = 'AC'
+   CE = 'CE'
+   MLE = 'MLE'
+   TLE = 'TLE'
+   RE = 'RE'
+   OLE = 'OLE'
+   IE = 'IE'
+   WA = 'WA'
+   QLE = 'QLE'
+   WJ = 'WJ'
+   WR = 'WR'
+   UNKNOWN = '?'
+
+
+class Submission(NamedTuple):
+   """
+   1 件の提出です。
+
+   提出時刻は UNIX 時間、実行時間はミリ秒、メモリは KiB、コードサイズはバイトで持ちます。
+   ジャッジ中の提出は、progress に "3/12" などの進捗を持ちます。
+   """
+   id: int
+   time: int
+   task: str  # "A - N-choice question" など
+   user: str
+   language: str  # "C++ (GCC 9.2.1)" など
+   score: Optional[int]
+   code_size: Optional[int]
+   status: Status
+   progress: str
+   exec_time: Optional[int]
+   memory: Optional[int]
+
+
+class Task(NamedTuple):
+   """
+   コンテストの問題です。
+   """
+   id: str  # "abc300_a" など (提出一覧の f.Task の値)
+   label: str  # "A", "Ex" など (--tasks で指定するもの)
+   name: str  # "A - N-choice question" など (提出の task と同じ形)
+
+
+Columns = Dict[str, Callable[[Submission], Any]]  # 列名 -> 提出から値 (ふつうは表示用の文字列) を作る関数
+
+
+class SubmissionView(Mapping[str, str]):
+   """
+   提出を、列名から表示用の文字列への辞書として見せます。
+
+   値は参照されるたびに提出から作るので、提出をコピーしません。
+   """
+   __slots__ = ('submission', 'columns')
+
+   def __init__(self, submission: Submission, columns: Columns):
+      self.submission = submission
+      self.columns = columns
+
+
+   def __getitem__(self, key: str) -> str:
+      return self.columns[key](self.submission)
+
+
+   def __iter__(self) -> Iterator[str]:
+      return iter(self.columns)
+
+
+   def __len__(self) -> int:
+      return len(self.columns)
@@ -0,0 +1,409 @@
+import array
+import bisect
+import collections
+import itertools
+import math
+import operator
+from typing import *
+from logging import getLogger
+
+import atcoder_submit_status.utils as utils
+from atcoder_submit_status.submission import Status, Submission
+
+logger = getLogger(__name__)
+
+_STATUSES = list(Status)
+_STATUS_CODES = { id(status): code for code, status in enumerate(_STATUSES) }  # Enum のハッシュは遅いので、id で引く
+_JUDGING = len(_STATUSES)  # "3/12" など、進捗の付いたジャッジ中の提出の状態の番号
+_WJ = _STATUSES.index(Status.WJ)
+_NONE = -1  # 数値の列で、値がないことを表す
+
+
+class _Dictionary:
+   """
+   文字列と番号を対応させます。列には番号だけを持ちます。
+   """
+   def __init__(self):
+      self.values: List[str] = []
+      self._codes: Dict[str, int] = {}
+
+
+   def encode_all(self, values: Iterable[str]) -> array.array:
+      codes = self._codes
+      size = len(codes)
+      res = array.array('i', [codes.setdefault(value, len(codes)) for value in values])
+      if len(codes) > size:
+         self.values.extend(itertools.islice(codes, size, None))
+      return res
+
+
+   def find(self, predicate: Callable[[str], bool]) -> Set[int]:
+      """
+      predicate を満たす文字列の番号を返します。
+      """
+      return { code for code, value in enumerate(self.values) if predicate(value) }
+
+
+class SubmissionTable:
+   """
+   提出を、列ごとの配列で持つ表です。行は提出時刻順 (同じ時刻は ID 順) に並べます。
+
+   問題・ユーザ・言語の文字列は番号に置き換えて (辞書符号化して) 持ち、
+   問題・ユーザ・状態ごとに、その値を持つ行の番号の索引を作ります。
+   列と索引は、絞り込みに必要になったときに作ります。
+   絞り込みは、索引と列の番号の比較で行います。NumPy があるときは、列をまとめて比較します。
+   絞り込んだ結果は、元の提出をそのまま返します。
+
+   upsert() で提出を追加・更新すると、作ってある列と索引もその分だけ更新するので、
+   更新のたびに表を作り直す必要はありません。
+   """
+   def __init__(self, submissions: Iterable[Submission] = ()):
+      self.rows: List[Submission] = []
+      self.dictionaries: Dict[str, _Dictionary] = {}
+      self._columns: Dict[str, array.array] = {}
+      self._indexes: Dict[str, Dict[int, array.array]] = {}  # 列の名前 -> 番号 -> 行の番号
+      self._positions: Optional[Dict[int, int]] = None  # 提出 ID -> 行の番号
+      self._reset(submissions)
+
+
+   def upsert(self, submissions: Iterable[Submission]) -> None:
+      """
+      提出を追加します。同じ ID の提出がすでにあるときは、置き換えます (ジャッジが終わったときなど)。
+
+      追加する提出がすべて表の最後の行より新しいときは、列と索引の末尾に追加します。
+      そうでないとき (中断した取得の続きで古い提出を取得したときなど) は、表を作り直します。
+      """
+      positions = self._get_positions()
+      added: Dict[int, Submission] = {}
+      for s in submissions:
+         i = positions.get(s.id)
+         if i is None:
+            added[s.id] = s
+         elif self.rows[i] != s:
+            self._replace(i, s)
+      if not added:
+         return
+
+      key = operator.attrgetter('time', 'id')
+      new_rows = sorted(added.values(), key=key)
+      if self.rows and key(new_rows[0]) < key(self.rows[-1]):
+         logger.debug(f'rebuild the table for {len(new_rows)} older submissions')
+         self._reset(self.rows + new_rows)
+         return
+
+      start = len(self.rows)
+      self.rows.extend(new_rows)
+      positions.update((s.id, i) for i, s in enumerate(new_rows, start))
+      for name, column in self._columns.items():
+         codes = self._encode(name, new_rows)
+         column.extend(codes)
+         index = self._indexes.get(name)
+         if index is not None:
+            _extend_index(index, codes, start)
+
+
+   def get_column(self, name: str) -> array.array:
+      """
+      列 (time, task, user, language, status, score, exec_time, memory) を返します。
+
+      task, user, language の列は dictionaries[name] の番号、status の列は Status の順番
+      (進捗の付いたジャッジ中の提出は len(Status)) を持ちます。数値の列で値がないものは -1 です。
+      """
+      column = self._columns.get(name)
+      if column is None:
+         column = self._columns[name] = self._encode(name, self.rows)
+      return column
+
+
+   def __len__(self) -> int:
+      return len(self.rows)
+
+
+   def __getitem__(self, i: int) -> Submission:
+      return self.rows[i]
+
+
+   def select(self, tasks: List[str] = [], languages: List[str] = [], statuses: List[str] = [], users: List[str] = [], rows: Optional[Sequence[int]] = None) -> Sequence[int]:
+      """
+      条件を満たす行の番号を、昇順 (提出時刻順) に返します。rows (昇順の行の番号) を渡すと、その中から選びます。
+
+      条件の意味は AtCoderService.match_submission() と同じです。users に '' を含むときは、ユーザで絞り込みません。
+      """
+      conditions = self._get_conditions(tasks, languages, statuses, users)
+      if any(not codes for _, codes in conditions):
+         return []
+      if not conditions:
+         return range(len(self)) if rows is None else rows
+
+      numpy = _import_numpy()
+      if numpy is not None:
+         mask = numpy.ones(len(self), dtype=bool)
+         for name, codes in conditions:
+            column = self.get_column(name)
+            mask &= numpy.isin(numpy.frombuffer(column, dtype=column.typecode), list(codes))
+         if rows is not None:
+            rows = _to_array(rows, numpy)
+            return rows[mask[rows]].tolist()
+         return numpy.flatnonzero(mask).tolist()
+
+      # 候補の行が最も少ない条件の索引から候補を作り、残りの条件を列で確かめる
+      def count(condition: Tuple[str, Set[int]]) -> int:
+         index = self._get_index(condition[0])
+         return sum(len(index.get(code, ())) for code in condition[1])
+      conditions.sort(key=count)
+      name, codes = conditions[0]
+      index = self._get_index(name)
+      candidates = sorted(i for code in codes for i in index.get(code, ()))
+      for name, codes in conditions[1:]:
+         column = self.get_column(name)
+         candidates = [i for i in candidates if column[i] in codes]
+      if rows is not None:
+         # range はそのまま、それ以外は集合にして、候補が rows に含まれるかを確かめる
+         rows = rows if isinstance(rows, range) else set(rows)
+         candidates = [i for i in candidates if i in rows]
+      return candidates
+
+
+   def to_submissions(self, rows: Optional[Iterable[int]] = None) -> List[Submission]:
+      """
+      行の番号 (省略したときはすべての行) の提出を返します。
+      """
+      if rows is None:
+         return list(self.rows)
+      if isinstance(rows, range):
+         return self.rows[rows.start:rows.stop:rows.step]
+      return [self.rows[i] for i in rows]
+
+
+   def count_by(self, names: List[str], rows: Optional[Sequence[int]] = None) -> Dict[Tuple[Any, ...], int]:
+      """
+      行 (省略したときはすべての行) を、列 names の値の組ごとに数えます。
+
+      値は、task, user, language は文字列、status は状態の文字列 (進捗の付いたジャッジ中の提出は "WJ") にして返します。
+      """
+      decoders = [self._get_decoder(name) for name in names]
+      numpy = _import_numpy()
+      if numpy is not None:
+         # 値の組を 1 つの整数にまとめて数える
+         key = numpy.zeros(len(self) if rows is None else len(rows), dtype=numpy.int64)
+         sizes = [self._get_size(name) for name in names]
+         for name, size in zip(names, sizes):
+            codes = self._take(name, rows, numpy)
+            if name == 'status':
+               # ジャッジ中の提出は、進捗の有無によらず "WJ" にまとめる
+               codes[codes == _JUDGING] = _WJ
+            key = key * size + codes
+         keys, counts = numpy.unique(key, return_counts=True)
+         columns = []
+         for decoder, size in zip(reversed(decoders), reversed(sizes)):
+            keys, codes = numpy.divmod(keys, size)
+            columns.append(list(map(decoder.__getitem__, codes.tolist())))
+         # 値の組はすべて異なるので、そのまま辞書にする
+         return dict(zip(zip(*reversed(columns)), counts.tolist()))
+
+      # ジャッジ中の提出は、進捗の有無によらず "WJ" にまとめる
+      res: Dict[Tuple[Any, ...], int] = {}
+      for codes, count in collections.Counter(zip(*[self._take(name, rows) for name in names])).items():
+         key = tuple(decoder[code] for decoder, code in zip(decoders, codes))
+         res[key] = res.get(key, 0) + count
+      return res
+
+
+   def first_by(self, name: str, rows: Optional[Sequence[int]] = None) -> Dict[Any, Submission]:
+      """
+      行 (省略したときはすべての行) のうち、列 name の値ごとに最初 (最も早い提出時刻) の提出を返します。
+      """
+      if rows is None:
+         rows = range(len(self))
+      numpy = _import_numpy()
+      if numpy is not None:
+         codes, first = numpy.unique(self._take(name, rows, numpy), return_index=True)
+         first_rows = { code: rows[i] for code, i in zip(codes.tolist(), first.tolist()) }
+      else:
+         first_rows = {}
+         for i, code in zip(rows, self._take(name, rows)):
+            if code not in first_rows:
+               first_rows[code] = i
+
+      res: Dict[Any, Submission] = {}
+      for code, i in sorted(first_rows.items(), key=lambda item: item[1]):
+         res.setdefault(self._decode(name, code), self.rows[i])
+      return res
+
+
+   def percentiles_by(self, value_name: str, name: str, percentiles: List[float], rows: Optional[Sequence[int]] = None) -> Dict[Any, List[int]]:
+      """
+      列 name の値ごとに、数値の列 value_name の百分位数 (最近接順位法) を返します。値がない行は除きます。
+      """
+      numpy = _import_numpy()
+      if numpy is not None:
+         values = self._take(value_name, rows, numpy)
+         codes = self._take(name, rows, numpy)
+         present = values != _NONE
+         values, codes = values[present], codes[present]
+         order = numpy.lexsort((values, codes))
+         values, codes = values[order], codes[order]
+         groups, starts, counts = numpy.unique(codes, return_index=True, return_counts=True)
+         res = {}
+         for code, start, count in zip(groups.tolist(), starts.tolist(), counts.tolist()):
+            res[self._decode(name, code)] = [int(values[start + _get_rank(p, count)]) for p in percentiles]
+         return res
+
+      groups: Dict[int, List[int]] = {}
+      for code, value in zip(self._take(name, rows), self._take(value_name, rows)):
+         if value != _NONE:
+            groups.setdefault(code, []).append(value)
+      res = {}
+      for code, values in groups.items():
+         values.sort()
+         res[self._decode(name, code)] = [values[_get_rank(p, len(values))] for p in percentiles]
+      return res
+
+
+   def _take(self, name: str, rows: Optional[Sequence[int]], numpy=None):
+      # 列のうち、rows の行の値を返す (numpy を渡したときは NumPy の配列で返す)
+      column = self.get_column(name)
+      if numpy is not None:
+         column = numpy.frombuffer(column, dtype=column.typecode) if len(column) else numpy.zeros(0, dtype=numpy.int64)
+         if rows is None:
+            return column.astype(numpy.int64)
+         if isinstance(rows, range):
+            return column[rows.start:rows.stop:rows.step].astype(numpy.int64)
+         return column[_to_array(rows, numpy)].astype(numpy.int64)
+      if rows is None:
+         return column
+      if isinstance(rows, range):
+         return column[rows.start:rows.stop:rows.step]
+      return [column[i] for i in rows]
+
+
+   def _encode(self, name: str, rows: List[Submission]) -> array.array:
+      # 提出の列 name の値を、列に持つ番号にする
+      if name in self.dictionaries:
+         return self.dictionaries[name].encode_all(map(operator.attrgetter(name), rows))
+      if name == 'status':
+         return array.array('b', [_JUDGING if s.progress else _STATUS_CODES[id(s.status)] for s in rows])
+      return array.array('q', [_NONE if value is None else value for value in map(operator.attrgetter(name), rows)])
+
+
+   def _replace(self, i: int, submission: Submission) -> None:
+      # i 行目の提出を置き換える (提出時刻・問題・ユーザ・言語は変わらないので、それ以外の列を更新する)
+      self.rows[i] = submission
+      for name, column in self._columns.items():
+         if name in self.dictionaries or name == 'time':
+            continue
+         code = self._encode(name, [submission])[0]
+         if column[i] == code:
+            continue
+         index = self._indexes.get(name)
+         if index is not None:
+            rows = index[column[i]]
+            del rows[bisect.bisect_left(rows, i)]
+            bisect.insort(index.setdefault(code, array.array('i')), i)
+         column[i] = code
+
+
+   def _reset(self, submissions: Iterable[Submission]) -> None:
+      # (time, id) の組で並べるより、安定な並べ替えを 2 回する方が速い
+      self.rows = sorted(submissions, key=operator.attrgetter('id'))
+      self.rows.sort(key=operator.attrgetter('time'))
+      self.dictionaries = { 'task': _Dictionary(), 'user': _Dictionary(), 'language': _Dictionary() }
+      self._columns = {}
+      self._indexes = {}
+      self._positions = None
+
+
+   def _get_positions(self) -> Dict[int, int]:
+      if self._positions is None:
+         self._positions = { s.id: i for i, s in enumerate(self.rows) }
+      return self._positions
+
+
+   def _get_size(self, name: str) -> int:
+      # 列が取りうる番号の数
+      if name in self.dictionaries:
+         return max(1, len(self._get_dictionary(name).values))
+      if name == 'status':
+         return _JUDGING + 1
+      raise ValueError(f'not a categorical column: {name}')
+
+
+   def _get_decoder(self, name: str) -> List[Any]:
+      # 番号から値への対応表
+      return [self._decode(name, code) for code in range(self._get_size(name))]
+
+
+   def _decode(self, name: str, code: int) -> Any:
+      if name in self.dictionaries:
+         return self.dictionaries[name].values[code]
+      if name == 'status':
+         return 'WJ' if code == _JUDGING else _STATUSES[code].value
+      return code
+
+
+   def _get_conditions(self, tasks: List[str], languages: List[str], statuses: List[str], users: List[str]) -> List[Tuple[str, Set[int]]]:
+      # 条件を、列の名前と、その列で条件を満たす番号の組にする
+      conditions = []
+      if users and '' not in users:
+         names = { user.lower() for user in users }
+         conditions.append(('user', self._get_dictionary('user').find(lambda user: user.lower() in names)))
+      if tasks:
+         ids = { task.lower() for task in tasks }
+         conditions.append(('task', self._get_dictionary('task').find(lambda task: utils.get_task_id(task).lower() in ids)))
+      if languages:
+         conditions.append(('language', self._get_dictionary('language').find(lambda language: utils.convert_language_with_version_to_language(language) in languages)))
+      if statuses:
+         # "WJ" は "3/12" などのジャッジ中の提出も含む
+         codes = { code for code, status in enumerate(_STATUSES) if status.value in statuses }
+         if 'WJ' in statuses:
+            codes.add(_JUDGING)
+         conditions.append(('status', codes))
+      return conditions
+
+
+   def _get_dictionary(self, name: str) -> _Dictionary:
+      self.get_column(name)
+      return self.dictionaries[name]
+
+
+   def _get_index(self, name: str) -> Dict[int, array.array]:
+      index = self._indexes.get(name)
+      if index is None:
+         index = self._indexes[name] = _make_index(self.get_column(name))
+      return index
+
+
+def _make_index(column: array.array) -> Dict[int, array.array]:
+   index: Dict[int, array.array] = {}
+   _extend_index(index, column, 0)
+   return index
+
+
+def _extend_index(index: Dict[int, array.array], codes: Iterable[int], start: int) -> None:
+   # start 行目から codes の番号を持つ行を、索引に追加する
+   for i, code in enumerate(codes, start):
+      rows = index.get(code)
+      if rows is None:
+         rows = index[code] = array.array('i')
+      rows.append(i)
+
+
+def _to_array(rows: Sequence[int], numpy):
+   # 行の番号を NumPy の配列にする (range は 1 つずつ読まずに作る)
+   if isinstance(rows, range):
+      return numpy.arange(rows.start, rows.stop, rows.step, dtype=numpy.int64)
+   return numpy.asarray(rows, dtype=numpy.int64)
+
+
+def _get_rank(percentile: float, count: int) -> int:
+   # 最近接順位法で、昇順に並べた count 個の値のうち percentile パーセンタイルにあたる位置を返す
+   return min(count - 1, max(0, math.ceil(percentile / 100 * count) - 1))
+
+
+def _import_numpy():
+   # NumPy は必須ではないので、ないときは None を返す
+   try:
+      import numpy
+      return numpy
+   except ImportError:
+      return None
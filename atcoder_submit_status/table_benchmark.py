@@ -0,0 +1,120 @@
+"""
+watch などで提出一覧を何度も更新するときの、絞り込みにかかる時間を計測します。
+
+提出が rows 件ある一覧に、1 回の更新ごとに新しい提出を new 件追加し、ジャッジ中の提出のジャッジを終わらせて、
+更新のたびに次の 3 つの方法で絞り込みます。
+
+   loop        すべての提出を match_submission() で確かめて並べ替える (表を使わないとき)
+   rebuild     更新のたびに SubmissionTable を作り直して select() する
+   persistent  1 つの SubmissionTable に upsert() で差分を反映して select() する (SubmissionCrawler の方法)
+
+persistent が loop より速くなければ、終了コードを 1 にします。
+
+   $ python -m atcoder_submit_status.table_benchmark
+   $ python -m atcoder_submit_status.table_benchmark --rows 300000 --users 10 --statuses AC
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from typing import *
+
+from atcoder_submit_status.service import AtCoderService
+from atcoder_submit_status.submission import Status, Submission
+from atcoder_submit_status.table import SubmissionTable
+
+TASKS = [f'{label} - Task {label}' for label in ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'Ex']]
+LANGUAGES = ['C++ (GCC 9.2.1)', 'Python (3.8.2)', 'PyPy3 (7.3.0)', 'Rust (1.42.0)', 'Java (OpenJDK 11.0.6)', 'C# (.NET Core 3.1.201)']
+STATUSES = [Status.AC] * 5 + [Status.WA] * 3 + [Status.TLE, Status.RE, Status.CE, Status.MLE]
+
+
+class Contest:
+   """
+   提出が増えていくコンテストを、乱数で作ります。
+   """
+   def __init__(self, users: int, seed: int = 0):
+      self.random = random.Random(seed)
+      self.users = [f'user{i}' for i in range(users)]
+      self.next_id = 40000000
+      self.time = 1682769600
+
+
+   def submit(self, count: int, judging: int = 0) -> List[Submission]:
+      """
+      新しい提出を count 件作ります。最後の judging 件はジャッジ中にします。
+      """
+      res = []
+      for i in range(count):
+         self.next_id += 1
+         self.time += self.random.randrange(2)
+         status = Status.WJ if i >= count - judging else self.random.choice(STATUSES)
+         exec_time = None if status == Status.WJ else self.random.randrange(1, 2000)
+         res.append(Submission(self.next_id, self.time, self.random.choice(TASKS), self.random.choice(self.users), self.random.choice(LANGUAGES), 100 if status == Status.AC else 0, self.random.randrange(100, 5000), status, '', exec_time, None if exec_time is None else 4000))
+      return res
+
+
+   def judge(self, submission: Submission) -> Submission:
+      return submission._replace(status=self.random.choice(STATUSES), exec_time=self.random.randrange(1, 2000), memory=4000)
+
+
+def measure(rows: int, new: int, updates: int, users: List[str], statuses: List[str], contest_users: int) -> Dict[str, float]:
+   """
+   それぞれの方法の、1 回の更新あたりの絞り込みの時間 (ミリ秒、中央値) を返します。
+   """
+   srv = AtCoderService()
+   contest = Contest(contest_users)
+   submissions = { s.id: s for s in contest.submit(rows, judging=new) }
+   persistent = SubmissionTable(submissions.values())
+   persistent.select(statuses=statuses, users=users)
+
+   names = { user.lower() for user in users }
+   times: Dict[str, List[float]] = { 'loop': [], 'rebuild': [], 'persistent': [] }
+   results = []
+   for _ in range(updates):
+      # 前回ジャッジ中だった提出のジャッジが終わり、新しい提出が増える
+      changed = [contest.judge(s) for s in submissions.values() if s.status == Status.WJ] + contest.submit(new, judging=new // 2)
+      submissions.update((s.id, s) for s in changed)
+
+      started = time.perf_counter()
+      selected = srv.sort_submissions([s for s in submissions.values() if ('' in names or s.user.lower() in names) and srv.match_submission(s, statuses=statuses)])
+      times['loop'].append(time.perf_counter() - started)
+
+      started = time.perf_counter()
+      table = SubmissionTable(submissions.values())
+      rebuilt = table.to_submissions(table.select(statuses=statuses, users=users))
+      times['rebuild'].append(time.perf_counter() - started)
+
+      started = time.perf_counter()
+      persistent.upsert(changed)
+      updated = persistent.to_submissions(persistent.select(statuses=statuses, users=users))
+      times['persistent'].append(time.perf_counter() - started)
+      results.append(selected == rebuilt == updated)
+
+   if not all(results):
+      raise AssertionError('the methods selected different submissions')
+   return { name: 1000 * statistics.median(values) for name, values in times.items() }
+
+
+def main(args: Optional[List[str]] = None) -> None:
+   parser = argparse.ArgumentParser(description='Measure the time to select submissions on each update')
+   parser.add_argument('--rows', metavar='<n>', default=300000, type=int, help='Start with <n> submissions. (default: 300000)')
+   parser.add_argument('--new', metavar='<n>', default=40, type=int, help='Add <n> submissions on each update. (default: 40)')
+   parser.add_argument('--updates', metavar='<n>', default=10, type=int, help='Update <n> times. (default: 10)')
+   parser.add_argument('--contest-users', metavar='<n>', default=10000, type=int, help='Number of users in the contest. (default: 10000)')
+   parser.add_argument('--users', metavar='<n>', default=10, type=int, help='Select <n> users, or all users if <n> is 0. (default: 10)')
+   parser.add_argument('--statuses', default=[], nargs='*', help='Select statuses. (default: all)')
+   parsed = parser.parse_args(args)
+
+   users = [f'user{i}' for i in range(parsed.users)] or ['']
+   times = measure(parsed.rows, parsed.new, max(1, parsed.updates), users, parsed.statuses, parsed.contest_users)
+   for name, ms in times.items():
+      print(f'{name:<10} {ms:8.1f} ms  ({times["loop"] / ms:.1f}x loop)')
+
+   if times['persistent'] >= times['loop']:
+      print('persistent is not faster than loop', file=sys.stderr)
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,220 @@
+import base64
+import hashlib
+import http.client
+import json
+import pathlib
+import threading
+import urllib.parse
+from typing import *
+import requests
+import urllib3
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.cookies import MockRequest, MockResponse
+from urllib3.util.retry import Retry
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = (10.0, 30.0)  # (接続, 読み込み) の秒数
+DEFAULT_RETRIES = 3
+MAX_RETRY_AFTER = 60.0  # サーバが指定した待ち時間 (Retry-After) のうち、再送のために待つ最大の秒数
+
+
+class _Retry(Retry):
+   def get_retry_after(self, response) -> Optional[float]:
+      # 長すぎる Retry-After は待たずに、呼び出し側 (watch の間隔の調整など) に任せる
+      retry_after = super().get_retry_after(response)
+      if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+         return None
+      return retry_after
+
+
+class TunedHTTPAdapter(HTTPAdapter):
+   """
+   接続の数・タイムアウト・再送を調整した HTTPAdapter です。
+
+   接続は pool_size 本まで使い回します (同時に送るリクエストの数以上にします)。
+   timeout を指定しないリクエストには、既定の (接続, 読み込み) のタイムアウトを使います。
+   GET が 429 か 5xx になったときや接続に失敗したときは、retries 回まで、指数的に間隔を延ばしながら送り直します。
+   Retry-After が指定されていれば、それに従います。送り直しても失敗したときは、最後のレスポンスを返します。
+   """
+   def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, timeout: Tuple[float, float] = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES, **kwargs):
+      max_retries = _Retry(total=retries, backoff_factor=1.0, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=['GET', 'HEAD'], respect_retry_after_header=True, raise_on_status=False)
+      super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=max_retries, **kwargs)
+      self.timeout = timeout
+
+
+   def send(self, request: requests.PreparedRequest, timeout=None, **kwargs) -> requests.Response:
+      return super().send(request, timeout=timeout if timeout is not None else self.timeout, **kwargs)
+
+
+class RewriteAdapter(TunedHTTPAdapter):
+   """
+   base_url で始まる URL へのリクエストを、server_url に送ります。
+
+   レスポンスの URL は元の URL のままにするので、Cookie やリダイレクトは元のサイトへのものとして扱われます。
+   ローカルのテスト用サーバ (atcoder_submit_status.fake_server) に接続するために使います。
+   """
+   def __init__(self, base_url: str, server_url: str, **kwargs):
+      super().__init__(**kwargs)
+      self.base_url = base_url.rstrip('/')
+      self.server_url = server_url.rstrip('/')
+
+
+   def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+      rewritten = request.copy()
+      rewritten.url = self.server_url + request.url[len(self.base_url):]
+      response = super().send(rewritten, **kwargs)
+      response.url = request.url
+      response.request = request
+      return response
+
+
+class RecordingAdapter(BaseAdapter):
+   """
+   inner で送ったリクエストのレスポンスを、directory に記録します。
+
+   記録したレスポンスは ReplayAdapter で再生できます。
+   """
+   def __init__(self, directory: pathlib.Path, inner: BaseAdapter):
+      super().__init__()
+      self.directory = directory
+      self.inner = inner
+      self._lock = threading.Lock()
+
+
+   def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+      response = self.inner.send(request, **kwargs)
+      record = {
+         'status': response.status_code,
+         'reason': response.reason,
+         'headers': _get_raw_headers(response),
+         'content': base64.b64encode(response.content).decode('ascii'),
+      }
+      path = _get_record_path(self.directory, request)
+      with self._lock:
+         self.directory.mkdir(parents=True, exist_ok=True)
+         records = json.loads(path.read_text()) if path.exists() else []
+         records.append(record)
+         path.write_text(json.dumps(records))
+      logger.debug(f'record: {request.method} {request.url} -> {path.name}')
+      return response
+
+
+   def close(self) -> None:
+      self.inner.close()
+
+
+class ReplayAdapter(BaseAdapter):
+   """
+   RecordingAdapter で記録したレスポンスを返します。通信はしません。
+
+   同じリクエストを何度も送ったときは、記録した順に返し、最後のものを繰り返します。
+   Set-Cookie は session の Cookie に反映します。
+   """
+   def __init__(self, directory: pathlib.Path, session: requests.Session):
+      super().__init__()
+      self.directory = directory
+      self.session = session
+      self._counts: Dict[str, int] = {}
+      self._lock = threading.Lock()
+
+
+   def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+      path = _get_record_path(self.directory, request)
+      if not path.exists():
+         raise requests.exceptions.ConnectionError(f'no recorded response: {request.method} {request.url}', request=request)
+      with self._lock:
+         records = json.loads(path.read_text())
+         index = min(self._counts.get(path.name, 0), len(records) - 1)
+         self._counts[path.name] = index + 1
+      record = records[index]
+
+      response = requests.Response()
+      response.status_code = record['status']
+      response.reason = record['reason']
+      response.url = request.url
+      response.request = request
+      response._content = base64.b64decode(record['content'])
+      for key, value in record['headers']:
+         # 本文は展開済みのものを記録しているので、転送に関するヘッダは捨てる
+         if key.lower() in ['content-encoding', 'transfer-encoding', 'content-length']:
+            continue
+         if key in response.headers:
+            response.headers[key] += ', ' + value
+         else:
+            response.headers[key] = value
+      response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+
+      message = http.client.HTTPMessage()
+      for key, value in record['headers']:
+         if key.lower() == 'set-cookie':
+            message[key] = value
+      self.session.cookies.extract_cookies(MockResponse(message), MockRequest(request))
+      logger.debug(f'replay: {request.method} {request.url} <- {path.name} [{index}]')
+      return response
+
+
+   def close(self) -> None:
+      pass
+
+
+_RECORD_DIR: Optional[pathlib.Path] = None
+_REPLAY_DIR: Optional[pathlib.Path] = None
+_SERVER_URL: Optional[str] = None
+
+def configure(record: Optional[pathlib.Path] = None, replay: Optional[pathlib.Path] = None, server: Optional[str] = None) -> None:
+   """
+   これから作るセッションの通信の方法を設定します。
+
+   record を指定するとレスポンスを記録し、replay を指定すると記録したレスポンスを再生します。
+   server を指定すると、AtCoder へのリクエストをそのサーバに送ります。
+   """
+   global _RECORD_DIR, _REPLAY_DIR, _SERVER_URL
+   _RECORD_DIR, _REPLAY_DIR, _SERVER_URL = record, replay, server
+
+
+def mount(session: requests.Session, base_url: str = 'https://atcoder.jp', pool_size: int = DEFAULT_POOL_SIZE) -> None:
+   """
+   configure() の設定にしたがって、session にアダプタを取り付けます。
+
+   base_url へのリクエストには TunedHTTPAdapter を使います。pool_size には、同時に送るリクエストの数を渡します。
+   """
+   # 展開できる圧縮の方法 (brotli などがあれば、それも) を明示する
+   session.headers['Accept-Encoding'] = urllib3.util.make_headers(accept_encoding=True)['accept-encoding']
+   if _REPLAY_DIR is not None:
+      logger.info(f'replay responses from: {_REPLAY_DIR}')
+      adapter = ReplayAdapter(_REPLAY_DIR, session)
+      session.mount('https://', adapter)
+      session.mount('http://', adapter)
+      return
+
+   adapter: BaseAdapter
+   if _SERVER_URL is not None:
+      logger.info(f'send requests for {base_url} to: {_SERVER_URL}')
+      adapter = RewriteAdapter(base_url, _SERVER_URL, pool_size=pool_size)
+   else:
+      adapter = TunedHTTPAdapter(pool_size=pool_size)
+   if _RECORD_DIR is not None:
+      logger.info(f'record responses to: {_RECORD_DIR}')
+      adapter = RecordingAdapter(_RECORD_DIR, adapter)
+   session.mount(base_url, adapter)
+
+
+def _get_record_path(directory: pathlib.Path, request: requests.PreparedRequest) -> pathlib.Path:
+   # 同じメソッド・URL・本文のリクエストを同じファイルに記録する
+   body = request.body or b''
+   if isinstance(body, str):
+      body = body.encode()
+   key = hashlib.sha1(request.method.encode() + b' ' + request.url.encode() + b'\n' + body).hexdigest()
+   host = urllib.parse.urlparse(request.url).netloc.replace(':', '_')
+   return directory / f'{host}-{key}.json'
+
+
+def _get_raw_headers(response: requests.Response) -> List[Tuple[str, str]]:
+   # Set-Cookie のように複数回現れるヘッダも、そのまま残す
+   original = getattr(response.raw, '_original_response', None)
+   if original is not None:
+      return list(original.msg.items())
+   return list(response.headers.items())
@@ -1,24 +1,39 @@
 import pathlib
 import contextlib
 import sys
+import threading
+import time
 import appdirs
-import requests
 import datetime
 from logging import getLogger
 from typing import *
-import http
 import atcoder_submit_status.__about__ as version
-import atcoder_submit_status.service as service
 import atcoder_submit_status.utils as utils
+import atcoder_submit_status.profiler as profiler
 from colorama import Fore, Back, Style
 
+if TYPE_CHECKING:
+   import requests
+   import atcoder_submit_status.service as service
+
 logger = getLogger(__name__)
 
 USER_DATA_PATH = pathlib.Path(appdirs.user_data_dir('atcoder-submit-status'))
 DEFAULT_COOKIE_PATH = USER_DATA_PATH / 'cookie.jar'
-def get_cookie_path(service: service.Service):
+def get_cookie_path(service: 'service.Service'):
    return USER_DATA_PATH / service.get_name() / 'cookie.jar'
 
+def get_store_path(service: 'service.Service', contest_round: str):
+   return USER_DATA_PATH / service.get_name() / 'submissions' / f'{contest_round}.sqlite3'
+
+def get_metadata_path(service: 'service.Service', contest_round: str):
+   return USER_DATA_PATH / service.get_name() / 'contests' / f'{contest_round}.json'
+
+def get_login_cache_path(service: 'service.Service'):
+   return USER_DATA_PATH / service.get_name() / 'login.json'
+
+LOGIN_STATUS_MAX_AGE = 600.0  # ログインの確認の結果を使い回す秒数
+
 CHECK = 'CHECK: '
 ADD = 'ADD: '
 NETWORK = 'NETWORK: '
@@ -50,30 +65,44 @@ def convert_timestamp_with_time_zone_to_date(timestamp: str) -> str:
    return date.strftime('%Y-%m-%d %H:%M:%S')
 
 def convert_language_with_version_to_language(lang: str) -> str:
-   return lang[:lang.find(' ')]
+   # "C++ (GCC 9.2.1)" -> "C++" (版のない言語名はそのまま)
+   return lang.partition(' ')[0]
 
 def get_task_id(full_task_name: str) -> str:
-   return full_task_name[:full_task_name.find(' ')]
+   # "A - N-choice question" -> "A" (記号だけのときはそのまま)
+   return full_task_name.partition(' ')[0]
 
 
 @contextlib.contextmanager
-def new_session_with_our_user_agent(cookie_path: pathlib.Path, service: service.Service=None) -> Iterator[requests.Session]:
+def new_session_with_our_user_agent(cookie_path: pathlib.Path, service: 'service.Service'=None, pool_size: Optional[int] = None) -> Iterator['requests.Session']:
+   """
+   セッションを作ります。pool_size には、同時に送るリクエストの数 (--jobs) を渡します。
+   """
+   # requests は読み込みに時間がかかるので、通信するときに読み込む
+   import requests
+   import atcoder_submit_status.transport as transport
    if service is not None:
       cookie_path = get_cookie_path(service)
    session = requests.Session()
    session.headers['User-Agent'] = f'{version.__package_name__}/{version.__version__} (+{version.__url__})'
    logger.debug(f'User-Agent: {session.headers["User-Agent"]}')
+   transport.mount(session, pool_size=pool_size or transport.DEFAULT_POOL_SIZE)
+   session.hooks['response'].append(profiler.get_profiler().on_response)
    try:
       with utils.with_cookiejar(session, path=cookie_path) as session:
          yield session
    except Exception as e:
-      logger.info(utils.HINT + f'You can delete the broken cookie.jar file: {str(cookie_path)}')
+      from atcoder_submit_status.service import ServiceError
+      # 通信の失敗は Cookie のせいではない
+      if not isinstance(e, ServiceError):
+         logger.info(utils.HINT + f'You can delete the broken cookie.jar file: {str(cookie_path)}')
       raise
 
-def service_from_url(url: str) -> service.Service:
+def service_from_url(url: str) -> 'service.Service':
    """
    コンテストURLからサービスを取得します。
    """
+   import atcoder_submit_status.service as service
    if 'atcoder' in url:
       return service.AtCoderService()
    else:
@@ -81,16 +110,49 @@ def service_from_url(url: str) -> service.Service:
       return None
 
 _DEFAULT_SESSION = None
-def get_default_session() -> requests.Session:
+def get_default_session() -> 'requests.Session':
     global _DEFAULT_SESSION
     if _DEFAULT_SESSION is None:
+        import requests
+        import atcoder_submit_status.transport as transport
         _DEFAULT_SESSION = requests.session()
+        transport.mount(_DEFAULT_SESSION)
+        _DEFAULT_SESSION.hooks['response'].append(profiler.get_profiler().on_response)
     return _DEFAULT_SESSION
 
+class RateLimiter:
+   """
+   リクエストの間隔を 1 / requests_per_second 秒以上に保ちます。
+
+   複数のスレッドで共有することができます。
+   """
+   def __init__(self, requests_per_second: float):
+      self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+      self._lock = threading.Lock()
+      self._next = 0.0
+
+   def wait(self) -> None:
+      with self._lock:
+         now = time.monotonic()
+         delay = self._next - now
+         self._next = max(now, self._next) + self.interval
+      if delay > 0:
+         with profiler.get_profiler().phase('sleep'):
+            time.sleep(delay)
+
+DEFAULT_REQUESTS_PER_SECOND = 4.0
+_DEFAULT_RATE_LIMITER = None
+def get_default_rate_limiter() -> RateLimiter:
+   global _DEFAULT_RATE_LIMITER
+   if _DEFAULT_RATE_LIMITER is None:
+      _DEFAULT_RATE_LIMITER = RateLimiter(DEFAULT_REQUESTS_PER_SECOND)
+   return _DEFAULT_RATE_LIMITER
+
 @contextlib.contextmanager
-def with_cookiejar(session: requests.Session, *, path: pathlib.Path=DEFAULT_COOKIE_PATH) -> Iterator[requests.Session]:
+def with_cookiejar(session: 'requests.Session', *, path: pathlib.Path=DEFAULT_COOKIE_PATH) -> Iterator['requests.Session']:
    """Cookieを利用したセッション
    """
+   import http.cookiejar
    session.cookies = http.cookiejar.LWPCookieJar(str(path))  # type: ignore
    if path.exists():
       logger.info('load cookie from: %s', path)
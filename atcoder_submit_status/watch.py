@@ -1,17 +1,26 @@
 import argparse
-from copy import deepcopy
-import sys
+import contextlib
+import os
 import sys
 import time
-from typing import Optional
+from typing import *
 import requests
 from logging import getLogger
 from colorama import Fore, Back, Style, Cursor
 from rich.console import Console
+from rich.console import Group
 from rich.live import Live
+from rich.table import Table
 
 import atcoder_submit_status.utils as utils
+import atcoder_submit_status.profiler as profiler
 import atcoder_submit_status.service as service
+import atcoder_submit_status.daemon as daemon
+import atcoder_submit_status.events as events
+from atcoder_submit_status.crawler import SubmissionCrawler
+from atcoder_submit_status.scheduler import PollScheduler, wait_for_next_poll
+from atcoder_submit_status.store import SubmissionStore
+from atcoder_submit_status.submission import Submission
 
 logger = getLogger(__name__)
 
@@ -21,48 +30,210 @@ def add_subparser(subparsers: argparse.Action) -> None:
 Supported Services:
   √ AtCoder
 ''')
-   subparser.add_argument('url', help='Contest URL (or AtCoder contest name)')
+   subparser.add_argument('urls', metavar='url', nargs='+', help='Contest URL (or AtCoder contest name)\nGive several contests to watch them together.')
    subparser.add_argument('--no-color', action='store_true', help='Turn off color')
    subparser.add_argument('--tasks', metavar='<task-name>', default=[], nargs='*', help='Select tasks.\n(e.g. a b d ex)')
    subparser.add_argument('--languages', metavar='<lang>', default=[], nargs='*', help='Select languages.\n(e.g. C++ C#)')
-   subparser.add_argument('--statuses', default=[], nargs='*', choices=['AC', 'CE', 'MLE', 'TLE', 'RE', 'OLE', 'IE', 'WA', 'WJ', 'WR'], help='Select statuses.\n(e.g. WA TLE)')
+   subparser.add_argument('--statuses', default=[], nargs='*', choices=['AC', 'CE', 'MLE', 'TLE', 'RE', 'OLE', 'IE', 'WA', 'QLE', 'WJ', 'WR'], help='Select statuses.\n(e.g. WA TLE)')
    subparser.add_argument('-u', '--users', metavar='<user-name>', default=[], nargs='*', help='Select users.')
    subparser.add_argument('--info-level', default='NORMAL', choices=['MINIMAL', 'NORMAL', 'DETAILS'], help='Select output information level.')
    subparser.add_argument('-r', '--reverse', action='store_true', help='Reverse submissions')
-   subparser.add_argument('-t', '--tail', metavar='<n-lines>', default=sys.maxsize, type=int, help='Print the last <n-lines> submissions.')
+   subparser.add_argument('-t', '--tail', metavar='<n-lines>', default=sys.maxsize, type=int, help='Print the last <n-lines> submissions.\n(Only the newest pages needed for them are fetched.)')
+   subparser.add_argument('-j', '--jobs', metavar='<n>', default=4, type=int, help='Send up to <n> requests at the same time. (default: 4)')
+   subparser.add_argument('--rate-limit', metavar='<n>', default=utils.DEFAULT_REQUESTS_PER_SECOND, type=float, help=f'Send at most <n> requests per second. (default: {utils.DEFAULT_REQUESTS_PER_SECOND})')
+   subparser.add_argument('--min-interval', metavar='<sec>', default=1.0, type=float, help='Update every <sec> seconds while submissions are being judged. (default: 1)')
+   subparser.add_argument('--max-interval', metavar='<sec>', default=60.0, type=float, help='Update at least every <sec> seconds when nothing changes. (default: 60)')
+   subparser.add_argument('--events', metavar='<dest>', help='Write events (submission_added, status_changed, judging_finished)\nas JSON lines instead of drawing a table.\n<dest> is `-` (stdout), a file (appended), an http(s):// webhook\n(POST each event) or unix:<path> (a Unix domain socket).')
+   subparser.add_argument('--include-existing', action='store_true', help='With --events, also write submission_added for the submissions\nthat exist when watch starts.')
+   daemon.add_client_argument(subparser)
+
+
+class _Contest:
+   """
+   watch で表示するコンテスト 1 つ分の状態です。
+
+   デーモンから提出を受け取るときは、crawler と scheduler の代わりに client を持ちます。
+   """
+   def __init__(self, url: str, crawler: Optional[SubmissionCrawler] = None, scheduler: Optional[PollScheduler] = None, client: Optional[daemon.DaemonClient] = None):
+      self.url = url
+      self.crawler = crawler
+      self.scheduler = scheduler
+      self.client = client
+      self.version: Optional[int] = None  # デーモンから受け取った提出の版
+      self.caption = ''  # デーモンから受け取った、次の更新時刻の説明
+      self.submissions: List[Submission] = []
+      self.table: Optional[Table] = None
+      self.rows: Optional[List[Submission]] = None  # table に表示している提出
+      self.cache: Dict[int, Tuple[Submission, List[Any]]] = {}  # 提出 ID ごとの表の行
+      self.detector: Optional[events.EventDetector] = None  # --events のときの、提出の変化の検出
+
+
+def _fetch(args: argparse.Namespace, srv: service.Service, contest: _Contest) -> None:
+   if contest.client is not None:
+      _fetch_from_daemon(args, contest)
+      return
+
+   # 変化があった直後やジャッジ中の提出があるときは間隔を詰め、変化がなければ間隔を延ばす
+   try:
+      with profiler.get_profiler().phase('fetch'):
+         res = contest.crawler.update()
+   except service.ServiceUnavailableError as e:
+      logger.warning(e)
+      contest.scheduler.on_error(e.retry_after)
+      return
+   contest.scheduler.on_update(changed=res != contest.submissions, judging=any(srv.is_judging(s) for s in res))
+   contest.submissions = res
+
+
+def _fetch_from_daemon(args: argparse.Namespace, contest: _Contest) -> None:
+   # 更新の間隔はデーモンが決めるので、ここでは変化があったときだけ提出を受け取る
+   try:
+      with profiler.get_profiler().phase('fetch'):
+         contest.version, res, contest.caption = contest.client.get_submissions(contest.url, tasks=args.tasks, languages=args.languages, statuses=args.statuses, users=args.users, version=contest.version)
+   except service.ServiceError as e:
+      logger.warning(e)
+      return
+   if res is not None:
+      contest.submissions = res
+
+
+def _render(args: argparse.Namespace, srv: service.Service, contests: List[_Contest]) -> bool:
+   """
+   表示する提出が変化したコンテストの表だけを作り直し、表示に変化があったかを返します。
+   """
+   changed = False
+   for contest in contests:
+      rows = contest.submissions[-args.tail:]
+      if args.reverse:
+         rows = rows[::-1]
+      if contest.table is None or rows != contest.rows:
+         contest.table = srv.make_drawable_submissions(srv.minimize_submissions_info(rows, args.info_level), args.no_color, cache=contest.cache)
+         contest.rows = rows
+         if len(contests) >= 2:
+            contest.table.title = srv.get_round(contest.url)
+         changed = True
+      caption = contest.scheduler.describe() if contest.scheduler is not None else contest.caption
+      if contest.table.caption != caption:
+         contest.table.caption = caption
+         changed = True
+   return changed
+
+
+def _layout(contests: List[_Contest]):
+   if len(contests) == 1:
+      return contests[0].table
+   return Group(*[contest.table for contest in contests])
 
 
-def _fetch(args: argparse.Namespace, srv: service.Service, session: Optional[requests.Session] = None):
-   session = session or utils.get_default_session()
-   submissions = srv.fetch_submissions(args.url, tasks=args.tasks, languages=args.languages, statuses=args.statuses, users=args.users, session=session)
-   if args.info_level != 'DETAILS':
-      submissions = srv.minimize_submissions_info(submissions, args.info_level)
-   return submissions
+def _loop(args: argparse.Namespace, srv: service.Service, contests: List[_Contest], live: Live, wait: Callable[[], None]) -> None:
+   stats = profiler.get_profiler().get_stats()
+   while True:
+      fetched = False
+      for contest in contests:
+         if contest.scheduler is None or contest.scheduler.is_due():
+            _fetch(args, srv=srv, contest=contest)
+            fetched = True
+      if _render(args, srv, contests):
+         live.update(_layout(contests))
+      if args.profile and fetched:
+         # 表示の上に、この回の計測結果を出す
+         live.console.print(profiler.format_stats(profiler.get_profiler().get_stats(since=stats)), markup=False, highlight=False)
+         stats = profiler.get_profiler().get_stats()
+      with profiler.get_profiler().phase('idle'):
+         wait()
+
+
+def _emit_loop(args: argparse.Namespace, srv: service.Service, contests: List[_Contest], sink, wait: Callable[[], None]) -> None:
+   # 表を描く代わりに、取得した提出の変化をイベントとして書き出す
+   for contest in contests:
+      contest.detector = events.EventDetector(srv, srv.get_round(contest.url), include_existing=args.include_existing)
+   stats = profiler.get_profiler().get_stats()
+   while True:
+      fetched = False
+      for contest in contests:
+         if contest.scheduler is None or contest.scheduler.is_due():
+            _fetch(args, srv=srv, contest=contest)
+            sink.write(contest.detector.detect(contest.submissions))
+            fetched = True
+      if args.profile and fetched:
+         print(profiler.format_stats(profiler.get_profiler().get_stats(since=stats)), file=sys.stderr)
+         stats = profiler.get_profiler().get_stats()
+      with profiler.get_profiler().phase('idle'):
+         wait()
+
+
+def _watch(args: argparse.Namespace, srv: service.Service, contests: List[_Contest], wait: Callable[[], None]) -> None:
+   if args.events is None:
+      with Live(refresh_per_second=1) as live:
+         _loop(args, srv, contests, live, wait)
+      return
+
+   sink = events.open_sink(args.events)
+   try:
+      _emit_loop(args, srv, contests, sink, wait)
+   except BrokenPipeError:
+      # `acss watch abc300 --events - | head` などで出力先が閉じられたときは、監視をやめて終了する
+      os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+   finally:
+      sink.close()
 
 
 def run(args: argparse.Namespace) -> bool:
    logger.debug(f'users: {args.users}')
-   srv = utils.service_from_url(args.url)
+   srv = utils.service_from_url(args.urls[0])
 
    if srv is None:
       logger.info('we predict that the service you use is AtCoder.')
       srv = service.AtCoderService()
 
-   with utils.new_session_with_our_user_agent(args.cookie, service=srv) as session:
+   # デーモンを使うときは、デーモンが更新した提出を min_interval 秒ごとに問い合わせる
+   if args.daemon is not None:
+      client = daemon.DaemonClient(args.daemon)
+      contests = [_Contest(url, client=client) for url in dict.fromkeys(args.urls)]
+      try:
+         _watch(args, srv, contests, wait=lambda: time.sleep(args.min_interval))
+      except daemon.DaemonError as e:
+         logger.error(e)
+         logger.info(utils.HINT + 'You can start the daemon with this command: `acss daemon`')
+         return False
+      except KeyboardInterrupt:
+         sys.exit(0)
+      return True
+
+   with utils.new_session_with_our_user_agent(args.cookie, service=srv, pool_size=args.jobs) as session:
       logger.debug('start session')
-      if not srv.is_logged_in(session):
+      if not srv.is_logged_in(session, max_age=utils.LOGIN_STATUS_MAX_AGE):
          logger.info(utils.FAILURE + 'You are not signed in.')
          logger.info(utils.HINT + f'You can try to enter this command: `acss login {srv.get_name()}`')
          return False
 
-      submissions = []
+      # 問題と言語の指定は、どのコンテストにもないときだけ誤りとする (ABC と ARC をまとめて見るときの Ex など)
+      errors = []
+      for url in dict.fromkeys(args.urls):
+         try:
+            srv.get_contest_metadata(url, session=session).check_filters(tasks=args.tasks, languages=args.languages)
+         except ValueError as e:
+            errors.append(e)
+      if errors and len(errors) == len(dict.fromkeys(args.urls)):
+         logger.error(errors[0])
+         return False
+      for e in errors:
+         logger.warning(e)
+
+      # すべてのコンテストで 1 つのセッションとリクエストの頻度の制限を共有する
+      # 2 回目以降は、新しい提出とジャッジ中の提出のあるページだけを取得する
+      rate_limiter = utils.RateLimiter(args.rate_limit)
+      # --tail を指定したときは、表示する最新の提出が載っているページだけを取得する
+      tail = None if args.tail == sys.maxsize else max(0, args.tail)
       try:
-         with Live(refresh_per_second=1) as live:
-            while True:
-               submissions = srv.make_drawable_submissions(_fetch(args, srv=srv, session=session)[-args.tail:], args.no_color)
-               if args.reverse:
-                  submissions.reverse()
-               live.update(submissions)
-               time.sleep(1)
+         with contextlib.ExitStack() as stack:
+            contests = []
+            for url in dict.fromkeys(args.urls):
+               store = stack.enter_context(SubmissionStore(utils.get_store_path(srv, srv.get_round(url))))
+               crawler = SubmissionCrawler(srv, url, tasks=args.tasks, languages=args.languages, statuses=args.statuses, users=args.users, session=session, store=store, jobs=args.jobs, rate_limiter=rate_limiter, tail=tail)
+               contests.append(_Contest(url, crawler, PollScheduler(args.min_interval, args.max_interval, *crawler.get_contest_window())))
+
+            _watch(args, srv, contests, wait=lambda: wait_for_next_poll([contest.scheduler for contest in contests]))
       except KeyboardInterrupt:
          sys.exit(0)
+   return True
@@ -0,0 +1,227 @@
+import contextlib
+import csv
+import datetime
+import gzip
+import io
+import itertools
+import json
+import pathlib
+import sys
+from typing import *
+from logging import getLogger
+import atcoder_submit_status.profiler as profiler
+
+logger = getLogger(__name__)
+
+FORMATS = ['csv', 'jsonl', 'parquet']
+COMPRESSIONS = ['gzip', 'zstd']
+BATCH_SIZE = 10000  # 一度にまとめて書き込む行数
+
+
+class WriterError(Exception):
+   """
+   出力の形式や圧縮の方法に必要なライブラリがないために、書き込めないことを表します。
+   """
+
+
+class SubmissionWriter:
+   """
+   提出を区切り文字で区切った形式 (CSV, TSV など) で書き込みます。
+
+   区切り文字が 1 文字のときは csv モジュールで書き込み、区切り文字や改行を含む値を引用符で囲みます。
+   書き込んだ行は file のバッファにたまるので、すぐに出力したいときは flush() を呼び出します。
+   """
+   def __init__(self, file: TextIO, separator: str = ','):
+      self.file = file
+      self.separator = separator
+      self._writer = csv.writer(file, delimiter=separator, lineterminator='\n') if len(separator) == 1 else None
+
+
+   @profiler.profiled('write')
+   def write_rows(self, rows: Iterable[Mapping[str, str]]) -> None:
+      if self._writer is not None:
+         self._writer.writerows(row.values() for row in rows)
+      else:
+         self.file.writelines(self.separator.join(row.values()) + '\n' for row in rows)
+
+
+   def flush(self) -> None:
+      self.file.flush()
+
+
+   def close(self) -> None:
+      pass
+
+
+class JsonLinesWriter:
+   """
+   提出を 1 行に 1 つの JSON オブジェクトとして書き込みます。
+
+   行は型の付いた値 (AtCoderService.get_typed_columns() を参照) を持つものを渡します。提出時刻は ISO 8601 の文字列にします。
+   """
+   def __init__(self, file: TextIO):
+      self.file = file
+
+
+   @profiler.profiled('write')
+   def write_rows(self, rows: Iterable[Mapping[str, Any]]) -> None:
+      for batch in _batches(rows, BATCH_SIZE):
+         self.file.write(''.join(json.dumps(dict(row), ensure_ascii=False, default=_to_json) + '\n' for row in batch))
+
+
+   def flush(self) -> None:
+      self.file.flush()
+
+
+   def close(self) -> None:
+      pass
+
+
+class ParquetWriter:
+   """
+   提出を Parquet 形式で書き込みます。pyarrow が必要です。
+
+   行は型の付いた値を持つものを渡します。write_rows() で渡した行は、BATCH_SIZE 行ずつ行グループとして書き込みます。
+   最後に close() を呼び出すと、ファイルを完成させます。
+   行を 1 つも書き込まなかったときは、columns の列を持つ空の表を書き込むので、どの場合も読み込めるファイルになります。
+   そのときの提出時刻のタイムゾーンは time_zone にします。
+   """
+   def __init__(self, file: BinaryIO, compression: Optional[str] = None, columns: Sequence[str] = (), time_zone: Optional[datetime.tzinfo] = None):
+      try:
+         import pyarrow
+         import pyarrow.parquet
+      except ImportError as e:
+         raise WriterError('pyarrow is required to write parquet: pip install pyarrow') from e
+      self._pyarrow = pyarrow
+      self.file = file
+      self.compression = compression or 'snappy'
+      self.columns = list(columns)
+      self.time_zone = time_zone
+      self._writer = None
+
+
+   @profiler.profiled('write')
+   def write_rows(self, rows: Iterable[Mapping[str, Any]]) -> None:
+      pyarrow = self._pyarrow
+      for batch in _batches(rows, BATCH_SIZE):
+         columns = { key: [row[key] for row in batch] for key in batch[0] }
+         if self._writer is None:
+            schema = pyarrow.schema([(key, _get_arrow_type(pyarrow, key, values)) for key, values in columns.items()])
+            self._writer = pyarrow.parquet.ParquetWriter(self.file, schema, compression=self.compression)
+         self._writer.write_table(pyarrow.Table.from_pydict(columns, schema=self._writer.schema))
+
+
+   def flush(self) -> None:
+      pass
+
+
+   def close(self) -> None:
+      pyarrow = self._pyarrow
+      if self._writer is None:
+         schema = pyarrow.schema([(key, _get_arrow_type(pyarrow, key, [], self.time_zone)) for key in self.columns])
+         self._writer = pyarrow.parquet.ParquetWriter(self.file, schema, compression=self.compression)
+         self._writer.write_table(schema.empty_table())
+      self._writer.close()
+
+
+def get_compression(path: Optional[pathlib.Path], compression: Optional[str]) -> Optional[str]:
+   """
+   圧縮の方法を返します。指定がないときは、出力先の拡張子 (.gz, .zst) から決めます。
+   """
+   if compression is not None or path is None:
+      return compression
+   return { '.gz': 'gzip', '.zst': 'zstd' }.get(path.suffix)
+
+
+@contextlib.contextmanager
+def open_output(path: Optional[pathlib.Path], binary: bool = False, compression: Optional[str] = None, encoding: str = 'utf-8') -> Iterator[IO]:
+   """
+   出力先 (path が None のときは標準出力) を開きます。compression を指定すると、gzip か zstd で圧縮して書き込みます。
+
+   binary が False のときはテキストとして、True のときはバイト列として書き込むファイルを返します。
+   圧縮に必要なライブラリがないときは、出力先を開く前に WriterError を送出します。
+   """
+   if path is None and compression is None and not binary:
+      yield sys.stdout
+      return
+
+   if compression == 'zstd':
+      try:
+         import zstandard
+      except ImportError as e:
+         raise WriterError('zstandard is required to compress with zstd: pip install zstandard') from e
+
+   with contextlib.ExitStack() as stack:
+      if path is None:
+         sys.stdout.flush()
+         raw = sys.stdout.buffer
+      else:
+         raw = stack.enter_context(open(str(path), mode='wb'))
+      stream = raw
+      if compression == 'gzip':
+         stream = stack.enter_context(gzip.GzipFile(fileobj=raw, mode='wb'))
+      elif compression == 'zstd':
+         stream = stack.enter_context(zstandard.ZstdCompressor().stream_writer(raw, closefd=False))
+
+      if binary:
+         yield stream
+      else:
+         file = io.TextIOWrapper(stream, encoding=encoding, newline='')
+         try:
+            yield file
+         finally:
+            # 下のストリームは ExitStack で閉じるので、切り離しておく
+            file.flush()
+            file.detach()
+   if path is None:
+      sys.stdout.buffer.flush()
+
+
+def new_writer(format: str, file: IO, separator: str = ',', compression: Optional[str] = None, columns: Sequence[str] = (), time_zone: Optional[datetime.tzinfo] = None):
+   """
+   出力形式 (csv, jsonl, parquet) に応じた書き込み用のオブジェクトを返します。
+
+   parquet のときは、compression をファイルの中の圧縮の方法として使い、columns と time_zone を提出がないときの列にします。
+   pyarrow がないときは WriterError を送出します。
+   """
+   if format == 'jsonl':
+      return JsonLinesWriter(file)
+   if format == 'parquet':
+      return ParquetWriter(file, compression, columns=columns, time_zone=time_zone)
+   return SubmissionWriter(file, separator)
+
+
+def _batches(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+   iterator = iter(rows)
+   while True:
+      batch = list(itertools.islice(iterator, size))
+      if not batch:
+         return
+      yield batch
+
+
+def _to_json(value: Any) -> Any:
+   if isinstance(value, datetime.datetime):
+      return value.isoformat()
+   raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _get_arrow_type(pyarrow, key: str, values: List[Any], time_zone: Optional[datetime.tzinfo] = None):
+   # 値がすべて None の列も型が決まるように、列名から型を決める
+   if key == 'submission_time':
+      tz = next((value.tzinfo for value in values if value is not None), time_zone)
+      return pyarrow.timestamp('s', tz=_get_tz_name(tz))
+   if key in ['score', 'code_size', 'exec_time', 'memory']:
+      return pyarrow.int64()
+   return pyarrow.string()
+
+
+def _get_tz_name(tz: Optional[datetime.tzinfo]) -> Optional[str]:
+   # pyarrow は "+09:00" のような UTC からの差のタイムゾーンを受け付ける
+   if tz is None:
+      return None
+   offset = tz.utcoffset(None)
+   if offset is None:
+      return None
+   minutes = int(offset.total_seconds()) // 60
+   return '{}{:02}:{:02}'.format('+' if minutes >= 0 else '-', abs(minutes) // 60, abs(minutes) % 60)
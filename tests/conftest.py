@@ -0,0 +1,89 @@
+import contextlib
+import threading
+from typing import *
+
+import pytest
+
+import atcoder_submit_status.transport as transport
+import atcoder_submit_status.utils as utils
+from atcoder_submit_status.fake_server import FakeAtCoder, _Server
+from atcoder_submit_status.service import AtCoderService
+
+if TYPE_CHECKING:
+   import requests
+
+
+@pytest.fixture
+def data_path(tmp_path, monkeypatch):
+   """
+   Cookie や提出の保存先を、テストごとの一時ディレクトリにします。
+   """
+   path = tmp_path / 'data'
+   monkeypatch.setattr(utils, 'USER_DATA_PATH', path)
+   monkeypatch.setattr(utils, 'DEFAULT_COOKIE_PATH', path / 'cookie.jar')
+   return path
+
+
+@pytest.fixture
+def start_fake(data_path, monkeypatch):
+   """
+   fake_server の AtCoder をスレッドで起動し、これから作るセッションのリクエストをそこに送ります。
+
+   start_fake(**kwargs) は FakeAtCoder(**kwargs) を起動して返します。
+   手元のサーバなので、rate_limiter を渡さないクローラのリクエストの間隔は空けません。
+   """
+   monkeypatch.setattr(utils, '_DEFAULT_RATE_LIMITER', utils.RateLimiter(0))
+   servers = []
+
+   def start(**kwargs) -> FakeAtCoder:
+      fake = FakeAtCoder(**kwargs)
+      server = _Server(('127.0.0.1', 0), fake)
+      threading.Thread(target=server.serve_forever, kwargs={ 'poll_interval': 0.05 }, daemon=True).start()
+      servers.append(server)
+      transport.configure(server=f'http://127.0.0.1:{server.server_address[1]}')
+      return fake
+
+   yield start
+   transport.configure()
+   for server in servers:
+      server.shutdown()
+      server.server_close()
+
+
+class Requests:
+   """
+   セッションが受け取ったレスポンスの URL を記録します。
+   """
+   def __init__(self):
+      self.urls: List[str] = []
+
+
+   def __call__(self, response, *args, **kwargs):
+      self.urls.append(response.url)
+
+
+   def take(self) -> List[str]:
+      urls, self.urls = self.urls, []
+      return urls
+
+
+@pytest.fixture
+def new_session(start_fake):
+   """
+   new_session() は、alice でログインしたセッションを返します (start_fake() の後に呼び出します)。
+
+   session.requests で、送ったリクエストの URL を数えられます。
+   """
+   with contextlib.ExitStack() as stack:
+      def new() -> 'requests.Session':
+         srv = AtCoderService()
+         session = stack.enter_context(utils.new_session_with_our_user_agent(utils.DEFAULT_COOKIE_PATH, service=srv))
+         srv.login('alice', 'password', session=session)
+         # acss login と同じように、Cookie のファイルにも保存しておく
+         utils.get_cookie_path(srv).parent.mkdir(parents=True, exist_ok=True)
+         session.cookies.save(ignore_discard=True)
+         session.requests = Requests()
+         session.hooks['response'].append(session.requests)
+         return session
+
+      yield new
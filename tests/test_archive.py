@@ -0,0 +1,29 @@
+import pytest
+
+from atcoder_submit_status.archive import parse_contests
+from atcoder_submit_status.service import AtCoderService
+
+
+@pytest.mark.parametrize('specs, contests', [
+   (['abc300'], ['abc300']),
+   (['https://atcoder.jp/contests/arc150/submissions'], ['arc150']),
+   (['abc298..abc300'], ['abc298', 'abc299', 'abc300']),
+   (['abc298..300'], ['abc298', 'abc299', 'abc300']),
+   # 番号の桁数は、始まりのコンテスト名に揃える
+   (['abc008..abc010'], ['abc008', 'abc009', 'abc010']),
+   (['abc300..abc300'], ['abc300']),
+   # 同じコンテストは 1 回だけ、最初に現れた順に並べる
+   (['abc300', 'abc299..abc301', 'abc299'], ['abc300', 'abc299', 'abc301']),
+])
+def test_parse_contests(specs, contests):
+   assert parse_contests(specs, AtCoderService()) == contests
+
+
+@pytest.mark.parametrize('spec, message', [
+   ('abc300..arc300', 'invalid range'),
+   ('abc..abc300', 'invalid range'),
+   ('abc300..abc298', 'empty range'),
+])
+def test_parse_contests_rejects_bad_ranges(spec, message):
+   with pytest.raises(ValueError, match=message):
+      parse_contests([spec], AtCoderService())
@@ -0,0 +1,190 @@
+import threading
+import time
+import urllib.parse
+
+import pytest
+
+from atcoder_submit_status.crawler import SubmissionCrawler
+from atcoder_submit_status.service import AtCoderService
+from atcoder_submit_status.store import SubmissionStore
+from atcoder_submit_status.submission import Status, Submission
+
+
+class _Service(AtCoderService):
+   def get_contest_metadata(self, url, session=None):
+      return None
+
+
+   def get_submissions_url(self, url, params={}, session=None):
+      raise AssertionError('a stopped crawler must not send requests')
+
+
+def test_stop_before_update():
+   crawler = SubmissionCrawler(_Service(), 'abc300', users=[''])
+   crawler.stop()
+   with pytest.raises(RuntimeError):
+      crawler.update()
+
+
+def _get_pages(urls):
+   # 取得した提出一覧のページの番号 (ユーザで絞り込んだ一覧は (ユーザ, 番号)、提出一覧以外のページは URL のまま)
+   res = []
+   for url in urls:
+      parsed = urllib.parse.urlparse(url)
+      query = dict(urllib.parse.parse_qsl(parsed.query))
+      if not parsed.path.endswith('/submissions'):
+         res.append(url)
+      else:
+         res.append((query['f.User'], int(query['page'])) if query.get('f.User') else int(query['page']))
+   return res
+
+
+def _get_ids(fake, **kwargs):
+   return sorted(s['id'] for s in fake.get_submissions() if all(s[key] == value for key, value in kwargs.items()))
+
+
+def test_fetch_and_settle(start_fake, new_session, data_path):
+   fake = start_fake(submissions=95, finished=True)
+   session = new_session()
+   srv = AtCoderService()
+   with SubmissionStore(data_path / 'abc300.sqlite') as store:
+      def update():
+         return SubmissionCrawler(srv, 'abc300', users=[''], session=session, store=store, refresh=False).update()
+
+      # 初回は、すべてのページを 1 回ずつ取得する
+      rows = update()
+      assert [s.id for s in rows] == _get_ids(fake)
+      assert _get_pages(session.requests.take()) == [1, 2, 3, 4, 5]
+
+      # 終わったコンテストは、開催期間を確かめた後は取得し直さない
+      assert update() == rows
+      assert session.requests.take() == ['https://atcoder.jp/contests/abc300']
+      assert update() == rows
+      assert session.requests.take() == []
+
+
+def test_refetch_judging_pages(start_fake, new_session, data_path):
+   fake = start_fake(submissions=55)
+   session = new_session()
+   # 最も古いページ (3 ページ目) の提出をジャッジ中にする
+   for s in fake._submissions[:3]:
+      s['born'] = time.time()
+   with SubmissionStore(data_path / 'abc300.sqlite') as store:
+      crawler = SubmissionCrawler(AtCoderService(), 'abc300', users=[''], session=session, store=store)
+      rows = crawler.update()
+      assert [s.id for s in rows if s.status == Status.WJ] == [40000000, 40000001, 40000002]
+      assert _get_pages(session.requests.take()) == [1, 2, 3]
+
+      # 新しい提出がなければ、1 ページ目と、ジャッジ中の提出が載っているページだけを取得する
+      for s in fake._submissions[:3]:
+         s['born'] = 0.0
+      rows = crawler.update()
+      assert [s.id for s in rows] == _get_ids(fake)
+      assert not any(AtCoderService().is_judging(s) for s in rows)
+      assert [s.status.value for s in rows[:3]] == [s['status'] for s in fake._submissions[:3]]
+      assert _get_pages(session.requests.take()) == [1, 3]
+
+      # 保存したものも、ジャッジが終わった状態になっている
+      submissions, low, complete, _ = store.load_listing(crawler._listings[0].key)
+      assert sorted(submissions.values()) == rows
+      assert (low, complete) == (40000000, True)
+
+
+def test_store_upsert_and_load(tmp_path):
+   submissions = [Submission(40000000 + i, 1682769600 + i, 'A - Apple', 'user1', 'Python (3.8.2)', None, 100, Status.WJ, '', None, None) for i in range(3)]
+   with SubmissionStore(tmp_path / 'abc300.sqlite') as store:
+      assert store.load_listing('?f.User=') == ({}, None, False, 0.0)
+      store.save_listing('?f.User=', submissions, 40000000, False, 100.0)
+      judged = submissions[1]._replace(score=100, status=Status.AC, exec_time=12, memory=3604)
+      store.save_listing('?f.User=', [judged], 40000000, True, 200.0)
+
+   # 同じ提出 ID の提出は置き換え、ファイルを開き直しても読み込める
+   with SubmissionStore(tmp_path / 'abc300.sqlite') as store:
+      assert store.load_listing('?f.User=') == ({ 40000000: submissions[0], 40000001: judged, 40000002: submissions[2] }, 40000000, True, 200.0)
+      assert store.load_listing('?f.User=user1') == ({}, None, False, 0.0)
+
+
+@pytest.mark.parametrize('submissions, users, listings, pages', [
+   # 少ないユーザは、ユーザごとの一覧の方がリクエストが少ない
+   (200, ['user1', 'user2'], ['?f.User=user1', '?f.User=user2'], [1, ('user1', 1), ('user2', 1)]),
+   # 多くのユーザは、ユーザごとの 1 ページ目から見積もって、絞り込まない一覧を取得する
+   (200, [f'user{i}' for i in range(9)], ['?f.User='], [1] + [(f'user{i}', 1) for i in range(9)] + list(range(2, 12))),
+   # 絞り込まない一覧がユーザの数より少ないページで済むときは、ユーザごとの一覧を見積もらない
+   (30, [f'user{i}' for i in range(9)], ['?f.User='], [1, 2]),
+])
+def test_plan(start_fake, new_session, data_path, submissions, users, listings, pages):
+   fake = start_fake(submissions=submissions, finished=True)
+   session = new_session()
+   with SubmissionStore(data_path / 'abc300.sqlite') as store:
+      crawler = SubmissionCrawler(AtCoderService(), 'abc300', users=users, session=session, store=store, refresh=False)
+      rows = crawler.update()
+      assert [listing.key for listing in crawler._listings] == listings
+      assert [s.id for s in rows] == sorted(s['id'] for s in fake.get_submissions() if s['user'] in users)
+      assert _get_pages(session.requests.take()) == pages
+
+      # 次は、保存した一覧をそのまま使う
+      crawler = SubmissionCrawler(AtCoderService(), 'abc300', users=users, session=session, store=store, refresh=False)
+      assert crawler.update() == rows
+      assert session.requests.take() == ['https://atcoder.jp/contests/abc300']
+
+
+def test_fetch_pages_in_parallel(start_fake, new_session, data_path):
+   fake = start_fake(submissions=210, finished=True)
+   session = new_session()
+
+   # 同時に処理しているリクエストの数を数え、途中で新しい提出を 3 件増やす
+   get_submissions = fake.get_submissions
+   lock = threading.Lock()
+   running = []
+   calls = []
+   def get_submissions_slowly():
+      with lock:
+         running.append(None)
+         calls.append(len(running))
+         if len(calls) == 5:
+            for _ in range(3):
+               fake._submissions.append(fake._make(len(fake._submissions), fake.contest_end, born=0.0))
+      time.sleep(0.05)
+      with lock:
+         running.pop()
+      return get_submissions()
+   fake.get_submissions = get_submissions_slowly
+
+   with SubmissionStore(data_path / 'abc300.sqlite') as store:
+      crawler = SubmissionCrawler(AtCoderService(), 'abc300', users=[''], session=session, store=store, jobs=4)
+      rows = crawler.update()
+      assert [s.id for s in rows] == list(range(40000000, 40000210))
+      assert 1 < max(calls) <= 4
+
+      # 2 ページ目以降を並行して取得した後、1 ページ目で新しい提出に気づいて、ずれたページを 1 ページずつ取得し直す
+      pages = _get_pages(session.requests.take())
+      assert pages[0] == 1
+      assert sorted(pages[1:11]) == list(range(2, 12))
+      assert pages[11] == 1
+      assert pages[12:] == list(range(2, 12))
+
+      # 新しい提出は、次の更新で取得する
+      assert [s.id for s in crawler.update()] == _get_ids(fake)
+      assert _get_pages(session.requests.take()) == [1]
+
+
+@pytest.mark.parametrize('statuses, tail', [([], 30), (['AC'], 10), (['AC'], 1000)])
+def test_tail(start_fake, new_session, data_path, statuses, tail):
+   fake = start_fake(submissions=200, finished=True)
+   session = new_session()
+   submissions = fake.get_submissions()
+   matched = [s['id'] for s in submissions if not statuses or s['status'] in statuses]
+
+   # 条件を満たす提出が tail 個揃うページ (足りなければ最後のページ) まで取得する
+   if len(matched) >= tail:
+      pages = [s['id'] for s in submissions].index(matched[tail - 1]) // 20 + 1
+   else:
+      pages = 11  # 200 件はちょうど 10 ページなので、空の 11 ページ目で最後とわかる
+   with SubmissionStore(data_path / 'abc300.sqlite') as store:
+      crawler = SubmissionCrawler(AtCoderService(), 'abc300', statuses=statuses, users=[''], session=session, store=store, tail=tail)
+      assert [s.id for s in crawler.update()] == sorted(matched[:tail])
+      assert _get_pages(session.requests.take()) == list(range(1, pages + 1))
+
+      # 次の更新では、新しい提出を確かめるだけ
+      assert [s.id for s in crawler.update()] == sorted(matched[:tail])
+      assert _get_pages(session.requests.take()) == [1]
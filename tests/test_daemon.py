@@ -0,0 +1,61 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import atcoder_submit_status.daemon as daemons
+from atcoder_submit_status.daemon import Daemon
+from atcoder_submit_status.service import AtCoderService
+
+
+def test_concurrent_first_requests(start_fake, new_session):
+   fake = start_fake(submissions=50)
+   session = new_session()
+   get_submissions = fake.get_submissions
+   def get_submissions_slowly():
+      time.sleep(0.05)
+      return get_submissions()
+   fake.get_submissions = get_submissions_slowly
+
+   daemon = Daemon(AtCoderService(), session, jobs=1)
+   results = []
+   def request():
+      results.append(daemon.get_submissions('abc300', users=['']))
+   threads = [threading.Thread(target=request) for _ in range(4)]
+   for thread in threads:
+      thread.start()
+   for thread in threads:
+      thread.join()
+   daemon.close()
+
+   # 最初に取得した 1 回の結果を、すべての問い合わせに返す (後から来た問い合わせは、取得し直さない)
+   assert [len(result['submissions']) for result in results] == [50] * 4
+   assert len({ result['version'] for result in results }) == 1
+   assert len([url for url in session.requests.take() if '/submissions' in url]) == 3
+
+
+def test_drop_idle_feeds_closes_the_store(start_fake, new_session, monkeypatch):
+   start_fake(submissions=50, finished=True)
+   daemon = Daemon(AtCoderService(), new_session())
+   daemon.get_submissions('abc300', users=[''])
+   daemon.get_submissions('abc300', users=['user1'])
+   store = daemon._stores['abc300']
+
+   # 一方の提出一覧が残っている間は、保存先を閉じない
+   monkeypatch.setattr(daemons, 'IDLE_TIMEOUT', 0.0)
+   daemon._feeds[('abc300', (), (), (), ('user1',))].used_at = time.time() + 60.0
+   daemon._drop_idle_feeds()
+   assert len(daemon._feeds) == 1
+   assert daemon._stores == { 'abc300': store }
+
+   daemon._feeds[('abc300', (), (), (), ('user1',))].used_at = 0.0
+   daemon._drop_idle_feeds()
+   assert daemon._feeds == {}
+   assert daemon._stores == {}
+   with pytest.raises(sqlite3.ProgrammingError):
+      store.get_meta('submissions_url')
+
+   # 次の問い合わせでは、保存先を開き直す
+   assert len(daemon.get_submissions('abc300', users=[''])['submissions']) == 50
+   daemon.close()
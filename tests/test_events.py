@@ -0,0 +1,33 @@
+from atcoder_submit_status.events import EventDetector
+from atcoder_submit_status.service import AtCoderService
+from atcoder_submit_status.submission import Status, Submission
+
+
+def _submission(submission_id: int, status: Status, progress: str = '') -> Submission:
+   return Submission(submission_id, 1682769628 + submission_id, 'A - N-choice question', 'user1', 'C++ (GCC 9.2.1)', 100 if status == Status.AC else 0, 213, status, progress, None, None)
+
+
+def _types(events):
+   return [(event['type'], event['id']) for event in events]
+
+
+def test_judging_finished_follows_every_verdict():
+   detector = EventDetector(AtCoderService(), 'abc300')
+   assert detector.detect([_submission(1, Status.AC)]) == []
+
+   # ジャッジ中に現れた提出と、ポーリングの間にジャッジが終わった提出
+   events = detector.detect([_submission(1, Status.AC), _submission(2, Status.WJ), _submission(3, Status.WA)])
+   assert _types(events) == [('submission_added', 2), ('submission_added', 3), ('judging_finished', 3)]
+
+   events = detector.detect([_submission(1, Status.AC), _submission(2, Status.WJ, '3/12'), _submission(3, Status.WA)])
+   assert _types(events) == [('status_changed', 2)]
+
+   events = detector.detect([_submission(1, Status.AC), _submission(2, Status.TLE), _submission(3, Status.WA)])
+   assert _types(events) == [('status_changed', 2), ('judging_finished', 2)]
+   assert events[0]['previous_status'] == '3/12'
+
+
+def test_include_existing():
+   detector = EventDetector(AtCoderService(), 'abc300', include_existing=True)
+   events = detector.detect([_submission(1, Status.AC), _submission(2, Status.WJ)])
+   assert _types(events) == [('submission_added', 1), ('judging_finished', 1), ('submission_added', 2)]
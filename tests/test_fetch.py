@@ -0,0 +1,23 @@
+import atcoder_submit_status.fetch as fetch
+from atcoder_submit_status.main import get_parser
+
+
+def _parse(args):
+   return get_parser(args).parse_args(args)
+
+
+def test_run_returns_true(start_fake, new_session, tmp_path, capsys):
+   start_fake(submissions=50, finished=True)
+   new_session()  # Cookie を保存する
+
+   assert fetch.run(_parse(['fetch', 'abc300', '-u', ''])) is True
+   assert len(capsys.readouterr().out.splitlines()) == 50
+
+   output = tmp_path / 'out.jsonl'
+   assert fetch.run(_parse(['fetch', 'abc300', '-u', 'nobody', '-f', 'jsonl', '-o', str(output)])) is True
+   assert output.read_text() == ''
+
+
+def test_run_returns_false_when_not_signed_in(start_fake):
+   start_fake(submissions=50, finished=True)
+   assert fetch.run(_parse(['fetch', 'abc300', '-u', ''])) is False
@@ -0,0 +1,47 @@
+import datetime
+
+import atcoder_submit_status.metadata as metadata
+import atcoder_submit_status.utils as utils
+from atcoder_submit_status.metadata import ContestMetadata
+from atcoder_submit_status.service import AtCoderService, ServiceUnavailableError
+
+
+class _Service(AtCoderService):
+   def __init__(self, window):
+      super().__init__()
+      self.window = window
+      self.calls = 0
+
+
+   def get_contest_window(self, url, session=None):
+      self.calls += 1
+      if isinstance(self.window, Exception):
+         raise self.window
+      return self.window
+
+
+def test_window_is_not_saved_when_unknown(tmp_path, monkeypatch):
+   monkeypatch.setattr(utils, 'get_metadata_path', lambda srv, contest_round: tmp_path / f'{contest_round}.json')
+   srv = _Service((None, None))
+   assert ContestMetadata(srv, 'abc300').get_window() == (None, None)
+   # 読み取れなかったことは、しばらくの間プロセスの中で覚えておく
+   assert ContestMetadata(srv, 'abc300').get_window() == (None, None)
+   assert srv.calls == 1
+   assert not (tmp_path / 'abc300.json').exists()
+
+   # 時間が経てば取得し直し、読み取れたものは保存して、次からは取得しない
+   monkeypatch.setattr(metadata, 'UNKNOWN_WINDOW_TTL', 0.0)
+   start = datetime.datetime(2023, 4, 29, 21, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=9)))
+   srv.window = (start, None)
+   assert ContestMetadata(srv, 'abc300').get_window() == (start.timestamp(), None)
+   assert ContestMetadata(srv, 'abc300').get_window() == (start.timestamp(), None)
+   assert srv.calls == 2
+
+
+def test_window_is_unknown_on_service_error(tmp_path, monkeypatch):
+   monkeypatch.setattr(utils, 'get_metadata_path', lambda srv, contest_round: tmp_path / f'{contest_round}.json')
+   srv = _Service(ServiceUnavailableError(503))
+   contest = ContestMetadata(srv, 'abc300')
+   assert contest.get_window() == (None, None)
+   assert contest.get_window() == (None, None)
+   assert srv.calls == 1
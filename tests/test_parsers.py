@@ -0,0 +1,99 @@
+"""
+LxmlParser と BeautifulSoupParser が、保存した AtCoder のページから同じ結果を取り出すことを確かめます。
+
+ページは tests/fixtures/atcoder/ に置いてあります (提出一覧・問題一覧・コンテストのトップ・ログインのページ)。
+"""
+import pathlib
+
+import pytest
+
+from atcoder_submit_status.parsers import BeautifulSoupParser, LxmlParser
+
+FIXTURES = pathlib.Path(__file__).parent / 'fixtures' / 'atcoder'
+PAGES = sorted(path.name for path in FIXTURES.glob('*.html'))
+KEYS = ['submission_time', 'task', 'user', 'language', 'score', 'code_size', 'status', 'exec_time', 'memory']
+
+# Parser のメソッドと、ページ以外の引数
+METHODS = {
+   'parse_submissions_page': (KEYS,),
+   'parse_filter_options': (),
+   'parse_tasks': (),
+   'parse_contest_window': (),
+   'parse_csrf_token': (),
+}
+
+
+def _parse(parser, method: str, page: str):
+   return getattr(parser, method)((FIXTURES / page).read_bytes(), 'utf-8', *METHODS[method])
+
+
+def test_methods_are_covered():
+   methods = { name for name in dir(LxmlParser) if name.startswith('parse_') }
+   assert methods == set(METHODS)
+
+
+@pytest.mark.parametrize('page', PAGES)
+@pytest.mark.parametrize('method', sorted(METHODS))
+def test_same_results(method: str, page: str):
+   # 対象外のページ (問題一覧のページの提出一覧など) でも、両方が同じ結果になることを確かめる
+   assert _parse(LxmlParser(), method, page) == _parse(BeautifulSoupParser(), method, page)
+
+
+@pytest.mark.parametrize('parser', [LxmlParser(), BeautifulSoupParser()], ids=['lxml', 'bs4'])
+def test_submissions_page(parser):
+   submissions, last_page = _parse(parser, 'parse_submissions_page', 'submissions.html')
+   assert last_page == 1287
+   assert [submission_id for submission_id, _ in submissions] == list(range(41200031, 41200021, -1))
+   submission = dict(submissions)
+
+   # ジャッジ待ちとジャッジ中の提出は、実行時間とメモリの列がない
+   assert submission[41200031]['status'] == 'WJ'
+   assert submission[41200031]['exec_time'] == submission[41200031]['memory'] == ''
+   assert submission[41200030]['status'] == '3/48'
+   assert submission[41200029]['status'] == '17/41 WA'
+   assert submission[41200026]['status'] == 'CE'
+
+   assert submission[41200028] == {
+      'submission_time': '2023-04-29 22:39:30+0900',
+      'task': 'E - Dice Product 3',
+      'user': 'user1',
+      'language': 'PyPy3 (7.3.0)',
+      'score': '500',
+      'code_size': '630 Byte',
+      'status': 'AC',
+      'exec_time': '418 ms',
+      'memory': '92400 KB',
+   }
+
+
+@pytest.mark.parametrize('parser', [LxmlParser(), BeautifulSoupParser()], ids=['lxml', 'bs4'])
+def test_submissions_pagination(parser):
+   assert _parse(parser, 'parse_submissions_page', 'submissions_last_page.html')[1] == 1287
+   assert [submission_id for submission_id, _ in _parse(parser, 'parse_submissions_page', 'submissions_last_page.html')[0]] == [41049578, 41049577]
+   assert len(_parse(parser, 'parse_submissions_page', 'submissions_single_page.html')[0]) == 3
+   assert _parse(parser, 'parse_submissions_page', 'submissions_single_page.html')[1] == 1
+   assert _parse(parser, 'parse_submissions_page', 'submissions_empty.html') == ([], 1)
+
+
+@pytest.mark.parametrize('parser', [LxmlParser(), BeautifulSoupParser()], ids=['lxml', 'bs4'])
+def test_filter_options(parser):
+   filters = _parse(parser, 'parse_filter_options', 'submissions.html')
+   assert set(filters) == { 'f.Task', 'f.LanguageName', 'f.Status' }
+   assert filters['f.Task']['abc300_ex'] == 'Ex - Fibonacci: Revisited'
+   assert 'C++' in filters['f.LanguageName']
+   assert 'WJ' in filters['f.Status']
+
+
+@pytest.mark.parametrize('parser', [LxmlParser(), BeautifulSoupParser()], ids=['lxml', 'bs4'])
+def test_tasks(parser):
+   tasks = _parse(parser, 'parse_tasks', 'tasks.html')
+   assert len(tasks) == 8
+   assert tasks[0] == ('abc300_a', 'A', 'N-choice question')
+   assert tasks[-1] == ('abc300_ex', 'Ex', 'Fibonacci: Revisited')
+
+
+@pytest.mark.parametrize('parser', [LxmlParser(), BeautifulSoupParser()], ids=['lxml', 'bs4'])
+def test_contest_window_and_csrf_token(parser):
+   assert _parse(parser, 'parse_contest_window', 'contest.html') == ('2023-04-29 21:00:00+0900', '2023-04-29 22:40:00+0900')
+   assert _parse(parser, 'parse_csrf_token', 'login.html') == 'ZRwz1OUmdvqsKWr6/JOG5V1wqL8eDfDp8iRoRyUVQS8='
+   assert _parse(parser, 'parse_csrf_token', 'contest.html') is None
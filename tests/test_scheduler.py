@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+from atcoder_submit_status.scheduler import PollScheduler
+
+NOW = 1682769600.0
+
+
+@pytest.fixture
+def clock(monkeypatch):
+   """
+   time.time() を止めて、clock.now で進めます。
+   """
+   class Clock:
+      now = NOW
+   monkeypatch.setattr(time, 'time', lambda: Clock.now)
+   return Clock
+
+
+def test_backoff(clock):
+   scheduler = PollScheduler(min_interval=1.0, max_interval=8.0)
+   assert scheduler.is_due()
+
+   # 変化がなければ 2 倍ずつ max_interval まで延ばし、変化やジャッジ中の提出があれば min_interval に戻す
+   intervals = []
+   for changed, judging in [(False, False)] * 4 + [(True, False), (False, False), (False, True), (False, False)]:
+      scheduler.on_update(changed=changed, judging=judging)
+      intervals.append(scheduler.next_poll - clock.now)
+   assert intervals == [2.0, 4.0, 8.0, 8.0, 1.0, 2.0, 1.0, 2.0]
+   assert not scheduler.is_due()
+   clock.now += 2.0
+   assert scheduler.is_due()
+
+
+def test_backoff_on_error(clock):
+   scheduler = PollScheduler(min_interval=1.0, max_interval=60.0)
+   scheduler.on_error()
+   assert scheduler.next_poll == NOW + 2.0
+   scheduler.on_error(retry_after=30.0)
+   assert scheduler.next_poll == NOW + 30.0
+   scheduler.on_error(retry_after=3.0)
+   assert scheduler.next_poll == NOW + 8.0
+
+   # 取得できれば、元の間隔に戻す
+   scheduler.on_update(changed=True, judging=False)
+   assert scheduler.next_poll == NOW + 1.0
+
+
+def test_contest_window(clock):
+   scheduler = PollScheduler(start=NOW + 600.0, end=NOW + 6000.0)
+   scheduler.on_update(changed=False, judging=False)
+   assert scheduler.next_poll == NOW + 600.0
+   assert scheduler.describe().endswith('(the contest starts)')
+
+   # 終わった後は、ジャッジ中の提出がなくなったら取得をやめる
+   clock.now = NOW + 7000.0
+   scheduler.on_update(changed=True, judging=True)
+   assert scheduler.next_poll == clock.now + 1.0
+   scheduler.on_update(changed=True, judging=False)
+   assert scheduler.next_poll is None
+   assert not scheduler.is_due()
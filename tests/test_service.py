@@ -0,0 +1,27 @@
+import pytest
+
+from atcoder_submit_status.service import AtCoderService
+from atcoder_submit_status.submission import Status
+
+
+def _make(status_text: str):
+   row = { 'submission_time': '2023-04-29 21:00:28+0900', 'task': 'A - N-choice question', 'user': 'user1', 'language': 'C++ (GCC 9.2.1)', 'score': '0', 'code_size': '213 Byte', 'status': status_text, 'exec_time': '', 'memory': '' }
+   return AtCoderService()._make_submission(40000000, row)
+
+
+@pytest.mark.parametrize('status_text, status, progress, judging', [
+   ('AC', Status.AC, '', False),
+   ('QLE', Status.QLE, '', False),
+   ('WJ', Status.WJ, '', True),
+   ('WR', Status.WR, '', True),
+   ('3/12', Status.WJ, '3/12', True),
+   ('3/12 WA', Status.WA, '3/12', True),
+   ('Judging', Status.WJ, '', True),
+   # 知らない判定は、ジャッジが終わったものとして扱う
+   ('XYZ', Status.UNKNOWN, '', False),
+   ('3/12 XYZ', Status.UNKNOWN, '', False),
+])
+def test_make_submission(status_text: str, status: Status, progress: str, judging: bool):
+   submission = _make(status_text)
+   assert (submission.status, submission.progress) == (status, progress)
+   assert AtCoderService().is_judging(submission) == judging
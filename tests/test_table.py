@@ -0,0 +1,114 @@
+import pytest
+
+import atcoder_submit_status.table as tables
+from atcoder_submit_status.service import AtCoderService
+from atcoder_submit_status.submission import Status
+from atcoder_submit_status.table import SubmissionTable
+from atcoder_submit_status.table_benchmark import Contest
+
+CONDITIONS = [
+   {},
+   { 'statuses': ['AC'] },
+   { 'statuses': ['WJ'], 'users': ['user1', 'user2'] },
+   { 'tasks': ['a', 'ex'], 'languages': ['Python'] },
+]
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def numpy(request, monkeypatch):
+   """
+   NumPy を使うときと使わないときの両方で試します。
+   """
+   if request.param == 'numpy':
+      return pytest.importorskip('numpy')
+   monkeypatch.setattr(tables, '_import_numpy', lambda: None)
+   return None
+
+
+def _assert_same(table: SubmissionTable, expected: SubmissionTable):
+   assert table.rows == expected.rows
+   for name in ['task', 'user', 'status', 'exec_time']:
+      assert [table._decode(name, code) for code in table.get_column(name)] == [expected._decode(name, code) for code in expected.get_column(name)]
+   for conditions in CONDITIONS:
+      assert table.to_submissions(table.select(**conditions)) == expected.to_submissions(expected.select(**conditions))
+
+
+def test_upsert_appends_to_columns_and_indexes(numpy):
+   contest = Contest(users=5)
+   submissions = { s.id: s for s in contest.submit(200, judging=10) }
+   table = SubmissionTable(submissions.values())
+   for conditions in CONDITIONS:
+      table.select(**conditions)
+   columns = dict(table._columns)
+
+   for _ in range(3):
+      changed = [contest.judge(s) for s in submissions.values() if s.status == Status.WJ] + contest.submit(20, judging=5)
+      submissions.update((s.id, s) for s in changed)
+      table.upsert(changed)
+      # 列は作り直さずに、末尾に追加している
+      assert all(table._columns[name] is column for name, column in columns.items())
+      _assert_same(table, SubmissionTable(submissions.values()))
+
+   # 同じ提出を渡しても変わらない
+   table.upsert(list(submissions.values())[:50])
+   _assert_same(table, SubmissionTable(submissions.values()))
+
+
+def test_upsert_older_submissions_rebuilds(numpy):
+   contest = Contest(users=5)
+   submissions = contest.submit(100)
+   table = SubmissionTable(submissions[50:])
+   table.select(statuses=['AC'])
+   table.upsert(submissions[:50])
+   _assert_same(table, SubmissionTable(submissions))
+
+
+def test_select_within_rows_and_count_by(numpy):
+   contest = Contest(users=5)
+   submissions = contest.submit(300, judging=20)
+   submissions[-1] = submissions[-1]._replace(user='user1', progress='3/12')
+   table = SubmissionTable(submissions)
+   rows = table.select(users=['user1', 'user2'])
+   accepted = set(table.select(statuses=['AC']))
+   assert table.select(statuses=['AC'], rows=rows) == [i for i in rows if i in accepted]
+   assert table.select(statuses=['AC'], rows=range(10, 50)) == [i for i in range(10, 50) if i in accepted]
+
+   # 進捗の付いたジャッジ中の提出も "WJ" として数える
+   expected = {}
+   for i in rows:
+      s = table[i]
+      key = (s.user, 'WJ' if s.progress else s.status.value)
+      expected[key] = expected.get(key, 0) + 1
+   assert table.count_by(['user', 'status'], rows) == expected
+
+
+@pytest.mark.parametrize('conditions', [
+   {},
+   { 'users': [''] },
+   { 'users': ['USER1', 'user3'] },
+   { 'users': ['nobody'] },
+   { 'tasks': ['A', 'ex'] },
+   { 'languages': ['C++', 'Rust'] },
+   { 'statuses': ['WA', 'TLE'] },
+   { 'statuses': ['WJ'] },
+   { 'tasks': ['b'], 'languages': ['Python', 'PyPy3'], 'statuses': ['AC', 'WJ'], 'users': ['user0', 'user2', 'user4'] },
+])
+def test_numpy_and_python_select_the_same_rows(monkeypatch, conditions):
+   pytest.importorskip('numpy')
+   srv = AtCoderService()
+   submissions = Contest(users=5).submit(500, judging=30)
+   submissions[-10:] = [s._replace(progress='3/12') for s in submissions[-10:]]
+
+   # 表を使わずに、すべての提出を match_submission() で確かめたものと比べる
+   users = { user.lower() for user in conditions.get('users', []) }
+   expected = [i for i, s in enumerate(submissions) if (not users or '' in users or s.user.lower() in users) and srv.match_submission(s, tasks=conditions.get('tasks', []), languages=conditions.get('languages', []), statuses=conditions.get('statuses', []))]
+
+   results = []
+   for use_numpy in [True, False]:
+      if not use_numpy:
+         monkeypatch.setattr(tables, '_import_numpy', lambda: None)
+      table = SubmissionTable(submissions)
+      rows = table.select(**conditions)
+      results.append((list(rows), table.count_by(['task', 'status'], rows), table.first_by('user', rows), table.percentiles_by('exec_time', 'task', [50, 100], rows)))
+   assert results[0] == results[1]
+   assert results[0][0] == expected
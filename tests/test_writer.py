@@ -0,0 +1,56 @@
+import datetime
+import io
+import sys
+
+import pytest
+
+import atcoder_submit_status.writer as writers
+
+JST = datetime.timezone(datetime.timedelta(hours=9))
+COLUMNS = ['submission_time', 'task', 'user', 'language', 'score', 'status']
+
+
+def _write_parquet(rows):
+   file = io.BytesIO()
+   writer = writers.new_writer('parquet', file, columns=COLUMNS, time_zone=JST)
+   writer.write_rows(rows)
+   writer.close()
+   return file.getvalue()
+
+
+def test_empty_parquet_has_schema():
+   pyarrow = pytest.importorskip('pyarrow')
+   import pyarrow.parquet
+
+   table = pyarrow.parquet.read_table(pyarrow.BufferReader(_write_parquet([])))
+   assert table.num_rows == 0
+   assert table.schema.names == COLUMNS
+
+   # 提出があるときと同じ型になる
+   row = { 'submission_time': datetime.datetime(2023, 4, 29, 21, 0, 28, tzinfo=JST), 'task': 'A - N-choice question', 'user': 'user1', 'language': 'C++', 'score': 100, 'status': 'AC' }
+   assert pyarrow.parquet.read_table(pyarrow.BufferReader(_write_parquet([row]))).schema == table.schema
+
+
+def test_missing_dependencies(tmp_path, monkeypatch):
+   # import できないライブラリは、終了せずに WriterError にする
+   monkeypatch.setitem(sys.modules, 'pyarrow', None)
+   monkeypatch.setitem(sys.modules, 'zstandard', None)
+   with pytest.raises(writers.WriterError, match='pyarrow'):
+      writers.new_writer('parquet', io.BytesIO(), columns=COLUMNS, time_zone=JST)
+
+   path = tmp_path / 'out.csv.zst'
+   with pytest.raises(writers.WriterError, match='zstandard'):
+      with writers.open_output(path, compression='zstd'):
+         pass
+   assert not path.exists()
+
+
+def test_fetch_fails_without_zstandard(start_fake, new_session, tmp_path, monkeypatch):
+   import atcoder_submit_status.fetch as fetch
+   from atcoder_submit_status.main import get_parser
+
+   start_fake(submissions=50, finished=True)
+   new_session()
+   monkeypatch.setitem(sys.modules, 'zstandard', None)
+   args = ['fetch', 'abc300', '-u', '', '-o', str(tmp_path / 'out.csv.zst')]
+   assert fetch.run(get_parser(args).parse_args(args)) is False